@@ -0,0 +1,214 @@
+"""End-to-end archiver throughput against local HTTP and S3 stand-ins.
+
+Runs ArchiverLambdaService.run_once ('lambda_service'), ArchiverService.run_once ('service')
+and lambda_handler.handler ('handler') over the cartesian product of the scenario options,
+each run in a fresh process so peak RSS and module state are per run. The trigger, token
+and clients APIs are served by fake_services.FakeServices; S3 is moto's in-process mock
+(--storage s3, the default when moto is installed) or a local directory (--storage local,
+which skips the S3-only handler target).
+
+Reports wall time, clients/sec (lambda_service only: the other two archive one endpoint
+holding clients x triggers triggers), triggers/sec, uploaded MB/sec and peak RSS. Results
+are written as JSON with the pyarchiver version and git revision; --compare prints the
+change against an earlier results file.
+
+Usage:
+    PYTHONPATH=src python benchmarks/bench_archiver.py [--clients 10,100] [--triggers 100]
+        [--payload-bytes 512] [--latency-ms 0,20] [--error-rate 0,0.05] [--workers 8]
+        [--targets lambda_service,service,handler] [--storage s3|local] [--repeat 1]
+        [--output results.json] [--compare baseline.json]
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import itertools
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from fake_services import FakeServices
+
+TARGETS = ('lambda_service', 'service', 'handler')
+BUCKET = 'bench-archive'
+
+
+def _start_s3():
+    import boto3
+    import moto
+
+    os.environ.update({'AWS_ACCESS_KEY_ID': 'bench', 'AWS_SECRET_ACCESS_KEY': 'bench', 'AWS_DEFAULT_REGION': 'us-east-1'})
+    mock = moto.mock_aws()
+    mock.start()
+    boto3.client('s3').create_bucket(Bucket=BUCKET)
+    return mock
+
+
+def run_scenario(target: str, sc: dict, url: str, storage: str) -> dict:
+    """Run one target once in this (fresh) process and measure it."""
+    from pyarchiver.metrics import peak_rss_mb
+
+    workdir = tempfile.mkdtemp(prefix='pyarchiver-bench-')
+    if storage == 's3':
+        _start_s3()
+    bucket = BUCKET if storage == 's3' else os.path.join(workdir, 'archive')
+    total = sc['clients'] * sc['triggers']
+    http_cfg = {'backoff_base': 0.01, 'pool_maxsize': max(10, sc['workers'])}
+    os.environ['METRICS_FORMAT'] = 'off'
+
+    # the archivers print per client / per trigger; keep that out of the timings and the report
+    with contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        if target == 'lambda_service':
+            from pyarchiver.archiver_lambda_service import ArchiverLambdaService
+
+            os.environ.update({'CLIENTS_API_URL': f'{url}/clients', 'BUCKET': bucket})
+            out = ArchiverLambdaService({'client_fetch': {'page_size': 100}, 'max_workers': sc['workers'],
+                                         'http': http_cfg}).run_once()
+            archived, failed = out['count'], len(out['failed'])
+        elif target == 'service':
+            from pyarchiver.archiver_service import ArchiverService
+
+            storage_cfg = {'type': 's3', 'bucket': bucket} if storage == 's3' else {'type': 'local', 'local_dir': bucket}
+            out = ArchiverService({'api': {'url': f'{url}/triggers?count={total}'}, 'storage': storage_cfg,
+                                   'output': workdir, 'http': http_cfg}).run_once()
+            archived, failed = len(out['archived']), 0
+        else:
+            from pyarchiver import lambda_handler
+
+            os.environ.update({'BUCKET': bucket, 'TRIGGER_URL': f'{url}/triggers?count={total}'})
+            out = lambda_handler.handler({})
+            archived, failed = out['count'], 0
+        wall = time.perf_counter() - started
+
+    metrics = out.get('metrics') or {}
+    uploaded = metrics.get('bytes', {}).get('upload', 0)
+    triggers = total if target != 'lambda_service' else archived * sc['triggers']
+    return {
+        'archived': archived,
+        'failed': failed,
+        'wall_s': round(wall, 4),
+        'clients_per_s': round(archived / wall, 2) if target == 'lambda_service' else None,
+        'triggers_per_s': round(triggers / wall, 1),
+        'mb_per_s': round(uploaded / wall / 1e6, 3),
+        'uploaded_bytes': uploaded,
+        'retries': metrics.get('retries', 0),
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def _scenario_key(r: dict) -> tuple:
+    return (r['target'], r['storage'], r['clients'], r['triggers'], r['payload_bytes'], r['latency_ms'],
+            r['error_rate'], r['workers'])
+
+
+def _git_revision() -> str | None:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _version() -> str | None:
+    try:
+        from importlib.metadata import version
+
+        return version('pyarchiver')
+    except Exception:
+        return None
+
+
+def bench(args) -> list:
+    grid = itertools.product(
+        [int(v) for v in args.clients.split(',')], [int(v) for v in args.triggers.split(',')],
+        [int(v) for v in args.payload_bytes.split(',')], [float(v) for v in args.latency_ms.split(',')],
+        [float(v) for v in args.error_rate.split(',')], [int(v) for v in args.workers.split(',')])
+    results = []
+    for clients, triggers, payload, latency, error_rate, workers in grid:
+        sc = {'clients': clients, 'triggers': triggers, 'payload_bytes': payload, 'latency_ms': latency,
+              'error_rate': error_rate, 'workers': workers}
+        for target in args.targets.split(','):
+            row = {'target': target, 'storage': args.storage, **sc}
+            if target == 'handler' and args.storage != 's3':
+                results.append({**row, 'skipped': 'handler always uploads to S3; use --storage s3'})
+                continue
+            best = None
+            for _ in range(args.repeat):
+                with FakeServices(clients, triggers, payload, latency, error_rate) as services:
+                    # a fresh interpreter per run: clean peak RSS, no warm pools or caches
+                    with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as pool:
+                        try:
+                            run = pool.submit(run_scenario, target, sc, services.url, args.storage).result()
+                        except Exception as e:
+                            run = {'error': f'{type(e).__name__}: {e}'}
+                    run['injected_errors'] = services.errors
+                if best is None or run.get('wall_s', float('inf')) < best.get('wall_s', float('inf')):
+                    best = run
+            results.append({**row, **best})
+    return results
+
+
+def _print(results: list, baseline: list | None):
+    base = {_scenario_key(r): r for r in baseline or [] if 'wall_s' in r}
+    print(f"{'target':<15}{'clients':>8}{'trig':>7}{'bytes':>7}{'lat ms':>7}{'err':>6}{'wall s':>9}"
+          f"{'clients/s':>11}{'trig/s':>10}{'MB/s':>8}{'RSS MB':>8}{'vs base':>9}")
+    for r in results:
+        head = (f"{r['target']:<15}{r['clients']:>8}{r['triggers']:>7}{r['payload_bytes']:>7}"
+                f"{r['latency_ms']:>7g}{r['error_rate']:>6g}")
+        if 'wall_s' not in r:
+            print(head + f"  {r.get('skipped') or r.get('error')}")
+            continue
+        prev = base.get(_scenario_key(r))
+        # throughput change against the baseline: +20% means this run is 20% faster
+        delta = f"{(prev['wall_s'] / r['wall_s'] - 1) * 100:+.1f}%" if prev else '-'
+        print(head + f"{r['wall_s']:>9}{r['clients_per_s'] or '-':>11}{r['triggers_per_s']:>10}{r['mb_per_s']:>8}"
+                     f"{r['peak_rss_mb'] or '-':>8}{delta:>9}")
+
+
+def main(argv=None):
+    try:
+        import moto  # noqa: F401
+        default_storage = 's3'
+    except ImportError:
+        default_storage = 'local'
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', default='10,100')
+    parser.add_argument('--triggers', default='100', help='triggers per client')
+    parser.add_argument('--payload-bytes', default='512', help='approximate size of one trigger')
+    parser.add_argument('--latency-ms', default='0', help='latency injected into every HTTP response')
+    parser.add_argument('--error-rate', default='0', help='share of HTTP requests answered with 503')
+    parser.add_argument('--workers', default='8', help='max_workers for lambda_service')
+    parser.add_argument('--targets', default=','.join(TARGETS))
+    parser.add_argument('--storage', choices=('s3', 'local'), default=default_storage)
+    parser.add_argument('--repeat', type=int, default=1, help='runs per scenario; the fastest is kept')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--compare', help='earlier results JSON to compare wall times against')
+    args = parser.parse_args(argv)
+
+    results = bench(args)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f).get('results')
+    _print(results, baseline)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'pyarchiver_version': _version(),
+                'git_revision': _git_revision(),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'created': datetime.datetime.utcnow().isoformat() + 'Z',
+                'results': results,
+            }, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,117 @@
+"""Compare JSON codecs on the parse -> validate -> serialize path of a trigger response.
+
+For every installed codec (see pyarchiver/codec.py) and validation level, a synthetic
+trigger response (a JSON array, as a trigger endpoint returns it) is parsed, run through the
+validation stage (trigger/validation.py) and serialized as NDJSON. Reports, per codec, level
+and size: seconds per stage and end-to-end triggers/s (best of --repeat runs), plus the
+speed-up against the standard library codec.
+
+Usage:
+    PYTHONPATH=src python benchmarks/bench_codec.py [--sizes 1000,10000] [--levels basic,strict]
+        [--invalid-rate 0.01] [--repeat 5] [--output results.json]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_formats import synthetic_triggers  # noqa: E402
+from pyarchiver.codec import available_codecs, get_codec  # noqa: E402
+from pyarchiver.trigger.validation import TriggerValidator  # noqa: E402
+
+
+def response_body(n: int, invalid_rate: float, seed: int = 7) -> bytes:
+    """A trigger response with top-level states (some lower-case) and a share of bad triggers."""
+    rnd = random.Random(seed)
+    triggers = synthetic_triggers(n)
+    for t in triggers:
+        t['state'] = rnd.choice(['NEW', 'PROCESSED', 'new'])
+        if rnd.random() < invalid_rate:
+            del t[rnd.choice(['id', 'timestamp'])]
+    return json.dumps(triggers).encode('utf-8')
+
+
+def run_once(codec, validator, body: bytes):
+    timings = {}
+    start = time.perf_counter()
+    triggers = codec.loads(body)
+    timings['parse'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    rejected = []
+    # filter() only yields references; list() here stands in for the archiving loop
+    valid = list(validator.filter(triggers, rejected, quarantine=_NullQuarantine))
+    timings['validate'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    size = sum(len(codec.dumps(t)) + 1 for t in valid)
+    timings['serialize'] = time.perf_counter() - start
+    return timings, len(valid), len(rejected), size
+
+
+class _NullQuarantine:
+    @staticmethod
+    def add(trigger, reason, source=None):
+        pass
+
+
+def bench(sizes, levels, invalid_rate, repeat):
+    results = []
+    for n in sizes:
+        body = response_body(n, invalid_rate)
+        for level in levels:
+            baseline = None
+            # stdlib first so every other codec is compared against it
+            for name in sorted(available_codecs(), key=lambda c: c != 'json'):
+                codec = get_codec(name)
+                best = None
+                for _ in range(repeat):
+                    # a fresh validator each run: strict normalizes states in place
+                    timings, valid, rejected, size = run_once(codec, TriggerValidator(level), body)
+                    total = sum(timings.values())
+                    if best is None or total < best[0]:
+                        best = (total, timings, valid, rejected, size)
+                total, timings, valid, rejected, size = best
+                if name == 'json':
+                    baseline = total
+                results.append({
+                    'codec': name,
+                    'level': level,
+                    'triggers': n,
+                    'valid': valid,
+                    'rejected': rejected,
+                    'ndjson_bytes': size,
+                    **{f'{k}_seconds': round(v, 6) for k, v in timings.items()},
+                    'total_seconds': round(total, 6),
+                    'triggers_per_second': round(n / total) if total else None,
+                    'speedup_vs_json': round(baseline / total, 2) if baseline and total else None,
+                })
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='1000,10000,100000')
+    parser.add_argument('--levels', default='basic,strict')
+    parser.add_argument('--invalid-rate', type=float, default=0.01)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help='write results as JSON to this file')
+    args = parser.parse_args(argv)
+
+    results = bench([int(s) for s in args.sizes.split(',')], args.levels.split(','), args.invalid_rate, args.repeat)
+    print(f"{'codec':<8}{'level':<8}{'triggers':>10}{'parse s':>10}{'valid s':>10}{'dump s':>10}{'trig/s':>12}{'speedup':>9}")
+    for r in results:
+        print(f"{r['codec']:<8}{r['level']:<8}{r['triggers']:>10}{r['parse_seconds']:>10}{r['validate_seconds']:>10}"
+              f"{r['serialize_seconds']:>10}{r['triggers_per_second']:>12}{r['speedup_vs_json']:>9}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
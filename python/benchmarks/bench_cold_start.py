@@ -0,0 +1,96 @@
+"""Measure Lambda cold-start cost: import time of the handler and of each action's code path.
+
+Every sample runs in a fresh interpreter (`python -X importtime`), like a Lambda cold start.
+Reported per stage (median and max over --runs, in ms):
+- handler_import   `import pyarchiver.lambda_handler` (what every cold start pays)
+- triggers_path    modules the trigger-archiving path imports on first use
+- clients_path     modules the run_clients path imports on first use
+- boto3_client     building the first S3 client
+plus the modules with the highest cumulative import time, from -X importtime.
+
+Usage:
+    PYTHONPATH=src python benchmarks/bench_cold_start.py [--runs 10] [--top 10] [--output results.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+CHILD = r'''
+import json, os, time
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+t = {}
+s = time.perf_counter()
+import pyarchiver.lambda_handler
+t['handler_import'] = time.perf_counter() - s
+s = time.perf_counter()
+import pyarchiver.trigger.trigger_fetcher, pyarchiver.storage.formats, pyarchiver.storage.s3_uploader, pyarchiver.metrics
+t['triggers_path'] = time.perf_counter() - s
+s = time.perf_counter()
+import pyarchiver.archiver_lambda_service
+t['clients_path'] = time.perf_counter() - s
+s = time.perf_counter()
+from pyarchiver.aws import get_client
+get_client('s3')
+t['boto3_client'] = time.perf_counter() - s
+print(json.dumps({k: v * 1000 for k, v in t.items()}))
+'''
+
+
+def _parse_importtime(stderr: str) -> dict:
+    out = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, self_us, cumulative_us, name = [p.strip() for p in line.replace('import time:', '|', 1).split('|')]
+        out[name] = int(cumulative_us) / 1000
+    return out
+
+
+def measure(runs: int):
+    stages = {}
+    modules = {}
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+    for _ in range(runs):
+        proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', CHILD], capture_output=True, text=True,
+                              env=env, check=True)
+        for k, v in json.loads(proc.stdout.strip().splitlines()[-1]).items():
+            stages.setdefault(k, []).append(v)
+        for name, ms in _parse_importtime(proc.stderr).items():
+            modules.setdefault(name, []).append(ms)
+    return stages, modules
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--output', help='write results as JSON to this file')
+    args = parser.parse_args(argv)
+
+    stages, modules = measure(args.runs)
+    results = {
+        'runs': args.runs,
+        'python': sys.version.split()[0],
+        'stages': {k: {'median_ms': round(statistics.median(v), 2), 'max_ms': round(max(v), 2)} for k, v in stages.items()},
+        'top_modules': [
+            {'module': name, 'cumulative_ms': round(statistics.median(v), 2)}
+            for name, v in sorted(modules.items(), key=lambda kv: -statistics.median(kv[1]))[:args.top]
+        ],
+    }
+    print(f"{'stage':<16}{'median ms':>11}{'max ms':>10}")
+    for k, v in results['stages'].items():
+        print(f"{k:<16}{v['median_ms']:>11}{v['max_ms']:>10}")
+    print(f"\n{'module':<45}{'cumulative ms':>15}")
+    for m in results['top_modules']:
+        print(f"{m['module']:<45}{m['cumulative_ms']:>15}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
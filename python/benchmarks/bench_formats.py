@@ -0,0 +1,80 @@
+"""Compare archive formats on synthetic trigger sets.
+
+Reports, per format and trigger-set size: bytes written, ratio against the legacy
+pretty-printed JSON, and encode time (best of --repeat runs).
+
+Usage:
+    PYTHONPATH=src python benchmarks/bench_formats.py [--sizes 1000,10000] [--repeat 3] [--output results.json]
+"""
+import argparse
+import json
+import random
+import time
+
+from pyarchiver.storage.formats import available_formats, get_format
+
+
+def synthetic_triggers(n: int, seed: int = 42):
+    rnd = random.Random(seed)
+    states = ['NEW', 'PROCESSED']
+    return [
+        {
+            'id': f'trg-{i:08d}',
+            'payload': {
+                'client': f'client-{rnd.randint(1, 50)}',
+                'state': rnd.choice(states),
+                'amount': round(rnd.random() * 1000, 2),
+                'tags': [f'tag-{rnd.randint(1, 20)}' for _ in range(3)],
+                'message': 'x' * rnd.randint(20, 200),
+            },
+            'timestamp': f'2024-01-{rnd.randint(1, 28):02d}T{rnd.randint(0, 23):02d}:00:00Z',
+        }
+        for i in range(n)
+    ]
+
+
+def bench(sizes, repeat):
+    results = []
+    for n in sizes:
+        triggers = synthetic_triggers(n)
+        baseline = None
+        for name in available_formats():
+            fmt = get_format(name)
+            best = float('inf')
+            size = 0
+            for _ in range(repeat):
+                start = time.perf_counter()
+                size = sum(len(chunk) for chunk in fmt.iter_encode(triggers))
+                best = min(best, time.perf_counter() - start)
+            if name == 'json':
+                baseline = size
+            results.append({
+                'format': name,
+                'triggers': n,
+                'bytes': size,
+                'ratio_vs_json': round(size / baseline, 4) if baseline else None,
+                'encode_seconds': round(best, 6),
+                'triggers_per_second': round(n / best) if best else None,
+            })
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='1000,10000,100000')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help='write results as JSON to this file')
+    args = parser.parse_args(argv)
+
+    results = bench([int(s) for s in args.sizes.split(',')], args.repeat)
+    print(f"{'format':<14}{'triggers':>10}{'bytes':>14}{'vs json':>9}{'encode s':>11}{'trig/s':>12}")
+    for r in results:
+        print(f"{r['format']:<14}{r['triggers']:>10}{r['bytes']:>14}{r['ratio_vs_json']:>9}{r['encode_seconds']:>11}{r['triggers_per_second']:>12}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,135 @@
+"""Local stand-ins for the services the archiver talks to, for benchmarks.
+
+FakeServices runs one threaded HTTP server that plays the clients API, the OAuth token
+endpoint and the trigger endpoints:
+
+    GET  /clients?page=N&page_size=M   paged client list (each client points at the routes below)
+    POST /token                        {"access_token": ..., "expires_in": 3600}
+    GET  /trigger/<client_id>          JSON array of `triggers` triggers of ~`payload_bytes` each
+    GET  /triggers?count=N             JSON array of N triggers (single-endpoint archivers)
+
+Every request sleeps `latency_ms` first, and fails with 503 with probability `error_rate`
+(seeded, so a scenario sees the same failure pattern on every run). Response bodies are
+encoded once per size and reused, so the server costs little CPU next to the archiver.
+"""
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def trigger_body(count: int, payload_bytes: int) -> bytes:
+    filler = 'x' * max(0, payload_bytes - 60)
+    return json.dumps([
+        {'id': f'trg-{i:08d}', 'payload': {'index': i, 'state': 'NEW', 'data': filler},
+         'timestamp': '2024-01-01T00:00:00Z'}
+        for i in range(count)
+    ]).encode('utf-8')
+
+
+class FakeServices:
+    def __init__(self, clients: int = 10, triggers: int = 100, payload_bytes: int = 512,
+                 latency_ms: float = 0.0, error_rate: float = 0.0, seed: int = 7):
+        self.clients = clients
+        self.triggers = triggers
+        self.payload_bytes = payload_bytes
+        self.latency = latency_ms / 1000.0
+        self.error_rate = error_rate
+        self._rnd = random.Random(seed)
+        self._lock = threading.Lock()
+        self._bodies = {}
+        self.requests = 0
+        self.errors = 0
+        self._server = None
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self._server.server_address[1]}'
+
+    def _body(self, count: int) -> bytes:
+        with self._lock:
+            body = self._bodies.get(count)
+            if body is None:
+                body = self._bodies[count] = trigger_body(count, self.payload_bytes)
+            return body
+
+    def _fail(self) -> bool:
+        with self._lock:
+            self.requests += 1
+            failed = self.error_rate > 0 and self._rnd.random() < self.error_rate
+            self.errors += failed
+            return failed
+
+    def _client_page(self, page: int, size: int) -> bytes:
+        start = (page - 1) * size
+        ids = range(start, min(start + size, self.clients))
+        return json.dumps([
+            {'client_id': f'client-{i:05d}', 'oauth_client_id': f'oauth-{i}', 'oauth_client_secret': 'secret',
+             'token_url': f'{self.url}/token', 'trigger_url': f'{self.url}/trigger/client-{i:05d}',
+             'scopes': ['dex/trigger:all']}
+            for i in ids
+        ]).encode('utf-8')
+
+    def _handler(self):
+        services = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _send(self, status, body, content_type='application/json'):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _route(self, method):
+                if services.latency:
+                    time.sleep(services.latency)
+                if services._fail():
+                    return self._send(503, b'unavailable', 'text/plain')
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                if method == 'POST' and url.path == '/token':
+                    self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                    return self._send(200, b'{"access_token":"bench-token","expires_in":3600}')
+                if url.path == '/clients':
+                    page = int(query.get('page', ['1'])[0])
+                    size = int(query.get('page_size', [str(services.clients)])[0])
+                    return self._send(200, services._client_page(page, size))
+                if url.path.startswith('/trigger/'):
+                    return self._send(200, services._body(services.triggers))
+                if url.path == '/triggers':
+                    return self._send(200, services._body(int(query.get('count', [services.triggers])[0])))
+                return self._send(404, b'not found', 'text/plain')
+
+            def do_GET(self):
+                self._route('GET')
+
+            def do_POST(self):
+                self._route('POST')
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> 'FakeServices':
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,358 @@
+"""Manifest index of the per-client archives, and the read side built on it.
+
+Every archive object ArchiverLambdaService uploads is recorded in an index under the archive
+root, written through the same uploader:
+
+    <prefix>/_index/<yyyymm>/<bucket>/part_<run>_<seq>.ndjson
+        {"client_id": ..., "date": "YYYY-MM-DD", "key": ..., "path": ..., "size": n,
+         "count": n, "sha256": ..., "format": ..., "at": "<iso timestamp>"}
+
+Like the run journal, entries are buffered and written as new part objects (never rewritten),
+so concurrent runs and shard workers do not race; a key archived again later (same client and
+day) is represented by its newest entry. Partitions are by month and by `bucket`, one of
+INDEX_BUCKETS hex digits hashed from the client id: a date-range query lists only the
+`_index/<yyyymm>/` folders it covers, and a single-client query only its bucket in them.
+
+Parts only pile up while a month is written. Compaction consolidates every closed month
+(consolidate()): the objects of each bucket become one `month_<run>.ndjson`, sorted by client,
+date and key, and the objects merged into it are deleted. Part objects written directly under
+`_index/<yyyymm>/` by earlier versions are still read, and consolidation moves their entries
+into the buckets.
+
+Compaction rollups (see compaction.py) are recorded as entries with `date_to` and a
+`members` list, one gzip member per source archive ({date, source, offset, length, count,
+sha256}; trigger-mode rollups list `sources` instead, one block per group of trigger objects,
+under client id `_triggers`). The reader expands a rollup into one entry per member, read with a ranged GET of
+just that member, and hides the source archives the rollup replaced.
+
+ArchiveReader answers list / fetch / stream queries by client and date range. Objects are
+fetched with parallel ranged reads (`read_part_size` chunks, `read_workers` in flight, sizes
+come from the index so no HEAD is needed) and checked against the recorded sha256.
+
+CLI:
+    python -m pyarchiver.archive_index config.yaml list   [--client ID] [--from D] [--to D]
+    python -m pyarchiver.archive_index config.yaml fetch  [--client ID] [--from D] [--to D] --out DIR
+    python -m pyarchiver.archive_index config.yaml stream [--client ID] [--from D] [--to D]
+`stream` writes the archived triggers to stdout as NDJSON. BUCKET / PREFIX are read from the
+environment first, then from the config, as in the archiver.
+"""
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+from .storage.formats import format_for_key
+
+INDEX_DIR = '_index'
+# fixed: readers find a client's entries by the bucket writers put them in
+INDEX_BUCKETS = 16
+ENTRY_FIELDS = ('client_id', 'date', 'key', 'path', 'size', 'count', 'sha256', 'format', 'at')
+
+
+def _as_date(value) -> datetime.date | None:
+    if value is None or isinstance(value, datetime.date):
+        return value.date() if isinstance(value, datetime.datetime) else value
+    return datetime.date.fromisoformat(str(value))
+
+
+def _index_dir(prefix: str) -> str:
+    prefix = prefix.rstrip('/')
+    return f"{prefix}/{INDEX_DIR}" if prefix else INDEX_DIR
+
+
+def client_bucket(client_id: str) -> str:
+    digest = hashlib.blake2b(client_id.encode('utf-8'), digest_size=4).digest()
+    return f'{int.from_bytes(digest, "little") % INDEX_BUCKETS:02x}'
+
+
+def _entry_month(e: Dict[str, Any]) -> str:
+    return e['date'][:7].replace('-', '')
+
+
+def _months(start: datetime.date, end: datetime.date) -> Iterator[str]:
+    y, m = start.year, start.month
+    while (y, m) <= (end.year, end.month):
+        yield f'{y:04d}{m:02d}'
+        y, m = (y + 1, 1) if m == 12 else (y, m + 1)
+
+
+class ArchiveIndex:
+    """Buffers index entries for one run and writes them as part objects."""
+
+    def __init__(self, uploader, prefix: str, cfg: Dict[str, Any] | None = None):
+        cfg = cfg or {}
+        self.uploader = uploader
+        self.dir = _index_dir(prefix)
+        self.flush_every = max(1, int(cfg.get('index_flush_every', 100)))
+        self.flush_interval = float(cfg.get('index_flush_interval', 5.0))
+        self.run_id = f"{datetime.datetime.utcnow():%Y%m%dT%H%M%S}_{uuid.uuid4().hex[:8]}"
+        self._seq = 0
+        self._pending: List[Dict[str, Any]] = []
+        self._last_flush = time.monotonic()
+        self.writes = 0
+        self._lock = threading.Lock()
+
+    def record(self, client_id: str, day: datetime.date, key: str, path: str | None, size: int, count: int,
+               sha256: str, fmt: str, **extra):
+        entry = {'client_id': client_id, 'date': _as_date(day).isoformat(), 'key': key, 'path': path, 'size': size,
+                 'count': count, 'sha256': sha256, 'format': fmt, 'at': datetime.datetime.utcnow().isoformat() + 'Z',
+                 **extra}
+        with self._lock:
+            self._pending.append(entry)
+            due = (len(self._pending) >= self.flush_every
+                   or time.monotonic() - self._last_flush >= self.flush_interval)
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+            self._last_flush = time.monotonic()
+            if not pending:
+                return
+            self._seq += 1
+            seq = self._seq
+        by_part: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+        for e in pending:
+            by_part.setdefault((_entry_month(e), client_bucket(e['client_id'])), []).append(e)
+        for (month, bucket), entries in by_part.items():
+            self._write(f"{self.dir}/{month}/{bucket}/part_{self.run_id}_{seq:05d}.ndjson", entries)
+
+    def _write(self, name: str, entries: List[Dict[str, Any]]):
+        lines = [json.dumps(e, separators=(',', ':')) for e in entries]
+        self.uploader.upload(name, ('\n'.join(lines) + '\n').encode('utf-8'), content_type='application/x-ndjson')
+        self.writes += 1
+
+    def close(self):
+        self.flush()
+
+    # -- consolidation -------------------------------------------------------------------
+    def months(self, before: str | None = None) -> Dict[str, List[str]]:
+        """Index object names per month (strictly before `before`, a YYYYMM, if given)."""
+        out: Dict[str, List[str]] = {}
+        for name in self.uploader.list(self.dir + '/'):
+            month = name[len(self.dir) + 1:][:6]
+            if before is None or month < before:
+                out.setdefault(month, []).append(name)
+        return out
+
+    def consolidate(self, month: str, names: List[str] | None = None) -> int:
+        """Merge the index objects of a closed month into one sorted object per bucket and
+        delete the objects merged; returns how many were. Buckets already held in a single
+        object are left alone."""
+        if names is None:
+            names = self.uploader.list(f'{self.dir}/{month}/')
+        folder = f'{self.dir}/{month}/'
+        by_bucket: Dict[str, List[str]] = {}
+        legacy: List[str] = []
+        for name in names:
+            rest = name[len(folder):]
+            if '/' in rest:
+                by_bucket.setdefault(rest.split('/', 1)[0], []).append(name)
+            else:
+                legacy.append(name)
+        entries: Dict[str, Dict[str, Dict[str, Any]]] = {}
+
+        def take(data: bytes | None):
+            for line in (data or b'').splitlines():
+                if line.strip():
+                    e = json.loads(line)
+                    latest = entries.setdefault(client_bucket(e['client_id']), {})
+                    prev = latest.get(e['key'])
+                    if prev is None or e['at'] >= prev['at']:
+                        latest[e['key']] = e
+
+        for name in legacy:
+            take(self.uploader.read(name))
+        merge = sorted(b for b in set(by_bucket) | set(entries) if b in entries or len(by_bucket.get(b, ())) > 1)
+        for bucket in merge:
+            for name in by_bucket.get(bucket, ()):
+                take(self.uploader.read(name))
+            self._write(f"{folder}{bucket}/month_{self.run_id}.ndjson",
+                        sorted(entries[bucket].values(), key=lambda e: (e['client_id'], e['date'], e['key'])))
+        # sources go only once their entries are stored again; a reader in between sees both
+        merged = legacy + [n for b in merge for n in by_bucket.get(b, ())]
+        for name in merged:
+            self.uploader.delete(name)
+        return len(merged)
+
+
+class ArchiveReader:
+    def __init__(self, uploader, prefix: str, cfg: Dict[str, Any] | None = None):
+        cfg = cfg or {}
+        self.uploader = uploader
+        self.dir = _index_dir(prefix)
+        self.part_size = max(1, int(cfg.get('read_part_size', 8 * 1024 * 1024)))
+        self.workers = max(1, int(cfg.get('read_workers', 8)))
+        self.verify = cfg.get('verify', True)
+
+    # -- listing -------------------------------------------------------------------------
+    def _index_parts(self, start: datetime.date | None, end: datetime.date | None,
+                     client_id: str | None = None) -> List[str]:
+        bucket = client_bucket(client_id) if client_id is not None else None
+
+        def wanted(name: str) -> bool:
+            # the client's bucket, or a part from before buckets, which holds every client
+            rest = name[len(self.dir) + 8:]
+            return bucket is None or '/' not in rest or rest.startswith(bucket + '/')
+
+        if start is None or end is None:
+            names = self.uploader.list(self.dir + '/')
+            # months outside an open-ended range are dropped by name
+            lo = f'{start:%Y%m}' if start else ''
+            hi = f'{end:%Y%m}' if end else '999999'
+            return [n for n in names if lo <= n[len(self.dir) + 1:][:6] <= hi and wanted(n)]
+        names: List[str] = []
+        for month in _months(start, end):
+            if bucket is None:
+                names.extend(self.uploader.list(f'{self.dir}/{month}/'))
+            else:
+                names.extend(self.uploader.list(f'{self.dir}/{month}/{bucket}/'))
+                names.extend(self.uploader.list(f'{self.dir}/{month}/part_'))
+        return names
+
+    def entries(self, client_id: str | None = None, start=None, end=None) -> List[Dict[str, Any]]:
+        """Index entries for a client (or all) within [start, end], by date, client and key.
+
+        Archives merged into a rollup are returned as entries of their rollup member (with
+        'rollup' set, plus 'offset' and 'source') instead of the original object.
+        """
+        start, end = _as_date(start), _as_date(end)
+        latest: Dict[str, Dict[str, Any]] = {}
+        parts = self._index_parts(start, end, client_id)
+        with ThreadPoolExecutor(max_workers=max(1, min(self.workers, len(parts)))) as pool:
+            datas = list(pool.map(self.uploader.read, parts))
+        for data in datas:
+            for line in (data or b'').splitlines():
+                if not line.strip():
+                    continue
+                e = json.loads(line)
+                if client_id is not None and e['client_id'] != client_id:
+                    continue
+                first = datetime.date.fromisoformat(e['date'])
+                last = datetime.date.fromisoformat(e.get('date_to') or e['date'])
+                if (start and last < start) or (end and first > end):
+                    continue
+                prev = latest.get(e['key'])
+                if prev is None or e['at'] >= prev['at']:
+                    latest[e['key']] = e
+        out: List[Dict[str, Any]] = []
+        replaced = set()
+        for e in latest.values():
+            if 'members' not in e:
+                out.append(e)
+                continue
+            for m in e['members']:
+                replaced.update(m['sources'] if 'sources' in m else (m['source'],))
+                day = datetime.date.fromisoformat(m['date'])
+                if (start and day < start) or (end and day > end):
+                    continue
+                out.append({'client_id': e['client_id'], 'date': m['date'], 'key': e['key'], 'path': e.get('path'),
+                            'offset': m['offset'], 'size': m['length'], 'count': m['count'], 'sha256': m['sha256'],
+                            'format': e['format'], 'at': e['at'], 'rollup': True, 'source': m.get('source')})
+        out = [e for e in out if e.get('rollup') or e['key'] not in replaced]
+        return sorted(out, key=lambda e: (e['date'], e['client_id'], e['key'], e.get('offset', 0)))
+
+    # -- reading -------------------------------------------------------------------------
+    def _ranges(self, entry: Dict[str, Any]) -> List[Tuple[int, int]]:
+        base, size = int(entry.get('offset', 0)), int(entry['size'])
+        if size <= self.part_size:
+            return [(base, size)]
+        return [(base + off, min(self.part_size, size - off)) for off in range(0, size, self.part_size)]
+
+    def _read(self, key: str, offset: int, length: int, whole: bool) -> bytes:
+        return self.uploader.read(key) if whole else self.uploader.read_range(key, offset, length)
+
+    def _check(self, entry: Dict[str, Any], data: bytes) -> bytes:
+        if data is None:
+            raise FileNotFoundError(f"Archive object {entry['key']} is missing")
+        if self.verify and hashlib.sha256(data).hexdigest() != entry['sha256']:
+            raise ValueError(f"Checksum mismatch for {entry['key']}")
+        return data
+
+    def iter_objects(self, entries: Iterable[Dict[str, Any]]) -> Iterator[Tuple[Dict[str, Any], bytes]]:
+        """(entry, object bytes) in entry order. Ranges of the next objects are read in parallel
+        while earlier ones are consumed; at most 2 * read_workers ranges are buffered."""
+        entries = iter(entries)
+        window: deque = deque()  # (entry, [futures]) in order
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='archive-read') as pool:
+            def fill():
+                queued = sum(len(fs) for _, fs in window)
+                while queued < 2 * self.workers:
+                    entry = next(entries, None)
+                    if entry is None:
+                        return
+                    ranges = self._ranges(entry)
+                    whole = len(ranges) == 1 and 'offset' not in entry
+                    window.append((entry, [pool.submit(self._read, entry['key'], o, n, whole) for o, n in ranges]))
+                    queued += len(ranges)
+
+            fill()
+            while window:
+                entry, futures = window.popleft()
+                data = b''.join(f.result() or b'' for f in futures) if len(futures) > 1 else futures[0].result()
+                fill()
+                yield entry, self._check(entry, data)
+
+    def fetch(self, entry: Dict[str, Any]) -> bytes:
+        return next(self.iter_objects([entry]))[1]
+
+    def iter_triggers(self, entries: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        for entry, data in self.iter_objects(entries):
+            yield from format_for_key(entry['key']).iter_decode(data)
+
+
+def _reader_from_config(cfg: Dict[str, Any]) -> ArchiveReader:
+    from .storage import uploader_for
+
+    bucket = os.environ.get('BUCKET') or cfg.get('bucket')
+    if not bucket:
+        raise SystemExit('BUCKET must be configured (env or cfg)')
+    prefix = os.environ.get('PREFIX', '') or cfg.get('prefix', '')
+    return ArchiveReader(uploader_for(bucket, prefix), (prefix or 'trigger').rstrip('/'), cfg.get('read', {}))
+
+
+def main(argv=None):
+    import yaml
+
+    parser = argparse.ArgumentParser(prog='pyarchiver-index', description='Query archived triggers via the index')
+    parser.add_argument('config', help='path to config.yaml')
+    parser.add_argument('command', choices=('list', 'fetch', 'stream'))
+    parser.add_argument('--client', help='client_id (default: all clients)')
+    parser.add_argument('--from', dest='start', help='first date, YYYY-MM-DD')
+    parser.add_argument('--to', dest='end', help='last date, YYYY-MM-DD')
+    parser.add_argument('--out', help='fetch: directory to write the objects to')
+    args = parser.parse_args(argv)
+    if args.command == 'fetch' and not args.out:
+        parser.error('fetch needs --out')
+    with open(args.config) as f:
+        cfg = yaml.safe_load(f) or {}
+
+    reader = _reader_from_config(cfg)
+    entries = reader.entries(args.client, args.start, args.end)
+    if args.command == 'list':
+        for e in entries:
+            print(json.dumps({k: e.get(k) for k in ENTRY_FIELDS}, separators=(',', ':')))
+    elif args.command == 'fetch':
+        for entry, data in reader.iter_objects(entries):
+            path = os.path.join(args.out, entry['key'])
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(data)
+            print(path)
+    else:
+        for t in reader.iter_triggers(entries):
+            sys.stdout.write(json.dumps(t, separators=(',', ':')) + '\n')
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -1,10 +1,92 @@
 """CLI entrypoint for the Python port of ArchiverApp
 Usage:
     python -m pyarchiver.archiver_app config.yaml
+    python -m pyarchiver.archiver_app config.yaml --clients [--shards N] [--budget S]
+    python -m pyarchiver.archiver_app config.yaml [--clients] --daemon [--interval S] [--jitter S]
+    python -m pyarchiver.archiver_app config.yaml [--clients] --compact [--budget S]
+
+--clients runs the per-client archiver (ArchiverLambdaService) with the same config; with
+--shards N the clients are partitioned by consistent hashing and archived by N local worker
+processes, and the merged run report is printed. Either way the report, including the run
+metrics, is also written to <output>/last_run_summary.json. --budget S schedules the clients
+largest-first (by their cost in earlier runs) and stops starting new ones when S seconds,
+minus the deadline margin, have passed; the clients left over are listed under 'deferred'.
+
+--compact merges the archives of past months into compressed rollups instead of archiving
+(compaction.py, settings in the config's `compaction` block): with --clients the per-client
+archives under BUCKET / PREFIX, otherwise the trigger_<id> objects of the configured storage.
+
+--daemon keeps polling every --interval seconds (plus up to --jitter seconds; defaults from the
+config's `daemon` block, 60 / 0) with one warm service until SIGTERM, see daemon.py. Without
+--clients the upload of one cycle overlaps the fetch of the next.
 """
+import argparse
+import json
 import sys
 import yaml
-from .archiver_service import ArchiverService
+from .archiver_service import ArchiverService, write_run_summary
+
+
+def _parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='pyarchiver', description='Archive trigger responses')
+    parser.add_argument('config', help='path to config.yaml')
+    parser.add_argument('--clients', action='store_true', help='run the per-client archiver')
+    parser.add_argument('--shards', type=int, default=1, help='with --clients: number of local worker processes')
+    parser.add_argument('--budget', type=float, help='with --clients or --compact: time budget of the run, seconds')
+    parser.add_argument('--compact', action='store_true', help='compact past months into rollups and exit')
+    parser.add_argument('--daemon', action='store_true', help='keep polling until SIGTERM')
+    parser.add_argument('--interval', type=float, help='with --daemon: seconds between cycles')
+    parser.add_argument('--jitter', type=float, help='with --daemon: random extra delay per cycle, seconds')
+    return parser
+
+
+def _run_daemon(cfg: dict, args) -> int:
+    from .daemon import ArchiverDaemon
+
+    dcfg = cfg.get('daemon') or {}
+    opts = {
+        'interval': args.interval if args.interval is not None else dcfg.get('interval', 60),
+        'jitter': args.jitter if args.jitter is not None else dcfg.get('jitter', 0),
+    }
+    if args.clients:
+        from .archiver_lambda_service import ArchiverLambdaService
+
+        svc = ArchiverLambdaService(cfg)
+
+        def archive(_):
+            summary = svc.run_once()
+            write_run_summary(cfg, summary)
+            return summary
+
+        daemon = ArchiverDaemon(lambda: None, archive, **opts)
+    else:
+        daemon = ArchiverDaemon.for_service(ArchiverService(cfg), **opts)
+    daemon.run()
+    return 0
+
+
+def _run_clients(cfg: dict, shards: int, budget: float | None = None) -> dict:
+    from .archiver_lambda_service import REQUIRED_SCOPE, ArchiverLambdaService
+    from .client_fetcher import ClientFetcher
+    from .scheduler import Deadline
+    from .sharding import Coordinator, ProcessPoolInvoker
+
+    if shards <= 1:
+        svc = ArchiverLambdaService(cfg)
+        deadline = Deadline.from_budget(budget, svc.deadline_margin) if budget else None
+        return svc.run_once(deadline=deadline)
+    fetcher = ClientFetcher(cfg.get('client_fetch', {}))
+    return Coordinator(fetcher, ProcessPoolInvoker(cfg, shards, budget), shards, scope=REQUIRED_SCOPE).run()
+
+
+def _run_compaction(cfg: dict, clients: bool, budget: float | None = None) -> dict:
+    from .compaction import Compactor
+    from .scheduler import Deadline
+
+    deadline = Deadline.from_budget(budget, float(cfg.get('deadline_margin', 10))) if budget else None
+    if clients:
+        return Compactor.for_clients(cfg, deadline).run('clients')
+    return Compactor(ArchiverService(cfg).uploader, '', cfg.get('compaction'), deadline).run('triggers')
 
 
 def main(argv=None):
@@ -13,10 +95,30 @@ def main(argv=None):
         print("Usage: python -m pyarchiver.archiver_app <config.yml>")
         return 2
 
-    config_file = argv[0]
+    args = _parser().parse_args(argv)
+    config_file = args.config
     with open(config_file, 'r') as f:
         cfg = yaml.safe_load(f)
 
+    if args.compact:
+        if args.daemon or args.shards > 1:
+            _parser().error('--compact runs once in a single process; drop --daemon / --shards')
+        summary = _run_compaction(cfg or {}, args.clients, args.budget)
+        print(json.dumps(summary, indent=2))
+        return 1 if summary['failed'] else 0
+    if args.budget is not None and not args.clients:
+        _parser().error('--budget applies to --clients runs')
+    if args.daemon:
+        if args.shards > 1:
+            _parser().error('--daemon runs a single process; drop --shards')
+        return _run_daemon(cfg or {}, args)
+
+    if args.clients:
+        summary = _run_clients(cfg or {}, args.shards, args.budget)
+        print(json.dumps(summary, indent=2))
+        write_run_summary(cfg, summary)
+        return 0
+
     svc = ArchiverService(cfg)
     svc.run_once()
     return 0
@@ -1,123 +1,485 @@
 """Service to implement required archiving workflow described in the ticket.
 
-- Finds clients (via ClientFetcher)
-- Filters clients that have scope 'dex/trigger:all'
+- Finds clients (via ClientFetcher) and keeps them normalized in a ClientRegistry
+  (dao/registry.py): only new or changed clients are rebuilt on each run, and within
+  CLIENT_REGISTRY_TTL the registry is used without calling the clients API at all
+- Archives the registry's clients that have scope 'dex/trigger:all'
 - For each client, obtains an OAuth token via TokenProvider (client credentials) if available
 - Calls trigger endpoint for that client using TriggerFetcher
-- Uploads the raw JSON response to S3 at key: trigger/<clientid>/<clientid>_trigger_yyyymmdd.json
+- Uploads the response to S3 at key: trigger/<clientid>/<clientid>_trigger_yyyymmdd.<suffix>
+  (suffix and encoding depend on the archive format, pretty JSON `.json` by default)
 
 Notes:
 - Uses environment variables as fallback configuration:
   - BUCKET, PREFIX (for S3Uploader)
   - TRIGGER_BASE_URL if client doesn't have trigger_url
   - CLIENT_TOKEN_URL if client-specific token endpoint isn't provided
+  - MAX_WORKERS / MAX_PER_HOST to process clients concurrently (default: one at a time)
+  - ARCHIVE_FORMAT (or cfg 'format') to pick the archive format, see storage/formats.py
+  - STREAM_TRIGGERS=1 (or cfg 'stream') to pipe each trigger response into the uploader
+    incrementally instead of materializing it
+  - INCREMENTAL=skip|delta (or cfg 'incremental') to skip unchanged clients or upload only
+    new/changed triggers, tracked by a per-client manifest (incremental runs do not stream)
+  - RUN_JOURNAL=1 (or cfg 'journal') to checkpoint per-client progress under
+    <prefix>/_journal/<yyyymmdd>/ so a restarted run skips clients already uploaded today
+    (see journal.py)
+- Records every uploaded archive (client, date, key, size, trigger count, sha256) in the
+  manifest index under <prefix>/_index/ unless ARCHIVE_INDEX=0 (or cfg 'archive_index'
+  false); archive_index.ArchiveReader queries it (see archive_index.py)
+- run_once(deadline=...) schedules clients largest-first by their cost in earlier runs and
+  stops launching clients DEADLINE_MARGIN_S (or cfg 'deadline_margin', default 10) seconds
+  before the deadline; the rest are listed under 'deferred' (see scheduler.py). Clients
+  streamed from the clients API are ordered within a lookahead of SCHEDULE_LOOKAHEAD (or cfg
+  'schedule_lookahead', default 100) clients instead of fetching them all first
+- TRIGGER_VALIDATION=basic|strict (or cfg 'validation') checks each client's triggers while
+  they are archived (default 'off': responses are archived as received); rejected triggers
+  are counted under 'invalid' and, with TRIGGER_QUARANTINE=1, written under
+  <prefix>/_quarantine/ (see trigger/validation.py)
+- Times each client's token / fetch / parse / serialize / upload phases and reports them,
+  with byte counts, latency percentiles and peak RSS, under 'metrics' (see metrics.py)
 
 """
 import os
-import json
 import datetime
-from typing import List, Dict, Any
+import contextlib
+import hashlib
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Iterable, List, Dict, Any
+from urllib.parse import urlparse
 
+from .archive_index import ArchiveIndex
 from .client_fetcher import ClientFetcher
+from .dao.registry import ClientRegistry
+from .http_client import HttpClient
+from .journal import RunJournal
+from .metrics import RunMetrics
+from .models.client_record import ClientRecord
+from .incremental import MANIFEST_NAME, MODES as INCREMENTAL_MODES, IncrementalPlan, load_manifest, save_manifest
+from .scheduler import CostHistory, Deadline
+from .sharding import HashRing
 from .token_provider import TokenProvider
 from .trigger.trigger_fetcher import TriggerFetcher
-from .storage.s3_uploader import S3Uploader
+from .trigger.validation import Quarantine, TriggerValidator
+from .storage import uploader_for
+from .storage.formats import get_format
+
+REQUIRED_SCOPE = 'dex/trigger:all'
 
 
 class ArchiverLambdaService:
-    def __init__(self, cfg: Dict[str, Any] | None = None):
+    def __init__(self, cfg: Dict[str, Any] | None = None, http: HttpClient | None = None,
+                 token_provider: TokenProvider | None = None, registry: ClientRegistry | None = None):
         self.cfg = cfg or {}
-        self.client_fetcher = ClientFetcher(self.cfg.get('client_fetch', {}))
-        self.token_provider = TokenProvider(self.cfg.get('token', {}))
+        # one pooled transport shared by client discovery, token exchange and every trigger fetch;
+        # the Lambda handler passes process-wide ones so warm invocations keep connections and tokens
+        self.http = http or HttpClient(self.cfg.get('http', {}))
+        self.client_fetcher = ClientFetcher(self.cfg.get('client_fetch', {}), http=self.http)
+        self.token_provider = token_provider or TokenProvider(self.cfg.get('token', {}), http=self.http)
+        # the Lambda handler passes a process-wide registry so warm invocations keep it
+        self.registry = registry or ClientRegistry.from_config(self.cfg)
 
         bucket = os.environ.get('BUCKET') or self.cfg.get('bucket')
         if not bucket:
             raise RuntimeError('BUCKET must be configured (env or cfg)')
         prefix = os.environ.get('PREFIX', '') or self.cfg.get('prefix', '')
-        # Support local filesystem uploads when BUCKET is an absolute path (useful for local testing)
-        if os.path.isabs(bucket) or bucket.startswith('.') or bucket.startswith('/'):  # treat as local directory
-            from .storage.local_uploader import LocalUploader
-
-            local_dir = os.path.join(bucket, prefix) if prefix else bucket
-            self.uploader = LocalUploader({'local_dir': local_dir})
-        else:
-            self.uploader = S3Uploader({'bucket': bucket, 'prefix': prefix})
+        # a local directory when BUCKET is a path (useful for local testing), else S3
+        self.uploader = uploader_for(bucket, prefix)
 
-        self.trigger_base = os.environ.get('TRIGGER_BASE_URL') or self.cfg.get('trigger_base_url')
-        self.client_token_url = os.environ.get('CLIENT_TOKEN_URL') or self.cfg.get('client_token_url')
+        # bounded concurrency: per-run worker limit and per trigger host limit (0 = unlimited)
+        self.max_workers = int(os.environ.get('MAX_WORKERS') or self.cfg.get('max_workers', 1))
+        self.max_per_host = int(os.environ.get('MAX_PER_HOST') or self.cfg.get('max_per_host', 0))
+        self._host_slots: Dict[str, threading.BoundedSemaphore] = {}
+        self._host_lock = threading.Lock()
+        self.format = get_format(os.environ.get('ARCHIVE_FORMAT') or self.cfg.get('format'))
+        self.incremental = (os.environ.get('INCREMENTAL') or self.cfg.get('incremental') or 'off').lower()
+        if self.incremental not in INCREMENTAL_MODES:
+            raise ValueError(f"incremental must be one of {INCREMENTAL_MODES}, got {self.incremental!r}")
+        self.journal_enabled = str(os.environ.get('RUN_JOURNAL') or self.cfg.get('journal', '')).lower() in ('1', 'true', 'yes')
+        self._journal: RunJournal | None = None
+        self.index_enabled = str(os.environ.get('ARCHIVE_INDEX') or self.cfg.get('archive_index', True)).lower() \
+            not in ('0', 'false', 'no', 'off')
+        self._index: ArchiveIndex | None = None
+        self.validator = TriggerValidator.from_config(self.cfg, default_level='off')
+        self._quarantine: Quarantine | None = None
+        self._run_date = datetime.datetime.utcnow()
+        self.metrics = RunMetrics()
+        self.stream = str(os.environ.get('STREAM_TRIGGERS') or self.cfg.get('stream', '')).lower() in ('1', 'true', 'yes')
+        self.deadline_margin = float(os.environ.get('DEADLINE_MARGIN_S') or self.cfg.get('deadline_margin', 10))
+        self.schedule_lookahead = int(os.environ.get('SCHEDULE_LOOKAHEAD') or self.cfg.get('schedule_lookahead', 100))
 
     def _format_filename(self, client_id: str, dt: datetime.datetime) -> str:
         d = dt.strftime('%Y%m%d')
-        return f"{client_id}_trigger_{d}.json"
-
-    def run_once(self) -> Dict[str, Any]:
-        clients = self.client_fetcher.get_clients()
-        if not clients:
-            return {'archived': []}
-
-        results: List[Dict[str, Any]] = []
-        today = datetime.datetime.utcnow()
-        for c in clients:
-            # Determine scopes list
-            scopes = c.get('scopes') or c.get('scope') or []
-            if isinstance(scopes, str):
-                scopes = [scopes]
-            if 'dex/trigger:all' not in scopes:
-                # skip clients without required scope
-                continue
+        return f"{client_id}_trigger_{d}{self.format.suffix}"
 
-            client_id = c.get('client_id') or c.get('ClientID') or c.get('oauth_client_id')
-            if not client_id:
-                # must have id
-                continue
+    def _root_prefix(self) -> str:
+        # Use configured prefix (if provided) as the root; otherwise use 'trigger'
+        prefix = os.environ.get('PREFIX') or self.cfg.get('prefix', '')
+        return (prefix or 'trigger').rstrip('/')
 
-            # Determine trigger URL per client
-            trigger_url = c.get('trigger_url') or (self.trigger_base.rstrip('/') + '/data-exchange/trigger' if self.trigger_base else None)
-            # compute sample_count early (used to decide if we should use sample fallback)
-            sample_count = c.get('sample_count')
-            if sample_count is None:
-                sample_count = self.cfg.get('api', {}).get('sample_count', 0)
+    def _mark(self, client_id: str, state: str, **fields):
+        if self._journal is not None:
+            self._journal.record(client_id, state, **fields)
 
-            # if there is no trigger_url, allow a fallback to sample data when sample_count > 0
-            if not trigger_url and (sample_count is None or int(sample_count) == 0):
-                # nothing to fetch
-                continue
+    def _host_slot(self, url: str | None) -> threading.BoundedSemaphore | None:
+        """Return the semaphore bounding concurrent requests to the host of `url`."""
+        if not url or self.max_per_host <= 0:
+            return None
+        host = urlparse(url).netloc
+        with self._host_lock:
+            slot = self._host_slots.get(host)
+            if slot is None:
+                slot = threading.BoundedSemaphore(self.max_per_host)
+                self._host_slots[host] = slot
+            return slot
 
-            # Obtain token if client credentials are present
-            token = None
-            oauth_id = c.get('oauth_client_id')
-            oauth_secret = c.get('oauth_client_secret')
-            token_url = c.get('token_url') or self.client_token_url
-            if oauth_id and oauth_secret and token_url:
-                try:
-                    token = self.token_provider.get_token_for_client(oauth_id, oauth_secret, token_url, scope='dex/trigger:all')
-                except Exception as e:
-                    # log and skip
-                    print(f"Token exchange failed for client {client_id}: {e}")
-                    continue
+    def _archive_client(self, c: ClientRecord, today: datetime.datetime) -> Dict[str, Any] | None:
+        """Run the token -> fetch -> upload chain for a single client.
+
+        Returns the archived entry, a `{'client_id', 'error'}` dict on failure, or None
+        when the client is not eligible for archiving.
+        """
+        if REQUIRED_SCOPE not in c.scopes:
+            # skip clients without required scope
+            return None
+
+        client_id = c.client_id
+        # per-client trigger URL, or the one built from TRIGGER_BASE_URL (resolved by the registry)
+        trigger_url = c.trigger_url
+        # compute sample_count early (used to decide if we should use sample fallback)
+        sample_count = c.sample_count
+        if sample_count is None:
+            sample_count = self.cfg.get('api', {}).get('sample_count', 0)
 
-            # Fetch triggers using TriggerFetcher (fetcher_url already set accordingly)
-            fetcher_url = trigger_url if trigger_url else None
-            fetcher = TriggerFetcher({'url': fetcher_url, 'sample_count': sample_count})
+        # if there is no trigger_url, allow a fallback to sample data when sample_count > 0
+        if not trigger_url and (sample_count is None or int(sample_count) == 0):
+            # nothing to fetch
+            return None
+
+        # Obtain token if client credentials are present
+        token = None
+        cred = self.registry.credential_for(client_id)
+        oauth_id = cred.oauth_client_id if cred else None
+        oauth_secret = cred.secret if cred else None
+        token_url = c.token_url
+        if oauth_id and oauth_secret and token_url:
             try:
+                with self.metrics.phase('token', client_id):
+                    token = self.token_provider.get_token_for_client(oauth_id, oauth_secret, token_url, scope=REQUIRED_SCOPE)
+            except Exception as e:
+                print(f"Token exchange failed for client {client_id}: {e}")
+                return {'client_id': client_id, 'error': f'token: {e}'}
+
+        key = f"{self._root_prefix()}/{client_id}/{self._format_filename(client_id, today)}"
+        self._mark(client_id, 'pending')
+
+        # Fetch triggers using TriggerFetcher (fetcher_url already set accordingly)
+        fetcher_url = trigger_url if trigger_url else None
+        fetcher = TriggerFetcher({'url': fetcher_url, 'sample_count': sample_count}, http=self.http,
+                                 metrics=self.metrics, client_id=client_id)
+        slot = self._host_slot(fetcher_url) or contextlib.nullcontext()
+        if self.stream and self.incremental == 'off':
+            return self._stream_client(client_id, key, fetcher, token, slot)
+
+        try:
+            with slot:
                 triggers = fetcher.fetch_triggers(token=token)
+        except Exception as e:
+            print(f"Fetching triggers failed for client {client_id}: {e}")
+            return {'client_id': client_id, 'error': f'fetch: {e}'}
+        self._mark(client_id, 'fetched')
+
+        # if response is list or single object, store it in the configured archive format
+        payload = triggers if isinstance(triggers, list) else [triggers]
+        rejected: List[str] = []
+        if self.validator.level != 'off':
+            payload = list(self.validator.filter(payload, rejected, self._quarantine, client_id))
+        if self.incremental != 'off':
+            return self._with_invalid(self._archive_incremental(client_id, key, payload, today), rejected)
+        try:
+            s3_path = self._encode_upload(client_id, key, payload)
+        except Exception as e:
+            print(f"Failed to upload triggers for {client_id}: {e}")
+            return {'client_id': client_id, 'error': f'upload: {e}'}
+        return self._with_invalid({'client_id': client_id, 's3': s3_path, 'count': len(payload)}, rejected)
+
+    @staticmethod
+    def _with_invalid(entry: Dict[str, Any], rejected: List[str]) -> Dict[str, Any]:
+        if rejected and 'error' not in entry:
+            entry['invalid'] = len(rejected)
+        return entry
+
+    def _record_upload(self, client_id: str, key: str, path: str, size: int, count: int, sha256: str):
+        if self._index is not None:
+            self._index.record(client_id, self._run_date, key, path, size, count, sha256, self.format.name)
+
+    def _encode_upload(self, client_id: str, key: str, triggers: List[Any], with_size: bool = False):
+        with self.metrics.phase('serialize', client_id):
+            data = self.format.encode(triggers)
+        self.metrics.add_bytes('serialize', len(data), client_id)
+        with self.metrics.phase('upload', client_id):
+            s3_path = self.uploader.upload(key, data, **self.format.upload_args())
+        self.metrics.add_bytes('upload', len(data), client_id)
+        self._record_upload(client_id, key, s3_path, len(data), len(triggers), hashlib.sha256(data).hexdigest())
+        return (s3_path, len(data)) if with_size else s3_path
+
+    def _archive_incremental(self, client_id: str, key: str, payload: List[Any], today: datetime.datetime) -> Dict[str, Any]:
+        """Upload only what changed since the client's manifest (see incremental.py)."""
+        manifest_name = f"{key.rsplit('/', 1)[0]}/{MANIFEST_NAME}"
+        try:
+            manifest = load_manifest(self.uploader, manifest_name)
+        except Exception as e:
+            print(f"Reading manifest failed for {client_id}, archiving in full: {e}")
+            manifest = None
+        plan = IncrementalPlan(self.incremental, payload, manifest)
+        if plan.skip:
+            print(f"Unchanged triggers for {client_id}; skipping upload")
+            return {'client_id': client_id, 's3': manifest.get('path'), 'count': len(payload), 'skipped': True,
+                    'saved_bytes': plan.saved_bytes, 'saved_objects': 1}
+
+        if plan.is_delta:
+            # timestamped so several deltas on the same day never overwrite each other
+            key = f"{key[:-len(self.format.suffix)]}_delta_{today:%H%M%S}{self.format.suffix}"
+        try:
+            s3_path, nbytes = self._encode_upload(client_id, key, plan.triggers, with_size=True)
+            save_manifest(self.uploader, manifest_name, plan.manifest(key, s3_path, nbytes))
+        except Exception as e:
+            print(f"Failed to upload triggers for {client_id}: {e}")
+            return {'client_id': client_id, 'error': f'upload: {e}'}
+        entry = {'client_id': client_id, 's3': s3_path, 'count': len(payload), 'saved_bytes': plan.saved_bytes, 'saved_objects': 0}
+        if plan.is_delta:
+            entry['delta'] = len(plan.triggers)
+        return entry
+
+    def _stream_client(self, client_id: str, key: str, fetcher: TriggerFetcher, token: str | None, slot) -> Dict[str, Any]:
+        """Pipe the trigger response into the uploader chunk by chunk; memory stays bounded
+        by the stream chunk size regardless of how many triggers the client returns."""
+        count = 0
+        size = 0
+        digest = hashlib.sha256()
+
+        def counted(triggers):
+            nonlocal count
+            for t in triggers:
+                count += 1
+                yield t
+
+        def measured(chunks):
+            nonlocal size
+            for chunk in chunks:
+                self.metrics.add_bytes('upload', len(chunk), client_id)
+                size += len(chunk)
+                digest.update(chunk)
+                yield chunk
+
+        # the host slot is held for the whole body since it is read while uploading
+        with slot:
+            try:
+                triggers = fetcher.iter_triggers(token=token)
             except Exception as e:
                 print(f"Fetching triggers failed for client {client_id}: {e}")
+                return {'client_id': client_id, 'error': f'fetch: {e}'}
+            self._mark(client_id, 'fetched')
+            rejected: List[str] = []
+            if self.validator.level != 'off':
+                triggers = self.validator.filter(triggers, rejected, self._quarantine, client_id)
+            try:
+                # reading, parsing, encoding and uploading overlap here, so they are one phase
+                with self.metrics.phase('upload', client_id):
+                    s3_path = self.uploader.upload_stream(key, measured(self.format.iter_encode(counted(triggers))),
+                                                          **self.format.upload_args())
+            except Exception as e:
+                print(f"Failed to stream triggers for {client_id}: {e}")
+                return {'client_id': client_id, 'error': f'upload: {e}'}
+        self._record_upload(client_id, key, s3_path, size, count, digest.hexdigest())
+        return self._with_invalid({'client_id': client_id, 's3': s3_path, 'count': count}, rejected)
+
+    def _archive_client_safe(self, c: ClientRecord, today: datetime.datetime) -> Dict[str, Any] | None:
+        if self._journal is not None and (done := self._journal.completed(c.client_id)):
+            # archived by an earlier, interrupted run today
+            return {'client_id': done['client_id'], 's3': done.get('s3'), 'count': done.get('count', 0), 'resumed': True}
+        # never let one client's unexpected error take down the pool
+        try:
+            outcome = self._archive_client(c, today)
+        except Exception as e:
+            client_id = c.client_id
+            print(f"Archiving failed for client {client_id}: {e}")
+            outcome = {'client_id': client_id, 'error': str(e)}
+        if outcome and outcome.get('client_id'):
+            if 'error' in outcome:
+                self._mark(outcome['client_id'], 'failed', error=outcome['error'])
+            else:
+                self._mark(outcome['client_id'], 'uploaded', s3=outcome.get('s3'), count=outcome.get('count', 0))
+        return outcome
+
+    def _run_ordered(self, clients: Iterable[ClientRecord], today: datetime.datetime) -> List[Dict[str, Any] | None]:
+        """Archive clients on the worker pool as they arrive from the (paged) client stream.
+
+        At most 2 * max_workers clients are queued at a time, and outcomes are collected in
+        arrival order so the summary is deterministic.
+        """
+        outcomes: List[Dict[str, Any] | None] = []
+        window = deque()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            for c in clients:
+                window.append(pool.submit(self._archive_client_safe, c, today))
+                while len(window) >= 2 * self.max_workers:
+                    outcomes.append(window.popleft().result())
+            while window:
+                outcomes.append(window.popleft().result())
+        return outcomes
+
+    def _run_scheduled(self, clients: Iterable[ClientRecord], today: datetime.datetime, deadline: Deadline,
+                       history: CostHistory, lookahead: int | None = None):
+        """Archive clients largest-first while the deadline allows; returns (outcomes, deferred ids, seconds).
+
+        Only max_workers clients are in flight, so each one is checked against the deadline
+        right before it starts rather than when it is queued. With a `lookahead` the clients
+        are read from `clients` as workers free up and ordered within that many of them.
+        """
+        default = history.default_estimate()
+        futures, deferred, took = [], [], {}
+        running = set()
+
+        def timed(cid, c):
+            t0 = time.perf_counter()
+            try:
+                return self._archive_client_safe(c, today)
+            finally:
+                took[cid] = time.perf_counter() - t0
+
+        workers = max(1, self.max_workers)
+        ordered = history.iter_largest_first(clients, lambda rec: rec.client_id, lookahead)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            while True:
+                # wait for a free worker first, so the choice is made among the most clients
+                if len(running) >= workers:
+                    _, running = wait(running, return_when=FIRST_COMPLETED)
+                c = next(ordered, None)
+                if c is None:
+                    break
+                cid = c.client_id
+                # clients already uploaded today (journal) only cost a lookup
+                resumed = self._journal is not None and self._journal.completed(cid)
+                if not resumed and not deadline.allows(history.estimate(cid, default)):
+                    deferred.append(cid)
+                    continue
+                future = pool.submit(timed, cid, c)
+                futures.append(future)
+                running.add(future)
+        if deferred:
+            print(f"Deferred {len(deferred)} clients to stay within the deadline: {', '.join(deferred)}")
+        return [f.result() for f in futures], deferred, took
+
+    def _record_costs(self, history: CostHistory, outcomes, took: Dict[str, float]):
+        per_client = self.metrics.summary()['clients']
+        for o in outcomes:
+            # failed and resumed clients say nothing about how long a full archive takes
+            if not o or 'error' in o or o.get('resumed') or o['client_id'] not in took:
                 continue
+            cid = o['client_id']
+            history.record(cid, took[cid], int(per_client.get(cid, {}).get('upload_bytes', 0)))
+        try:
+            history.save()
+        except Exception as e:
+            print(f"Saving client cost history failed: {e}")
+
+    def _clients(self) -> Iterable[ClientRecord]:
+        """Eligible clients: straight from the registry while it is fresh, else streamed from the
+        clients API through the registry, so archiving starts with the first page. The scope is
+        applied by the fetcher, so ineligible clients never reach the registry or its snapshot."""
+        if self.registry.is_fresh():
+            return iter(self.registry.by_scope(REQUIRED_SCOPE))
+        return self.registry.sync(self.client_fetcher.get_clients(scope=REQUIRED_SCOPE))
 
-            # if response is list or single object, store raw JSON
-            payload = triggers
-            filename = self._format_filename(client_id, today)
-            # Use configured prefix (if provided) as the root; otherwise use 'trigger'
-            root_prefix = prefix if (prefix := (os.environ.get('PREFIX') or self.cfg.get('prefix', ''))) else 'trigger'
-            key = f"{root_prefix.rstrip('/')}/{client_id}/{filename}"
-            data = json.dumps(payload, indent=2)
+    def run_once(self, shard: int | None = None, of: int | None = None,
+                 client_ids: List[str] | None = None, deadline: Deadline | None = None) -> Dict[str, Any]:
+        """Archive every eligible client, or only one shard of them.
+
+        A sharded worker processes the `client_ids` its coordinator assigned, or, when none are
+        given, the clients that hash to `shard` out of `of` (see sharding.HashRing).
+
+        With a `deadline` the clients are scheduled largest-first and those that would not
+        finish before it are returned under 'deferred' instead of being started.
+        """
+        refreshed_before = self.registry.refreshed_at
+        # a fresh registry is already in memory and is ordered whole; a streamed fetch is not drained
+        lookahead = None if self.registry.is_fresh() else self.schedule_lookahead
+        clients = self._clients()
+        if client_ids is not None:
+            wanted = set(client_ids)
+            clients = (c for c in clients if c.client_id in wanted)
+        elif of and int(of) > 1:
+            ring = HashRing(int(of))
+            clients = (c for c in clients if ring.shard_for(c.client_id) == int(shard or 0))
+
+        today = self._run_date = datetime.datetime.utcnow()
+        self.metrics = RunMetrics()
+        http_before = self.http.stats()
+        if self.journal_enabled:
+            self._journal = RunJournal(self.uploader, self._root_prefix(), today, self.cfg)
             try:
-                s3_path = self.uploader.upload(key, data.encode('utf-8'))
-                results.append({'client_id': client_id, 's3': s3_path, 'count': len(triggers) if isinstance(triggers, list) else 1})
+                self._journal.load()
             except Exception as e:
-                print(f"Failed to upload triggers for {client_id}: {e}")
-                continue
+                print(f"Reading run journal failed, starting from scratch: {e}")
+        if self.index_enabled:
+            self._index = ArchiveIndex(self.uploader, self._root_prefix(), self.cfg)
+        if self.validator.quarantine:
+            self._quarantine = Quarantine(self.uploader, self._root_prefix(), today)
+        deferred = None
+        try:
+            if deadline is not None:
+                history = CostHistory(self.uploader, self._root_prefix(), shard)
+                try:
+                    history.load()
+                except Exception as e:
+                    print(f"Reading client cost history failed, using arrival order: {e}")
+                outcomes, deferred, took = self._run_scheduled(clients, today, deadline, history, lookahead)
+                self._record_costs(history, outcomes, took)
+            elif self.max_workers <= 1:
+                outcomes = [self._archive_client_safe(c, today) for c in clients]
+            else:
+                # each client's token -> fetch -> upload chain runs independently
+                outcomes = self._run_ordered(clients, today)
+        finally:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+            if self._index is not None:
+                try:
+                    self._index.close()
+                except Exception as e:
+                    print(f"Writing archive index failed: {e}")
+                self._index = None
+            if self._quarantine is not None:
+                try:
+                    self._quarantine.close()
+                except Exception as e:
+                    print(f"Writing quarantined triggers failed: {e}")
+                self._quarantine = None
+        if self.registry.refreshed_at != refreshed_before and self.registry.snapshot_file:
+            try:
+                self.registry.save_snapshot()
+            except Exception as e:
+                print(f"Saving client registry snapshot failed: {e}")
 
-        return {'archived': results, 'count': len(results)}
- 
\ No newline at end of file
+        results: List[Dict[str, Any]] = [o for o in outcomes if o and 'error' not in o]
+        failed: List[Dict[str, Any]] = [o for o in outcomes if o and 'error' in o]
+        # the transport may outlive this run (warm Lambda); report only this run's traffic
+        http_stats = self.http.stats(since=http_before)
+        summary = {'archived': results, 'count': len(results), 'failed': failed, 'http': http_stats,
+                   'metrics': self.metrics.summary(http_stats)}
+        if self.incremental != 'off':
+            summary['saved'] = {
+                'bytes': sum(r.get('saved_bytes', 0) for r in results),
+                'objects': sum(r.get('saved_objects', 0) for r in results),
+            }
+        if self.validator.level != 'off':
+            summary['invalid'] = sum(r.get('invalid', 0) for r in results)
+        if deferred is not None:
+            summary['deferred'] = deferred
+        if self.journal_enabled:
+            summary['resumed'] = sum(1 for r in results if r.get('resumed'))
+        return summary
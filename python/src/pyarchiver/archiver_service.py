@@ -1,45 +1,139 @@
-"""Core orchestration: fetch triggers, validate and upload"""
+"""Core orchestration: fetch triggers, validate and upload
+
+With `dedupe: true` in the config (or DEDUPE=1) triggers whose id is already in the seen-id
+index under the archive prefix are not uploaded again (see seen_index.py).
+
+Triggers are checked by the validation stage of trigger/validation.py (cfg `validation`, default
+level 'basic': an id is required) in the same pass that uploads them; the summary reports how
+many were rejected under `invalid`.
+"""
 import os
 import json
+from typing import Any, Dict
+
+from .http_client import HttpClient
+from .metrics import RunMetrics
+from .seen_index import SeenIndex
 from .trigger.trigger_fetcher import TriggerFetcher
+from .trigger.validation import Quarantine, TriggerValidator
+from .storage.formats import get_format
 from .storage.local_uploader import LocalUploader
 from .storage.s3_uploader import S3Uploader
+from .storage.segment_writer import SegmentWriter
 
 
 class ArchiverService:
     def __init__(self, cfg: dict):
         self.cfg = cfg or {}
-        self.fetcher = TriggerFetcher(self.cfg.get('api', {}))
+        self.http = HttpClient(self.cfg.get('http', {}))
+        self.metrics = RunMetrics()
+        self.fetcher = TriggerFetcher(self.cfg.get('api', {}), http=self.http, metrics=self.metrics)
         storage_cfg = self.cfg.get('storage', {})
+        self.storage_cfg = storage_cfg
+        # 'per_object' (one trigger_<id> object each) or 'segments' (packed NDJSON + index)
+        self.layout = os.environ.get('ARCHIVE_LAYOUT') or storage_cfg.get('layout', 'per_object')
         if storage_cfg.get('type') == 's3':
             self.uploader = S3Uploader(storage_cfg)
         else:
             self.uploader = LocalUploader(storage_cfg)
+        self.format = get_format(os.environ.get('ARCHIVE_FORMAT') or self.cfg.get('format'))
+        self.validator = TriggerValidator.from_config(self.cfg, min_level='basic')
+        self.dedupe = str(os.environ.get('DEDUPE') or self.cfg.get('dedupe', '')).lower() in ('1', 'true', 'yes')
+        # loaded on first use and kept for later cycles of a daemon
+        self._seen: SeenIndex | None = None
+
+    def seen_index(self) -> SeenIndex:
+        if self._seen is None:
+            self._seen = SeenIndex(self.uploader, self.storage_cfg).load()
+        else:
+            # picks up what other writers saved since the last cycle
+            self._seen.refresh()
+        return self._seen
 
     def run_once(self):
         """Perform one fetch/process/upload cycle"""
+        return self.archive(*self.fetch())
+
+    def fetch(self):
+        """First half of a cycle: fetch the triggers. Returns (triggers, metrics, http stats) for archive()."""
+        metrics = self.fetcher.metrics = RunMetrics()
+        # the HttpClient lives as long as the service: report this fetch's requests only
+        http_before = self.http.stats()
         triggers = self.fetcher.fetch_triggers()
         print(f"Found {len(triggers)} triggers to archive")
+        return triggers, metrics, self.http.stats(since=http_before)
+
+    def archive(self, triggers, metrics: RunMetrics | None = None, http_stats: Dict[str, Any] | None = None):
+        """Second half of a cycle: upload fetched triggers and write the run summary.
+
+        Only touches the uploader, so the daemon can run it while the next fetch() is in flight;
+        `http_stats` are the counters of the fetch that produced `triggers`.
+        """
+        self.metrics = metrics = metrics or RunMetrics()
         archived = []
-        for t in triggers:
-            # validate minimal fields
-            if not t.get('id'):
-                print(f"Skipping trigger with missing id: {t}")
-                continue
-            filename = f"trigger_{t['id']}.json"
-            data = json.dumps(t, indent=2)
-            path = self.uploader.upload(filename, data.encode('utf-8'))
-            archived.append({'id': t['id'], 'path': path})
-            print(f"Archived trigger {t['id']} -> {path}")
+        seen = self.seen_index() if self.dedupe else None
+        skipped = 0
+        rejected = []
+        quarantine = Quarantine(self.uploader) if self.validator.quarantine else None
+        writer = SegmentWriter(self.uploader, self.storage_cfg) if self.layout == 'segments' else None
+        try:
+            for t in self.validator.filter(triggers, rejected, quarantine):
+                if seen is not None and t['id'] in seen:
+                    skipped += 1
+                    continue
+                if writer is not None:
+                    with metrics.phase('serialize'):
+                        writer.add(t)
+                else:
+                    filename = f"trigger_{t['id']}{self.format.suffix}"
+                    with metrics.phase('serialize'):
+                        data = self.format.encode_one(t)
+                    metrics.add_bytes('serialize', len(data))
+                    with metrics.phase('upload'):
+                        path = self.uploader.upload(filename, data, **self.format.upload_args())
+                    metrics.add_bytes('upload', len(data))
+                    archived.append({'id': t['id'], 'path': path})
+                    print(f"Archived trigger {t['id']} -> {path}")
+                if seen is not None:
+                    # pending until save(); also skips repeats of the id later in this batch
+                    seen.add(t['id'])
+            if writer is not None:
+                # the writer uploads full segments from add(); only the final flush is timed here
+                with metrics.phase('upload'):
+                    segments = writer.close()
+                for seg in segments:
+                    archived.extend({'id': i, 'path': seg['path']} for i in seg['ids'])
+                    print(f"Archived {len(seg['ids'])} triggers -> {seg['path']}")
+        except Exception:
+            if seen is not None:
+                # nothing of a failed batch is recorded; the next cycle retries it in full
+                seen.discard()
+            raise
+        finally:
+            if quarantine is not None:
+                quarantine.close()
+        if seen is not None:
+            seen.save()
+            print(f"Skipped {skipped} already archived triggers")
 
         # Save a run summary
         out = {
             'project': os.path.basename(os.getcwd()),
             'archived': archived,
+            'invalid': len(rejected),
+            'metrics': metrics.summary(http_stats),
         }
-        out_file = os.path.join(self.cfg.get('output', '.'), 'last_run_summary.json')
-        os.makedirs(os.path.dirname(out_file) or '.', exist_ok=True)
-        with open(out_file, 'w') as f:
-            json.dump(out, f, indent=2)
-        print(f"Wrote summary to {out_file}")
+        if seen is not None:
+            out['skipped_seen'] = skipped
+        write_run_summary(self.cfg, out)
         return out
+
+
+def write_run_summary(cfg: dict, out: dict) -> str:
+    """Write a run summary to <cfg output>/last_run_summary.json and return the path."""
+    out_file = os.path.join((cfg or {}).get('output', '.'), 'last_run_summary.json')
+    os.makedirs(os.path.dirname(out_file) or '.', exist_ok=True)
+    with open(out_file, 'w') as f:
+        json.dump(out, f, indent=2)
+    print(f"Wrote summary to {out_file}")
+    return out_file
@@ -0,0 +1,49 @@
+"""Process-wide boto3 clients.
+
+boto3 takes ~100 ms to import and each client tens of milliseconds to build (endpoint and
+credential resolution), so clients are created on first use and then reused by every
+uploader and invoker in the process, i.e. across warm Lambda invocations. They are keyed by
+service, region and access key so a changed environment (tests, local runs) gets a new one.
+
+botocore keeps 10 pooled connections per client by default, fewer than the threads that share
+one client for parallel uploads; AWS_MAX_POOL_CONNECTIONS (default 32) raises the cap.
+Connections are opened on demand, so an idle larger pool costs nothing.
+"""
+import os
+import threading
+from typing import Any, Dict, Tuple
+
+_clients: Dict[Tuple[str, str | None, str | None, str], Any] = {}
+_lock = threading.Lock()
+
+
+def get_client(service: str, **config):
+    """Shared boto3 client for `service`, or None when boto3 is not installed.
+
+    `config` are extra botocore Config options (e.g. read_timeout, retries); each distinct
+    set gets its own shared client.
+    """
+    key = (service, os.environ.get('AWS_REGION') or os.environ.get('AWS_DEFAULT_REGION'),
+           os.environ.get('AWS_ACCESS_KEY_ID'), repr(sorted(config.items())))
+    client = _clients.get(key)
+    if client is not None:
+        return client
+    try:
+        import boto3
+    except Exception:  # pragma: no cover - optional dependency
+        return None
+    # the default boto3 session is not thread-safe while it creates clients
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            from botocore.config import Config
+
+            pool = int(os.environ.get('AWS_MAX_POOL_CONNECTIONS', 32))
+            client = _clients[key] = boto3.client(service, config=Config(max_pool_connections=pool, **config))
+        return client
+
+
+def reset_clients():
+    """Drop the cached clients (the next get_client builds fresh ones)."""
+    with _lock:
+        _clients.clear()
@@ -4,6 +4,22 @@ Behavior:
 - If environment CLIENTS_API_URL is set, GET that URL and expect JSON list of clients
 - Else, read supplied clients from provided config dict (key 'clients')
 
+get_clients() is an iterator: clients are yielded page by page as they arrive, so the
+caller can start archiving the first clients while later pages are still loading. When a
+`scope` is given, clients without it are dropped as soon as their page is decoded.
+
+Pagination (cfg, all optional):
+- pagination: 'cursor', 'page' or 'none' (default: 'page' when page_size is set, else cursor
+  links are followed if the response carries one)
+- page_size: clients per page, sent as `page_size_param` (default 'page_size')
+- page_param: page number parameter for 'page' mode (default 'page', first page 1)
+- cursor_param: cursor parameter for 'cursor' mode (default 'cursor')
+- prefetch: pages requested ahead of the consumer (default 2; in 'page' mode these load in
+  parallel, in 'cursor' mode the next page loads while the current one is consumed)
+
+A page is either a JSON list of clients or an object with the list under 'clients',
+'items' or 'data' and an optional 'next_cursor' / 'cursor' / 'next' (cursor value or URL).
+
 Expected client shape (dict):
 {
   "client_id": "123",
@@ -15,25 +31,114 @@ Expected client shape (dict):
 
 """
 import os
-import requests
-from typing import List, Dict, Any
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Tuple
+
+from .codec import get_codec
+from .http_client import HttpClient, get_shared_client
+
+
+def client_id_of(c: Dict[str, Any]) -> str | None:
+    return c.get('client_id') or c.get('ClientID') or c.get('oauth_client_id')
+
+
+def client_scopes(c: Dict[str, Any]) -> List[str]:
+    scopes = c.get('scopes') or c.get('scope') or []
+    if isinstance(scopes, str):
+        scopes = [scopes]
+    return scopes
+
+
+def _parse_page(data: Any) -> Tuple[List[Dict[str, Any]], Any]:
+    """Return (clients, next cursor or URL) for one decoded page."""
+    if isinstance(data, list):
+        return data, None
+    if isinstance(data, dict):
+        for field in ('clients', 'items', 'data'):
+            if isinstance(data.get(field), list):
+                nxt = data.get('next_cursor') or data.get('cursor') or data.get('next')
+                return data[field], nxt
+    return [data], None
 
 
 class ClientFetcher:
-    def __init__(self, cfg: Dict[str, Any] | None = None):
+    def __init__(self, cfg: Dict[str, Any] | None = None, http: HttpClient | None = None):
         self.cfg = cfg or {}
+        self.http = http or get_shared_client()
         self.api_url = os.environ.get('CLIENTS_API_URL') or self.cfg.get('clients_api_url')
+        self.page_size = int(self.cfg.get('page_size') or 0)
+        self.pagination = self.cfg.get('pagination') or ('page' if self.page_size else 'cursor')
+        self.page_param = self.cfg.get('page_param', 'page')
+        self.page_size_param = self.cfg.get('page_size_param', 'page_size')
+        self.cursor_param = self.cfg.get('cursor_param', 'cursor')
+        self.prefetch = max(1, int(self.cfg.get('prefetch', 2)))
 
-    def get_clients(self) -> List[Dict[str, Any]]:
+    def get_clients(self, scope: str | None = None) -> Iterator[Dict[str, Any]]:
         if self.api_url:
             print(f"Fetching client list from {self.api_url}")
-            r = requests.get(self.api_url, timeout=10)
-            r.raise_for_status()
-            data = r.json()
-            if isinstance(data, list):
-                return data
-            return [data]
-
-        # fallback to config
-        return self.cfg.get('clients', [])
-*** End Patch
\ No newline at end of file
+            pages = self._iter_numbered_pages() if self.pagination == 'page' else self._iter_cursor_pages()
+        else:
+            # fallback to config
+            pages = iter([self.cfg.get('clients', [])])
+
+        for page in pages:
+            for c in page:
+                if scope and scope not in client_scopes(c):
+                    continue
+                yield c
+
+    def _get_page(self, url: str, params: Dict[str, Any] | None = None) -> Tuple[List[Dict[str, Any]], Any]:
+        r = self.http.get(url, params=params)
+        r.raise_for_status()
+        return _parse_page(get_codec().loads(r.content))
+
+    def _size_params(self) -> Dict[str, Any]:
+        return {self.page_size_param: self.page_size} if self.page_size else {}
+
+    def _iter_cursor_pages(self) -> Iterator[List[Dict[str, Any]]]:
+        if self.pagination == 'none':
+            yield self._get_page(self.api_url)[0]
+            return
+
+        def request(cursor):
+            if isinstance(cursor, str) and cursor.startswith(('http://', 'https://')):
+                return self._get_page(cursor)
+            params = self._size_params()
+            if cursor is not None:
+                params[self.cursor_param] = cursor
+            return self._get_page(self.api_url, params or None)
+
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            pending = pool.submit(request, None)
+            seen = set()
+            while pending is not None:
+                clients, cursor = pending.result()
+                # a cursor is only known once its page arrives; fetch it while this page is consumed
+                pending = None
+                if cursor and cursor not in seen:
+                    seen.add(cursor)
+                    pending = pool.submit(request, cursor)
+                yield clients
+
+    def _iter_numbered_pages(self) -> Iterator[List[Dict[str, Any]]]:
+        def request(page):
+            params = self._size_params()
+            params[self.page_param] = page
+            return self._get_page(self.api_url, params)[0]
+
+        with ThreadPoolExecutor(max_workers=self.prefetch) as pool:
+            window = deque()
+            next_page = 1
+            while True:
+                while len(window) < self.prefetch:
+                    window.append(pool.submit(request, next_page))
+                    next_page += 1
+                clients = window.popleft().result()
+                if clients:
+                    yield clients
+                if len(clients) < self.page_size or not clients:
+                    # last page reached; drop the speculative requests beyond it
+                    for f in window:
+                        f.cancel()
+                    return
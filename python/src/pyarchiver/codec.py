@@ -0,0 +1,102 @@
+"""JSON codec used on the hot paths (trigger parsing, archive encoding and decoding).
+
+Backends:
+- orjson  the optional `orjson` package (install the `fast` extra); several times faster than
+          the standard library on both parse and serialize
+- json    the standard library, always available
+
+Select with env JSON_CODEC (`auto`, the default: orjson when installed, else json). Both produce
+the bytes the archive formats always have: compact output is `{"a":1}`, indented output uses
+two spaces, non-ASCII characters are \\u-escaped. orjson writes non-ASCII as raw UTF-8, so such
+documents are re-encoded by json; floats in exponent notation are written as `1e-5` instead
+of `1e-05` (the same value). Values orjson cannot encode (non-string dict keys, integers beyond
+64 bit) and documents it refuses to parse (NaN / Infinity) also fall back to json. orjson is
+told to pass datetimes and dataclasses through, so they reach json and raise TypeError as
+they always did. The one difference left: orjson writes uuid.UUID and enum.Enum values (as
+their string / value) where json raises TypeError; triggers parsed from JSON never hold them.
+
+The backend is imported on first use, not when this module is imported.
+"""
+import importlib
+import json
+import os
+from typing import Any, Dict, List
+
+_codecs: Dict[str, 'JsonCodec'] = {}
+
+
+class JsonCodec:
+    name = 'json'
+
+    def loads(self, data: bytes | str) -> Any:
+        return json.loads(data)
+
+    def dumps(self, value: Any, indent: int | None = None) -> bytes:
+        """UTF-8 JSON; compact without `indent`."""
+        if indent is None:
+            return json.dumps(value, separators=(',', ':')).encode('utf-8')
+        return json.dumps(value, indent=indent).encode('utf-8')
+
+
+class OrjsonCodec(JsonCodec):
+    name = 'orjson'
+
+    def __init__(self):
+        self._orjson = importlib.import_module('orjson')
+        # without these orjson would serialize types the standard library rejects
+        self._options = self._orjson.OPT_PASSTHROUGH_DATETIME | self._orjson.OPT_PASSTHROUGH_DATACLASS
+        self._indent_2 = self._orjson.OPT_INDENT_2
+
+    def loads(self, data):
+        try:
+            return self._orjson.loads(data)
+        except ValueError:
+            # NaN / Infinity are accepted by json; genuinely invalid input raises from there too
+            return json.loads(data)
+
+    def dumps(self, value, indent=None):
+        if indent not in (None, 2):
+            return super().dumps(value, indent)
+        try:
+            data = self._orjson.dumps(value, option=(self._options | self._indent_2) if indent else self._options)
+        except TypeError:
+            return super().dumps(value, indent)
+        # bytes.isascii() is a fast scan; only documents with non-ASCII text pay twice
+        return data if data.isascii() else super().dumps(value, indent)
+
+
+CODECS = {c.name: c for c in (OrjsonCodec, JsonCodec)}
+
+
+def get_codec(name: str | None = None) -> JsonCodec:
+    """The codec registered under `name` (default env JSON_CODEC, else 'auto'), one per process."""
+    name = (name or os.environ.get('JSON_CODEC') or 'auto').lower()
+    codec = _codecs.get(name)
+    if codec is not None:
+        return codec
+    if name == 'auto':
+        try:
+            codec = OrjsonCodec()
+        except ImportError:
+            codec = JsonCodec()
+    elif name in CODECS:
+        try:
+            codec = CODECS[name]()
+        except ImportError:
+            raise RuntimeError(f"JSON codec {name!r} needs the optional {name!r} package") from None
+    else:
+        raise ValueError(f"Unknown JSON codec {name!r}; choose one of {sorted(CODECS)} or 'auto'")
+    _codecs[name] = codec
+    return codec
+
+
+def available_codecs() -> List[str]:
+    """Names of the codecs whose backend is installed."""
+    out = []
+    for name in CODECS:
+        try:
+            get_codec(name)
+        except RuntimeError:
+            continue
+        out.append(name)
+    return out
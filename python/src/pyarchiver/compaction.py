@@ -0,0 +1,361 @@
+"""Compaction: merge many small archives into a few compressed rollups.
+
+Two sources of small objects are handled:
+
+- clients (ArchiverLambdaService): the daily `<client_id>_trigger_YYYYMMDD.<suffix>` archives
+  of one client and one month become one rollup,
+      <prefix>/_rollups/<yyyymm>/<client_id>/<client_id>_trigger_<yyyymm>_<run>.ndjson.gz
+  Partitions are found through the manifest index (archive_index.py), never by listing the
+  archive; the rollup is recorded there with one `members` entry per source day, so readers
+  keep date-range queries and fetch a single day with one ranged read.
+- triggers (ArchiverService / the Lambda trigger path): the `trigger_<id>.<suffix>` objects at
+  the archive root are packed `rollup_max_count` at a time into
+      rollups/triggers/<yyyymm>/triggers_<run>_<seq>.ndjson.gz
+  (yyyymm is the compaction month: the objects carry no date) with a sidecar
+  `.index.json` mapping each trigger id to its block. These rollups are recorded in the
+  manifest index too, under client id `_triggers` and the compaction date, so ArchiveReader
+  finds them like any client archive.
+
+Client compaction then consolidates the manifest index of every month before `before` (see
+ArchiveIndex.consolidate), reported as `index_merged`: the number of index objects folded
+into one sorted object per client bucket. Trigger compaction also merges the seen-id deltas those paths wrote (`_seen/delta/`, see
+seen_index.py) into the seen-id file, reported as `seen_merged`.
+
+Sources a rollup could not reproduce exactly (parquet archives written before formats.py kept
+every field; see ArchiveFormat.restores_exactly) are left out of it and left in place.
+
+A rollup is a multi-member gzip file: every block (a source day, or up to `block_size`
+triggers) is its own gzip member, so the whole file is a plain .ndjson.gz while a block can
+be read and decompressed on its own. Rollups are assembled in a temporary file and uploaded
+with upload_stream, and each worker holds one source object at a time, so memory stays
+bounded regardless of partition size.
+
+Before anything happens to the sources, every block is read back from storage and checked:
+the sha256 of its compressed bytes and the sha256 of its canonical trigger lines must match
+what was computed from the sources. Only then are the sources handled per `source_action`:
+'tag' (default; S3 tag `pyarchiver-compacted=<rollup>` for a lifecycle rule, local storage
+keeps the files), 'delete', or 'keep'.
+
+Config (cfg `compaction` block; env COMPACTION_* first):
+- workers: partitions compacted in parallel (default 4)
+- source_action: tag | delete | keep
+- before: only months strictly before this YYYYMM (default: the current month, which is still
+  being written)
+- min_sources: partitions with fewer sources are left alone (default 2)
+- rollup_max_count / block_size: trigger mode rollup and block sizes (default 10000 / 500)
+- merge_seen: trigger mode merges the seen-id deltas (default true)
+"""
+import datetime
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import uuid
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Tuple
+
+from .archive_index import ArchiveIndex, ArchiveReader
+from .storage.formats import format_for_key
+
+ROLLUP_DIR = '_rollups'
+TRIGGER_ROLLUP_DIR = 'rollups/triggers'
+TAG_KEY = 'pyarchiver-compacted'
+INDEX_SUFFIX = '.index.json'
+SOURCE_ACTIONS = ('tag', 'delete', 'keep')
+# client id of trigger-mode rollups in the manifest index
+TRIGGERS_CLIENT = '_triggers'
+
+
+def content_digest(triggers: Iterable[Any]) -> Tuple[int, str]:
+    """(count, sha256) over the canonical JSON lines of the triggers; independent of format."""
+    h = hashlib.sha256()
+    n = 0
+    for t in triggers:
+        h.update(json.dumps(t, sort_keys=True, separators=(',', ':'), default=str).encode('utf-8'))
+        h.update(b'\n')
+        n += 1
+    return n, h.hexdigest()
+
+
+class RollupWriter:
+    """One rollup being assembled in a temp file, one gzip member per block."""
+
+    def __init__(self, level: int = 6, tmp_dir: str | None = None):
+        self.level = level
+        fd, self.path = tempfile.mkstemp(dir=tmp_dir, prefix='pyarchiver-rollup-', suffix='.ndjson.gz')
+        self._f = os.fdopen(fd, 'wb')
+        self._whole = hashlib.sha256()
+        self.size = 0
+        self.blocks: List[Dict[str, Any]] = []
+
+    def add_block(self, triggers: Iterable[Any], **meta) -> Dict[str, Any]:
+        comp = zlib.compressobj(self.level, zlib.DEFLATED, 31)
+        member = hashlib.sha256()
+        content = hashlib.sha256()
+        offset, count = self.size, 0
+
+        def write(chunk: bytes):
+            if chunk:
+                self._f.write(chunk)
+                member.update(chunk)
+                self._whole.update(chunk)
+                self.size += len(chunk)
+
+        for t in triggers:
+            line = json.dumps(t, separators=(',', ':'), default=str).encode('utf-8') + b'\n'
+            content.update(json.dumps(t, sort_keys=True, separators=(',', ':'), default=str).encode('utf-8') + b'\n')
+            count += 1
+            write(comp.compress(line))
+        write(comp.flush())
+        block = {**meta, 'offset': offset, 'length': self.size - offset, 'count': count,
+                 'sha256': member.hexdigest(), 'content_sha256': content.hexdigest()}
+        self.blocks.append(block)
+        return block
+
+    @property
+    def sha256(self) -> str:
+        return self._whole.hexdigest()
+
+    def upload(self, uploader, name: str) -> str:
+        self._f.close()
+        with open(self.path, 'rb') as f:
+            return uploader.upload_stream(name, f, content_type='application/x-ndjson', content_encoding='gzip')
+
+    def close(self):
+        if not self._f.closed:
+            self._f.close()
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+
+def verify_rollup(uploader, name: str, blocks: List[Dict[str, Any]]):
+    """Read every block back and compare both checksums; raises ValueError on any mismatch."""
+    for b in blocks:
+        data = uploader.read_range(name, b['offset'], b['length'])
+        if hashlib.sha256(data).hexdigest() != b['sha256']:
+            raise ValueError(f"{name}: block at {b['offset']} does not match its checksum")
+        _, digest = content_digest(json.loads(line) for line in gzip.decompress(data).splitlines() if line.strip())
+        if digest != b['content_sha256']:
+            raise ValueError(f"{name}: block at {b['offset']} does not match its sources")
+
+
+class Compactor:
+    def __init__(self, uploader, prefix: str = '', cfg: Dict[str, Any] | None = None, deadline=None):
+        cfg = cfg or {}
+        self.uploader = uploader
+        self.prefix = prefix.rstrip('/')
+        self.cfg = cfg
+        self.workers = max(1, int(os.environ.get('COMPACTION_WORKERS') or cfg.get('workers', 4)))
+        self.source_action = (os.environ.get('COMPACTION_SOURCE_ACTION') or cfg.get('source_action') or 'tag').lower()
+        if self.source_action not in SOURCE_ACTIONS:
+            raise ValueError(f"source_action must be one of {SOURCE_ACTIONS}, got {self.source_action!r}")
+        self.before = str(os.environ.get('COMPACTION_BEFORE') or cfg.get('before') or f"{datetime.datetime.utcnow():%Y%m}")
+        self.min_sources = max(1, int(cfg.get('min_sources', 2)))
+        self.max_count = max(1, int(cfg.get('rollup_max_count', 10000)))
+        self.block_size = max(1, int(cfg.get('block_size', 500)))
+        self.level = int(cfg.get('level', 6))
+        self.merge_seen = str(cfg.get('merge_seen', True)).lower() not in ('0', 'false', 'no')
+        # a scheduler.Deadline: partitions not started before it are reported as deferred
+        self.deadline = deadline
+        self.run_id = f"{datetime.datetime.utcnow():%Y%m%dT%H%M%S}_{uuid.uuid4().hex[:8]}"
+
+    @classmethod
+    def for_clients(cls, cfg: Dict[str, Any], deadline=None) -> 'Compactor':
+        """Compactor of the ArchiverLambdaService archive configured by BUCKET / PREFIX (env, then cfg)."""
+        from .storage import uploader_for
+
+        bucket = os.environ.get('BUCKET') or cfg.get('bucket')
+        if not bucket:
+            raise RuntimeError('BUCKET must be configured (env or cfg)')
+        prefix = os.environ.get('PREFIX', '') or cfg.get('prefix', '')
+        return cls(uploader_for(bucket, prefix), (prefix or 'trigger').rstrip('/'), cfg.get('compaction'), deadline)
+
+    # -- planning ------------------------------------------------------------------------
+    def plan_clients(self) -> Dict[Tuple[str, str], List[Dict[str, Any]]]:
+        """Source archives per (client_id, yyyymm), from the manifest index."""
+        partitions: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+        for e in ArchiveReader(self.uploader, self.prefix).entries():
+            month = e['date'][:7].replace('-', '')
+            if e.get('rollup') or month >= self.before:
+                continue
+            partitions.setdefault((e['client_id'], month), []).append(e)
+        return {k: v for k, v in sorted(partitions.items()) if len(v) >= self.min_sources}
+
+    def plan_triggers(self) -> List[List[str]]:
+        """trigger_<id> objects at the archive root, in groups of rollup_max_count."""
+        # a key-prefix listing: never walks the client archives or other folders
+        names = [n for n in self.uploader.list('trigger_') if '/' not in n]
+        groups = [names[i:i + self.max_count] for i in range(0, len(names), self.max_count)]
+        return [g for g in groups if len(g) >= self.min_sources]
+
+    # -- one partition -------------------------------------------------------------------
+    def _finish_sources(self, sources: List[str], rollup: str):
+        for name in sources:
+            if self.source_action == 'delete':
+                self.uploader.delete(name)
+            elif self.source_action == 'tag' and not self.uploader.tag(name, {TAG_KEY: rollup}):
+                # storage without tags (local): nothing marks the source, so it is kept as is
+                return
+
+    def compact_client_month(self, client_id: str, month: str, entries: List[Dict[str, Any]],
+                             index: ArchiveIndex) -> Dict[str, Any]:
+        name = f"{self.prefix}/{ROLLUP_DIR}/{month}/{client_id}/{client_id}_trigger_{month}_{self.run_id}.ndjson.gz"
+        writer = RollupWriter(self.level)
+        reader = ArchiveReader(self.uploader, self.prefix, {'read_workers': 1})
+        included = []
+        try:
+            # one source in memory at a time; the reader checks each against its indexed sha256
+            for entry, data in reader.iter_objects(entries):
+                fmt = format_for_key(entry['key'])
+                if not fmt.restores_exactly(data):
+                    print(f"Leaving {entry['key']} out of {client_id}/{month}: its format cannot be restored exactly")
+                    continue
+                writer.add_block(fmt.iter_decode(data), date=entry['date'], source=entry['key'])
+                included.append(entry)
+            if not included:
+                return None
+            entries = included
+            path = writer.upload(self.uploader, name)
+            verify_rollup(self.uploader, name, writer.blocks)
+            members = [{k: b[k] for k in ('date', 'source', 'offset', 'length', 'count', 'sha256')}
+                       for b in writer.blocks]
+            self.uploader.upload(name + INDEX_SUFFIX, json.dumps({'rollup': name, 'blocks': writer.blocks},
+                                                                 separators=(',', ':')).encode('utf-8'),
+                                 content_type='application/json')
+            dates = sorted(b['date'] for b in writer.blocks)
+            index.record(client_id, datetime.date.fromisoformat(dates[0]), name, path, writer.size,
+                         sum(b['count'] for b in writer.blocks), writer.sha256, 'ndjson.gz',
+                         date_to=dates[-1], members=members)
+            # the index must know the rollup before its sources can go away
+            index.flush()
+            self._finish_sources([e['key'] for e in entries], name)
+            return {'partition': f'{client_id}/{month}', 'rollup': name, 'sources': len(entries),
+                    'bytes_before': sum(int(e['size']) for e in entries), 'bytes_after': writer.size}
+        finally:
+            writer.close()
+
+    def compact_triggers(self, names: List[str], seq: int, index: ArchiveIndex) -> Dict[str, Any]:
+        today = datetime.datetime.utcnow().date()
+        name = f"{TRIGGER_ROLLUP_DIR}/{today:%Y%m}/triggers_{self.run_id}_{seq:05d}.ndjson.gz"
+        writer = RollupWriter(self.level)
+        ids: Dict[str, int] = {}
+        compacted: List[str] = []
+        before = 0
+        try:
+            for start in range(0, len(names), self.block_size):
+                block_names = []
+                triggers = []
+                for n in names[start:start + self.block_size]:
+                    data = self.uploader.read(n)
+                    if data is None:
+                        continue
+                    fmt = format_for_key(n)
+                    if not fmt.restores_exactly(data):
+                        print(f"Leaving {n} out of its rollup: its format cannot be restored exactly")
+                        continue
+                    before += len(data)
+                    triggers.extend(fmt.iter_decode(data))
+                    block_names.append(n)
+                if not block_names:
+                    continue
+                for t in triggers:
+                    ids[str(t.get('id'))] = len(writer.blocks)
+                writer.add_block(triggers, date=today.isoformat(), sources=block_names)
+                compacted.extend(block_names)
+            if not compacted:
+                return None
+            path = writer.upload(self.uploader, name)
+            verify_rollup(self.uploader, name, writer.blocks)
+            self.uploader.upload(name + INDEX_SUFFIX, json.dumps({'rollup': name, 'blocks': writer.blocks, 'triggers': ids},
+                                                                 separators=(',', ':')).encode('utf-8'),
+                                 content_type='application/json')
+            members = [{k: b[k] for k in ('date', 'sources', 'offset', 'length', 'count', 'sha256')}
+                       for b in writer.blocks]
+            index.record(TRIGGERS_CLIENT, today, name, path, writer.size, sum(b['count'] for b in writer.blocks),
+                         writer.sha256, 'ndjson.gz', date_to=today.isoformat(), members=members)
+            index.flush()
+            self._finish_sources(compacted, name)
+            return {'partition': f'triggers/{seq}', 'rollup': name, 'path': path, 'sources': len(compacted),
+                    'bytes_before': before, 'bytes_after': writer.size}
+        finally:
+            writer.close()
+
+    # -- run -----------------------------------------------------------------------------
+    def run(self, mode: str = 'clients') -> Dict[str, Any]:
+        index = ArchiveIndex(self.uploader, self.prefix, {'index_flush_every': 1000})
+        if mode == 'clients':
+            tasks = [(f'{cid}/{month}', self.compact_client_month, (cid, month, entries, index))
+                     for (cid, month), entries in self.plan_clients().items()]
+        elif mode == 'triggers':
+            tasks = [(f'triggers/{i}', self.compact_triggers, (names, i, index)) for i, names in enumerate(self.plan_triggers(), 1)]
+        else:
+            raise ValueError(f"compaction mode must be 'clients' or 'triggers', got {mode!r}")
+        print(f"Compacting {len(tasks)} partitions ({mode}) with {self.workers} workers")
+
+        results, failed, deferred = [], [], []
+
+        def guarded(label, fn, args):
+            if self.deadline is not None and not self.deadline.allows(0):
+                deferred.append(label)
+                return None
+            try:
+                return fn(*args)
+            except Exception as e:
+                # sources stay untouched when their rollup could not be written or verified
+                print(f"Compacting {label} failed: {e}")
+                failed.append({'partition': label, 'error': str(e)})
+                return None
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='compact') as pool:
+            for r in pool.map(lambda t: guarded(*t), tasks):
+                if r:
+                    results.append(r)
+        index.close()
+        index_merged = self.consolidate_index(index, failed) if mode == 'clients' else None
+        summary = {
+            'mode': mode,
+            'rollups': results,
+            'partitions': len(results),
+            'sources': sum(r['sources'] for r in results),
+            'bytes_before': sum(r['bytes_before'] for r in results),
+            'bytes_after': sum(r['bytes_after'] for r in results),
+            'source_action': self.source_action,
+            'failed': failed,
+        }
+        if index_merged is not None:
+            summary['index_merged'] = index_merged
+        if mode == 'triggers' and self.merge_seen:
+            summary['seen_merged'] = self.merge_seen_deltas()
+        if self.deadline is not None:
+            summary['deferred'] = sorted(deferred)
+        return summary
+
+    def consolidate_index(self, index: ArchiveIndex, failed: List[Dict[str, Any]]) -> int:
+        """Consolidate the index of each closed month; returns how many index objects were merged."""
+        merged = 0
+        for month, names in sorted(index.months(self.before).items()):
+            if self.deadline is not None and not self.deadline.allows(0):
+                break
+            try:
+                merged += index.consolidate(month, names)
+            except Exception as e:
+                # the parts stay; a later compaction consolidates the month
+                print(f"Consolidating the index of {month} failed: {e}")
+                failed.append({'partition': f'_index/{month}', 'error': str(e)})
+        return merged
+
+    def merge_seen_deltas(self) -> int:
+        """Fold the seen-id deltas into the seen-id file; returns how many ids it gained."""
+        from .seen_index import SeenIndex
+
+        index = SeenIndex(self.uploader, self.cfg)
+        if not self.uploader.list(index.delta_dir + '/'):
+            return 0
+        try:
+            return index.load().merge()
+        finally:
+            index.close()
@@ -0,0 +1,86 @@
+"""Long-running polling mode for the CLI (archiver_app --daemon).
+
+One process, one service object: the pooled HTTP session, cached OAuth tokens and the S3
+client stay warm between cycles instead of being rebuilt by every cron invocation.
+
+Each cycle is split into fetch and archive (upload). Cycles start every `interval` seconds
+plus a random 0..`jitter` seconds (so several daemons do not poll in lockstep), and the
+archive step of cycle N runs on a background thread while cycle N+1 is fetched. At most one
+archive step is in flight, so memory stays bounded at two cycles of triggers.
+
+SIGTERM / SIGINT stop the loop: no new cycle is started, triggers already fetched are still
+archived and the in-flight upload is drained before run() returns.
+"""
+import random
+import signal
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+
+class ArchiverDaemon:
+    def __init__(self, fetch: Callable[[], Any], archive: Callable[[Any], Dict[str, Any]],
+                 interval: float = 60.0, jitter: float = 0.0, max_cycles: int | None = None):
+        self.fetch = fetch
+        self.archive = archive
+        self.interval = max(0.0, float(interval))
+        self.jitter = max(0.0, float(jitter))
+        self.max_cycles = max_cycles
+        self.stop_event = threading.Event()
+        self.cycles = 0
+        self.failed = 0
+        self.archived = 0
+        # only the latest summary is kept; the process may run for months
+        self.last_summary: Dict[str, Any] | None = None
+
+    @classmethod
+    def for_service(cls, service, **kwargs) -> 'ArchiverDaemon':
+        """Daemon over ArchiverService: fetch() of the next cycle overlaps archive() of the last."""
+        return cls(service.fetch, lambda fetched: service.archive(*fetched), **kwargs)
+
+    def stop(self, *_):
+        if not self.stop_event.is_set():
+            print("Stop requested; finishing in-flight uploads")
+        self.stop_event.set()
+
+    def _install_signals(self):
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, self.stop)
+
+    def _collect(self, pending: Future | None):
+        if pending is None:
+            return
+        try:
+            self.last_summary = pending.result()
+            self.archived += 1
+        except Exception as e:
+            print(f"Archive cycle failed: {e}")
+            self.failed += 1
+
+    def run(self, install_signals: bool = True) -> Dict[str, Any]:
+        """Poll until stopped (or max_cycles); returns cycle counts and the last cycle's summary."""
+        if install_signals and threading.current_thread() is threading.main_thread():
+            self._install_signals()
+        pending: Future | None = None
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix='archive') as uploads:
+            while not self.stop_event.is_set():
+                started = time.monotonic()
+                self.cycles += 1
+                try:
+                    fetched = self.fetch()
+                except Exception as e:
+                    # keep polling; a failed fetch must not kill the daemon
+                    print(f"Fetch cycle {self.cycles} failed: {e}")
+                    self.failed += 1
+                else:
+                    # wait for cycle N's upload before handing over N+1, bounding memory to two cycles
+                    self._collect(pending)
+                    pending = uploads.submit(self.archive, fetched)
+                if self.max_cycles and self.cycles >= self.max_cycles:
+                    break
+                delay = self.interval + random.uniform(0, self.jitter) - (time.monotonic() - started)
+                self.stop_event.wait(max(0.0, delay))
+            self._collect(pending)
+        print(f"Daemon stopped after {self.cycles} cycles")
+        return {'cycles': self.cycles, 'archived': self.archived, 'failed': self.failed, 'last': self.last_summary}
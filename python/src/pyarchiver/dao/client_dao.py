@@ -1,17 +1,68 @@
-"""In-memory DAO for demonstration — mirrors the Java ClientDao minimal behavior"""
-from typing import Dict
+"""In-memory client store — mirrors the Java ClientDao, plus secondary indexes.
+
+Records are indexed by scope, state and trigger host; each index keeps insertion order, so
+by_scope() lists clients in the order they were loaded (the client API's order).
+"""
+from typing import Dict, Iterable, List
+from urllib.parse import urlparse
+
 from ..models.client_record import ClientRecord
 
 
+def trigger_host(rec: ClientRecord) -> str | None:
+    return (urlparse(rec.trigger_url).netloc or None) if rec.trigger_url else None
+
+
 class ClientDao:
     def __init__(self):
         self._store: Dict[str, ClientRecord] = {}
+        # index value -> ordered set of client ids (dict keys)
+        self._by_scope: Dict[str, Dict[str, None]] = {}
+        self._by_state: Dict[str | None, Dict[str, None]] = {}
+        self._by_host: Dict[str | None, Dict[str, None]] = {}
 
     def get_client(self, client_id: str) -> ClientRecord | None:
         return self._store.get(client_id)
 
     def put_client(self, rec: ClientRecord):
+        if rec.client_id in self._store:
+            self._unindex(self._store[rec.client_id])
         self._store[rec.client_id] = rec
+        for scope in rec.scopes:
+            self._by_scope.setdefault(scope, {})[rec.client_id] = None
+        self._by_state.setdefault(rec.state, {})[rec.client_id] = None
+        self._by_host.setdefault(trigger_host(rec), {})[rec.client_id] = None
+
+    def put_clients(self, recs: Iterable[ClientRecord]):
+        for rec in recs:
+            self.put_client(rec)
+
+    def remove_client(self, client_id: str) -> ClientRecord | None:
+        rec = self._store.pop(client_id, None)
+        if rec is not None:
+            self._unindex(rec)
+        return rec
+
+    def _unindex(self, rec: ClientRecord):
+        for scope in rec.scopes:
+            self._by_scope.get(scope, {}).pop(rec.client_id, None)
+        self._by_state.get(rec.state, {}).pop(rec.client_id, None)
+        self._by_host.get(trigger_host(rec), {}).pop(rec.client_id, None)
 
     def all_clients(self):
         return list(self._store.values())
+
+    def by_scope(self, scope: str) -> List[ClientRecord]:
+        return [self._store[cid] for cid in self._by_scope.get(scope, ())]
+
+    def by_state(self, state: str | None) -> List[ClientRecord]:
+        return [self._store[cid] for cid in self._by_state.get(state, ())]
+
+    def by_host(self, host: str | None) -> List[ClientRecord]:
+        return [self._store[cid] for cid in self._by_host.get(host, ())]
+
+    def __len__(self) -> int:
+        return len(self._store)
+
+    def __contains__(self, client_id: str) -> bool:
+        return client_id in self._store
@@ -1,13 +1,21 @@
-"""Credential DAO stub — would read secrets or encrypted credentials in production"""
+"""Credential DAO — in memory; would read secrets or encrypted credentials in production"""
+from typing import Dict
+
 from ..models.client_credential import ClientCredential
 
 
 class CredentialDao:
     def __init__(self):
-        self._credentials = {}
+        self._credentials: Dict[str, ClientCredential] = {}
 
     def get_credential(self, client_id: str) -> ClientCredential | None:
         return self._credentials.get(client_id)
 
     def put_credential(self, cred: ClientCredential):
         self._credentials[cred.client_id] = cred
+
+    def remove_credential(self, client_id: str) -> ClientCredential | None:
+        return self._credentials.pop(client_id, None)
+
+    def all_credentials(self):
+        return list(self._credentials.values())
@@ -0,0 +1,207 @@
+"""Client registry: normalized client records and credentials, indexed and snapshotted.
+
+Raw client dicts (clients API or config) come in several shapes: `client_id` / `ClientID` /
+`oauth_client_id` ids, scope lists or strings, optional per-client trigger and token URLs.
+The registry normalizes each one once into a ClientRecord (ClientDao, indexed by scope, state
+and trigger host) plus a ClientCredential (CredentialDao), and keeps a fingerprint of the raw
+dict so a refresh only rebuilds the clients that changed and drops the ones that are gone.
+
+    registry = ClientRegistry.from_config(cfg)
+    for rec in registry.sync(client_fetcher.get_clients()):   # streams, applies changes
+        ...
+    registry.by_scope('dex/trigger:all')                      # no normalization, no API call
+
+Config (env first, then cfg):
+- CLIENT_REGISTRY_FILE / registry_file: JSON snapshot written after a refresh and loaded on
+  start, so a new process (next CLI run, Lambda cold start) starts with the last client list.
+  The file holds client secrets and is created with mode 0600.
+- CLIENT_REGISTRY_TTL / registry_ttl: seconds a refresh stays valid (default 0: refresh every
+  run); within it is_fresh() is true and callers can skip the clients API.
+A snapshot taken with a different TRIGGER_BASE_URL / CLIENT_TOKEN_URL is ignored, since
+records store URLs resolved against them.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import time
+from typing import Any, Dict, Iterable, Iterator, Tuple
+
+from ..models.client_credential import ClientCredential
+from ..models.client_record import ClientRecord
+from .client_dao import ClientDao
+from .credential_dao import CredentialDao
+
+SNAPSHOT_VERSION = 1
+RECORD_FIELDS = ClientRecord.__slots__
+
+
+def fingerprint(raw: Dict[str, Any]) -> str:
+    return hashlib.blake2b(json.dumps(raw, sort_keys=True, default=str).encode('utf-8'), digest_size=16).hexdigest()
+
+
+class ClientRegistry:
+    def __init__(self, trigger_base: str | None = None, token_url: str | None = None,
+                 snapshot_file: str | None = None, ttl: float = 0):
+        self.trigger_base = trigger_base
+        self.token_url = token_url
+        self.snapshot_file = snapshot_file
+        self.ttl = float(ttl or 0)
+        self.clients = ClientDao()
+        self.credentials = CredentialDao()
+        self.refreshed_at = 0.0
+        self.last_refresh: Dict[str, int] = {}
+
+    @classmethod
+    def from_config(cls, cfg: Dict[str, Any] | None = None) -> 'ClientRegistry':
+        cfg = cfg or {}
+        registry = cls(
+            trigger_base=os.environ.get('TRIGGER_BASE_URL') or cfg.get('trigger_base_url'),
+            token_url=os.environ.get('CLIENT_TOKEN_URL') or cfg.get('client_token_url'),
+            snapshot_file=os.environ.get('CLIENT_REGISTRY_FILE') or cfg.get('registry_file'),
+            ttl=os.environ.get('CLIENT_REGISTRY_TTL') or cfg.get('registry_ttl', 0),
+        )
+        if registry.snapshot_file:
+            try:
+                registry.load_snapshot()
+            except Exception as e:
+                print(f"Ignoring unreadable client registry snapshot {registry.snapshot_file}: {e}")
+        return registry
+
+    # -- normalization -------------------------------------------------------------------
+    def normalize(self, raw: Dict[str, Any], fp: str | None = None) -> Tuple[ClientRecord, ClientCredential | None] | None:
+        client_id = raw.get('client_id') or raw.get('ClientID') or raw.get('oauth_client_id')
+        if not client_id:
+            return None
+        client_id = str(client_id)
+        scopes = raw.get('scopes') or raw.get('scope') or ()
+        if isinstance(scopes, str):
+            scopes = (scopes,)
+        trigger_url = raw.get('trigger_url') or (
+            self.trigger_base.rstrip('/') + '/data-exchange/trigger' if self.trigger_base else None)
+        sample_count = raw.get('sample_count')
+        rec = ClientRecord(
+            client_id=client_id,
+            name=raw.get('name'),
+            state=raw.get('state') or raw.get('status'),
+            scopes=tuple(scopes),
+            trigger_url=trigger_url,
+            token_url=raw.get('token_url') or self.token_url,
+            sample_count=int(sample_count) if sample_count is not None else None,
+            fingerprint=fp or fingerprint(raw),
+        )
+        cred = None
+        if raw.get('oauth_client_secret'):
+            cred = ClientCredential(client_id, raw['oauth_client_secret'], raw.get('oauth_client_id'))
+        return rec, cred
+
+    # -- loading -------------------------------------------------------------------------
+    def _apply(self, raw: Dict[str, Any], stats: Dict[str, int]) -> ClientRecord | None:
+        fp = fingerprint(raw)
+        client_id = raw.get('client_id') or raw.get('ClientID') or raw.get('oauth_client_id')
+        current = self.clients.get_client(str(client_id)) if client_id else None
+        if current is not None and current.fingerprint == fp:
+            stats['unchanged'] += 1
+            return current
+        normalized = self.normalize(raw, fp)
+        if normalized is None:
+            return None
+        rec, cred = normalized
+        stats['changed' if current is not None else 'added'] += 1
+        self.clients.put_client(rec)
+        if cred is not None:
+            self.credentials.put_credential(cred)
+        else:
+            self.credentials.remove_credential(rec.client_id)
+        return rec
+
+    def sync(self, raws: Iterable[Dict[str, Any]]) -> Iterator[ClientRecord]:
+        """Apply a full client listing, yielding each record as soon as it is applied.
+
+        Clients absent from the listing are removed once it is exhausted (not if the caller
+        stops early or the listing fails part way).
+        """
+        stats = {'added': 0, 'changed': 0, 'unchanged': 0, 'removed': 0}
+        seen = set()
+        for raw in raws:
+            rec = self._apply(raw, stats)
+            if rec is None or rec.client_id in seen:
+                continue
+            seen.add(rec.client_id)
+            yield rec
+        for rec in self.clients.all_clients():
+            if rec.client_id not in seen:
+                self.clients.remove_client(rec.client_id)
+                self.credentials.remove_credential(rec.client_id)
+                stats['removed'] += 1
+        self.refreshed_at = time.time()
+        self.last_refresh = stats
+        print(f"Client registry refreshed: {stats['added']} added, {stats['changed']} changed, "
+              f"{stats['removed']} removed, {stats['unchanged']} unchanged")
+
+    def refresh(self, raws: Iterable[Dict[str, Any]]) -> Dict[str, int]:
+        for _ in self.sync(raws):
+            pass
+        return self.last_refresh
+
+    bulk_load = refresh
+
+    def is_fresh(self) -> bool:
+        return self.ttl > 0 and bool(self.refreshed_at) and time.time() - self.refreshed_at < self.ttl
+
+    def by_scope(self, scope: str):
+        return self.clients.by_scope(scope)
+
+    def credential_for(self, client_id: str) -> ClientCredential | None:
+        return self.credentials.get_credential(client_id)
+
+    def __len__(self) -> int:
+        return len(self.clients)
+
+    # -- snapshots -----------------------------------------------------------------------
+    def _defaults(self) -> Dict[str, Any]:
+        return {'trigger_base': self.trigger_base, 'token_url': self.token_url}
+
+    def save_snapshot(self, path: str | None = None):
+        path = path or self.snapshot_file
+        if not path:
+            return
+        data = {
+            'version': SNAPSHOT_VERSION,
+            'refreshed_at': self.refreshed_at,
+            'defaults': self._defaults(),
+            'fields': list(RECORD_FIELDS),
+            'clients': [[getattr(rec, f) for f in RECORD_FIELDS] for rec in self.clients.all_clients()],
+            'credentials': [[c.client_id, c.secret, c.oauth_client_id] for c in self.credentials.all_credentials()],
+        }
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix='.registry-')  # created 0600
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f, separators=(',', ':'))
+            os.replace(tmp, path)
+        except Exception:
+            os.unlink(tmp)
+            raise
+
+    def load_snapshot(self, path: str | None = None) -> bool:
+        """Replace the registry's contents with a snapshot; False when there is none to use."""
+        path = path or self.snapshot_file
+        if not path or not os.path.exists(path):
+            return False
+        with open(path) as f:
+            data = json.load(f)
+        if (data.get('version') != SNAPSHOT_VERSION or data.get('defaults') != self._defaults()
+                or tuple(data.get('fields', ())) != RECORD_FIELDS):
+            return False
+        self.clients = ClientDao()
+        self.credentials = CredentialDao()
+        scopes_at = RECORD_FIELDS.index('scopes')
+        for row in data['clients']:
+            row[scopes_at] = tuple(row[scopes_at])
+            self.clients.put_client(ClientRecord(*row))
+        for row in data['credentials']:
+            self.credentials.put_credential(ClientCredential(*row))
+        self.refreshed_at = data.get('refreshed_at') or 0.0
+        return True
@@ -0,0 +1,137 @@
+"""Event-batch mode of the Lambda trigger path.
+
+A batched event (SQS, or a direct {"triggers": [...]} payload) is flattened into
+(item id, trigger) pairs, validated in one pass and uploaded as one object per trigger by a
+bounded thread pool sharing the process-wide S3 client (boto3 clients are thread-safe).
+
+Failures are reported in the Lambda partial batch response shape,
+
+    {"batchItemFailures": [{"itemIdentifier": "<SQS messageId>"}, ...]}
+
+so with `ReportBatchItemFailures` enabled on the event source only the messages holding a
+failed trigger are redelivered. Item ids are the SQS messageId for `Records` events and the
+trigger id otherwise. Invalid triggers (rejected by the validation stage of
+trigger/validation.py, or an unparseable SQS body) are returned under `invalid` but not as
+failures: redelivering them cannot succeed. With a Quarantine they are also written there.
+
+Accepted SQS message bodies: one trigger, a list of triggers or {"triggers": [...]}.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Tuple
+
+from .codec import get_codec
+from .trigger.validation import TriggerValidator
+
+logger = logging.getLogger("pyarchiver.event_batch")
+_BASIC = TriggerValidator('basic')
+
+
+def _triggers_in(payload: Any) -> List[Any]:
+    if isinstance(payload, dict) and "triggers" in payload:
+        payload = payload["triggers"]
+    return payload if isinstance(payload, list) else [payload]
+
+
+def iter_event(event: Dict[str, Any]) -> Iterator[Tuple[str | None, Any]]:
+    """(item id, trigger) pairs of an event; the item id is None outside SQS batches."""
+    if not event:
+        return
+    if isinstance(event.get("Records"), list):
+        for record in event["Records"]:
+            message_id = record.get("messageId")
+            try:
+                body = get_codec().loads(record.get("body") or "null")
+            except ValueError:
+                body = None
+            for t in _triggers_in(body):
+                yield message_id, t
+        return
+    if "triggers" in event:
+        for t in _triggers_in(event):
+            yield None, t
+        return
+    # Support direct single trigger payloads e.g. { "id": "abc", "payload": {...}}
+    if event.get("id"):
+        yield None, event
+
+
+class TriggerBatch:
+    """Validated triggers of one event, keyed by trigger id (the first copy of an id wins)."""
+
+    def __init__(self):
+        self.triggers: Dict[str, Dict[str, Any]] = {}
+        self.items: Dict[str, List[str]] = {}
+        self.invalid: List[Dict[str, Any]] = []
+        self.skipped_seen = 0
+
+    @classmethod
+    def from_pairs(cls, pairs, seen=None, validator=None, quarantine=None) -> 'TriggerBatch':
+        """Validate and de-duplicate in a single pass; ids in `seen` are counted and dropped."""
+        batch = cls()
+        check = (validator or _BASIC).check
+        for item_id, t in pairs:
+            reason = check(t)
+            if reason is not None:
+                logger.warning("Skipping invalid trigger (%s): %s", reason, t)
+                batch.invalid.append({"item": item_id, "reason": reason})
+                if quarantine is not None:
+                    quarantine.add(t, reason, item_id)
+                continue
+            tid = str(t["id"])
+            if tid not in batch.items:
+                if seen is not None and tid in seen:
+                    batch.skipped_seen += 1
+                    continue
+                batch.triggers[tid] = t
+                batch.items[tid] = []
+            owner = item_id if item_id is not None else tid
+            if owner not in batch.items[tid]:
+                batch.items[tid].append(owner)
+        return batch
+
+    def __len__(self) -> int:
+        return len(self.triggers)
+
+    def __iter__(self):
+        return iter(self.triggers.values())
+
+
+def upload_all(batch: TriggerBatch, uploader, fmt, workers: int, metrics) -> Tuple[List[dict], List[dict]]:
+    """Upload every trigger of the batch as its own object; returns (archived, failed)."""
+
+    def one(t):
+        key_filename = f"trigger_{t['id']}{fmt.suffix}"
+        try:
+            with metrics.phase("serialize"):
+                data = fmt.encode_one(t)
+            metrics.add_bytes("serialize", len(data))
+            with metrics.phase("upload"):
+                path = uploader.upload(key_filename, data, **fmt.upload_args())
+            metrics.add_bytes("upload", len(data))
+            return t["id"], path, None
+        except Exception as e:
+            return t["id"], None, e
+
+    archived, failed = [], []
+    workers = max(1, min(int(workers), len(batch)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="upload") as pool:
+        # map keeps the event order in the result
+        for tid, path, error in pool.map(one, batch):
+            if error is None:
+                archived.append({"id": tid, "s3_path": path})
+                logger.info("Archived trigger %s -> %s", tid, path)
+            else:
+                failed.append({"id": tid, "error": f"{type(error).__name__}: {error}"})
+                logger.warning("Failed to archive trigger %s: %s", tid, error)
+    return archived, failed
+
+
+def batch_item_failures(batch: TriggerBatch, failed: List[dict]) -> List[Dict[str, str]]:
+    """Partial batch response entries for the items holding a failed trigger."""
+    out: List[str] = []
+    for f in failed:
+        for item in batch.items.get(str(f["id"]), []):
+            if item not in out:
+                out.append(item)
+    return [{"itemIdentifier": item} for item in out]
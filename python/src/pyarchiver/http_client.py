@@ -0,0 +1,218 @@
+"""Shared, pooled HTTP transport for the fetchers and the token provider.
+
+A single HttpClient wraps one requests.Session so every call to the same host reuses a
+kept-alive connection instead of paying a fresh TCP/TLS handshake.
+
+Configuration (dict, all optional):
+- connect_timeout / read_timeout: seconds (default 3.05 / 10)
+- pool_connections: number of per-host pools kept (default 10)
+- pool_maxsize: connections kept per host (default 10)
+- host_pool_sizes: {"host[:port]": maxsize} overrides for specific hosts
+- max_retries: retries on 429/5xx and connection errors (default 3)
+- backoff_base / backoff_max: exponential backoff with full jitter, in seconds (default 0.2 / 5)
+- rate_limit: requests/second allowed per host (default 0 = unpaced; 429 Retry-After pauses
+  the host either way), `rate_burst` bucket size, `host_rate_limits` {"host[:port]": rps}
+- max_retry_after: longest Retry-After pause waited out, in seconds (default 10); a longer one
+  raises ThrottledError at once, and for every request to that host until the pause is over
+- breaker_failures / breaker_cooldown: consecutive failed requests (connection error, timeout
+  or 5xx after the retries) that open a host's circuit and seconds before a probe is let
+  through (default 5 / 30; 0 failures disables)
+
+Throttling and circuit breaking are per host, see throttle.py.
+"""
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Tuple
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .throttle import CircuitBreaker, CircuitOpenError, HostBucket, ThrottledError
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+def _retry_after(resp: requests.Response) -> float:
+    """Seconds requested by a Retry-After header (delta-seconds or HTTP date), else 0."""
+    value = resp.headers.get('Retry-After')
+    if not value:
+        return 0.0
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class HttpClient:
+    def __init__(self, cfg: Dict[str, Any] | None = None):
+        self.cfg = cfg or {}
+        self.connect_timeout = float(self.cfg.get('connect_timeout', 3.05))
+        self.read_timeout = float(self.cfg.get('read_timeout', 10))
+        self.max_retries = int(self.cfg.get('max_retries', 3))
+        self.backoff_base = float(self.cfg.get('backoff_base', 0.2))
+        self.backoff_max = float(self.cfg.get('backoff_max', 5))
+
+        pool_connections = int(self.cfg.get('pool_connections', 10))
+        pool_maxsize = int(self.cfg.get('pool_maxsize', 10))
+
+        self.session = requests.Session()
+        # requests already decodes gzip/deflate bodies; advertise it explicitly
+        self.session.headers['Accept-Encoding'] = 'gzip, deflate'
+        self._adapters = [HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)]
+        self.session.mount('https://', self._adapters[0])
+        self.session.mount('http://', self._adapters[0])
+        for host, size in (self.cfg.get('host_pool_sizes') or {}).items():
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=int(size))
+            self._adapters.append(adapter)
+            self.session.mount(f'https://{host}/', adapter)
+            self.session.mount(f'http://{host}/', adapter)
+
+        self.rate_limit = float(self.cfg.get('rate_limit', 0))
+        self.rate_burst = self.cfg.get('rate_burst')
+        self.host_rate_limits = {h: float(r) for h, r in (self.cfg.get('host_rate_limits') or {}).items()}
+        self.max_retry_after = float(self.cfg.get('max_retry_after', 10))
+        self.breaker_failures = int(self.cfg.get('breaker_failures', 5))
+        self.breaker_cooldown = float(self.cfg.get('breaker_cooldown', 30))
+        self._hosts: Dict[str, Tuple[HostBucket, CircuitBreaker]] = {}
+
+        self._lock = threading.Lock()
+        self._counters = {'requests': 0, 'retries': 0, 'errors': 0, 'throttled': 0, 'rejected': 0, 'rate_wait': 0.0}
+
+    def _count(self, name: str, n: int = 1):
+        with self._lock:
+            self._counters[name] += n
+
+    def _host(self, url: str) -> Tuple[HostBucket, CircuitBreaker]:
+        host = urlparse(url).netloc
+        with self._lock:
+            guard = self._hosts.get(host)
+            if guard is None:
+                rate = self.host_rate_limits.get(host, self.rate_limit)
+                guard = (HostBucket(rate or None, self.rate_burst, max_pause=self.max_retry_after), CircuitBreaker(self.breaker_failures, self.breaker_cooldown))
+                self._hosts[host] = guard
+            return guard
+
+    def _backoff(self, attempt: int) -> float:
+        # exponential backoff with full jitter
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """Send a request through the pooled session, retrying 429/5xx and connection errors.
+
+        Raises CircuitOpenError without sending anything while the host's circuit is open, and
+        ThrottledError when the host asks for a pause longer than max_retry_after. The breaker
+        sees one outcome per call, once the retries are over.
+        """
+        kwargs.setdefault('timeout', (self.connect_timeout, self.read_timeout))
+        bucket, breaker = self._host(url)
+        try:
+            breaker.before(urlparse(url).netloc)
+        except CircuitOpenError:
+            self._count('rejected')
+            raise
+        attempt = 0
+        while True:
+            try:
+                waited = bucket.acquire()
+            except ThrottledError:
+                self._count('rejected')
+                breaker.release()
+                raise
+            if waited:
+                self._count('rate_wait', waited)
+            self._count('requests')
+            try:
+                resp = self.session.request(method, url, **kwargs)
+            except Exception as e:
+                network = isinstance(e, (requests.ConnectionError, requests.Timeout))
+                if not network or attempt >= self.max_retries:
+                    self._count('errors')
+                    # only an unreachable host counts against its circuit
+                    breaker.failure() if network else breaker.release()
+                    raise
+                delay = self._backoff(attempt)
+            else:
+                if resp.status_code == 429:
+                    self._count('throttled')
+                    retry_after = _retry_after(resp)
+                    bucket.throttled(retry_after)
+                    if retry_after > self.max_retry_after:
+                        # the host is up; it just will not serve us within any useful time
+                        breaker.success()
+                        resp.close()
+                        raise ThrottledError(f"{urlparse(url).netloc} asked for a {retry_after:.0f}s pause, "
+                                             f"more than max_retry_after={self.max_retry_after:g}s", retry_after)
+                elif resp.status_code < 500:
+                    bucket.succeeded()
+                if resp.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                    # a 429 means the host is up, it just wants us slower
+                    breaker.failure() if resp.status_code >= 500 else breaker.success()
+                    return resp
+                delay = min(self.backoff_max, max(self._backoff(attempt), _retry_after(resp)))
+                resp.close()
+            attempt += 1
+            self._count('retries')
+            time.sleep(delay)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+    def stats(self, since: Dict[str, Any] | None = None) -> Dict[str, Any]:
+        """Request/retry counters plus connection reuse taken from the urllib3 pools.
+
+        With `since` (an earlier stats() result) the counters are reported as the increase
+        since then; 'hosts' and 'circuits_open' stay current values.
+        """
+        opened = 0
+        served = 0
+        hosts = 0
+        for adapter in self._adapters:
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                hosts += 1
+                opened += pool.num_connections
+                served += pool.num_requests
+        with self._lock:
+            out = dict(self._counters)
+            out['rate_wait'] = round(out['rate_wait'], 3)
+            out['circuits_open'] = sum(1 for _, b in self._hosts.values() if b.state != 'closed')
+        out.update({
+            'hosts': hosts,
+            'connections_opened': opened,
+            # every request served by a pool that did not open a new connection was a pool hit
+            'connections_reused': max(0, served - opened),
+        })
+        if since:
+            for k, v in since.items():
+                if k not in ('hosts', 'circuits_open') and isinstance(v, (int, float)):
+                    out[k] = round(out[k] - v, 3) if isinstance(v, float) else out[k] - v
+        return out
+
+    def close(self):
+        self.session.close()
+
+
+_shared_client: HttpClient | None = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_client(cfg: Dict[str, Any] | None = None) -> HttpClient:
+    """Process-wide HttpClient; `cfg` only applies the first time it is created."""
+    global _shared_client
+    with _shared_lock:
+        if _shared_client is None:
+            _shared_client = HttpClient(cfg)
+        return _shared_client
@@ -0,0 +1,103 @@
+"""Incremental archiving: skip or shrink uploads whose content did not change.
+
+A per-client manifest is stored next to the client's archives
+(`<prefix>/<client_id>/_manifest.json`, through the same uploader) and records:
+
+    {"hash": "<sha256 of the payload>", "triggers": {"<id>": "<sha256>"}, "key": ..., "path": ...,
+     "bytes": <size of the last full archive>, "updated": "<iso timestamp>"}
+
+Modes:
+- skip:  upload the full payload only when its hash differs from the manifest
+- delta: upload only new or changed triggers (the first run writes the full payload)
+
+Hashes are taken over canonical JSON (sorted keys, compact), so they do not depend on the
+archive format or on key order in the response.
+"""
+import datetime
+import hashlib
+import json
+from typing import Any, Dict, List, Tuple
+
+MANIFEST_NAME = '_manifest.json'
+MODES = ('off', 'skip', 'delta')
+
+
+def _trigger_key(trigger: Dict[str, Any], digest: str) -> str:
+    tid = trigger.get('id') if isinstance(trigger, dict) else None
+    # triggers without an id are tracked by content
+    return str(tid) if tid is not None else f'sha256:{digest}'
+
+
+def digest_triggers(triggers: List[Any]) -> Tuple[str, List[Tuple[str, str, int]]]:
+    """Return the payload hash and one (trigger key, hash, canonical size) entry per trigger."""
+    payload = hashlib.sha256()
+    entries: List[Tuple[str, str, int]] = []
+    for t in triggers:
+        canonical = json.dumps(t, sort_keys=True, separators=(',', ':')).encode('utf-8')
+        d = hashlib.sha256(canonical).hexdigest()
+        payload.update(d.encode('ascii'))
+        entries.append((_trigger_key(t, d), d, len(canonical)))
+    return payload.hexdigest(), entries
+
+
+class IncrementalPlan:
+    """What to upload for one client given its manifest."""
+
+    def __init__(self, mode: str, triggers: List[Any], manifest: Dict[str, Any] | None):
+        self.mode = mode
+        self.previous = manifest
+        self.payload_hash, entries = digest_triggers(triggers)
+        self.digests = {key: d for key, d, _ in entries}
+        self.skip = False
+        self.is_delta = False
+        self.triggers = triggers
+        self.saved_bytes = 0
+
+        if manifest is None:
+            return
+        if manifest.get('hash') == self.payload_hash:
+            self.skip = True
+            self.triggers = []
+            # same content as the last full archive, which is what we would have written again
+            self.saved_bytes = int(manifest.get('bytes') or sum(size for _, _, size in entries))
+            return
+        if mode == 'delta':
+            old = manifest.get('triggers') or {}
+            changed = []
+            for t, (key, d, size) in zip(triggers, entries):
+                if old.get(key) != d:
+                    changed.append(t)
+                else:
+                    self.saved_bytes += size
+            self.is_delta = True
+            self.triggers = changed
+            self.skip = not changed
+
+    def manifest(self, key: str, path: str, nbytes: int) -> Dict[str, Any]:
+        out = {
+            'hash': self.payload_hash,
+            'triggers': self.digests,
+            'updated': datetime.datetime.utcnow().isoformat() + 'Z',
+        }
+        if self.is_delta and self.previous:
+            # the last *full* archive is still the reference for skip-size accounting
+            out.update({'key': self.previous.get('key'), 'path': self.previous.get('path'),
+                        'bytes': self.previous.get('bytes'), 'delta_key': key, 'delta_path': path})
+        else:
+            out.update({'key': key, 'path': path, 'bytes': nbytes})
+        return out
+
+
+def load_manifest(uploader, name: str) -> Dict[str, Any] | None:
+    data = uploader.read(name)
+    if data is None:
+        return None
+    try:
+        return json.loads(data)
+    except ValueError:
+        print(f"Ignoring unreadable manifest {name}")
+        return None
+
+
+def save_manifest(uploader, name: str, manifest: Dict[str, Any]):
+    uploader.upload(name, json.dumps(manifest, separators=(',', ':')).encode('utf-8'), content_type='application/json')
@@ -0,0 +1,98 @@
+"""Run journal: per-client progress so an interrupted run can resume where it stopped.
+
+Every client of a run moves through pending -> fetched -> uploaded (or failed). Records are
+keyed by an idempotency key `<client_id>:<yyyymmdd>`, so a re-run on the same day knows which
+clients are already archived and only processes the rest.
+
+Records are buffered and written in batches through the run's uploader (local directory or
+S3), each batch as its own small NDJSON object, because S3 objects cannot be appended to:
+
+    <prefix>/_journal/<yyyymmdd>/part_<run>_<seq>.ndjson
+        {"key": "123:20240102", "client_id": "123", "state": "uploaded", "s3": "...", "count": 5, "ts": "..."}
+
+A batch is written once `flush_every` records are buffered or `flush_interval` seconds have
+passed since the last write, and always on close(). Loading replays all batches of the day in
+name order (part names sort by run start time), the last record per key wins.
+"""
+import datetime
+import json
+import threading
+import time
+import uuid
+from typing import Any, Dict, List
+
+JOURNAL_DIR = '_journal'
+STATES = ('pending', 'fetched', 'uploaded', 'failed')
+
+
+def journal_key(client_id: str, day: datetime.datetime) -> str:
+    return f"{client_id}:{day:%Y%m%d}"
+
+
+class RunJournal:
+    def __init__(self, uploader, prefix: str, day: datetime.datetime, cfg: Dict[str, Any] | None = None):
+        cfg = cfg or {}
+        self.uploader = uploader
+        self.day = day
+        self.dir = f"{prefix.rstrip('/')}/{JOURNAL_DIR}/{day:%Y%m%d}" if prefix else f"{JOURNAL_DIR}/{day:%Y%m%d}"
+        self.flush_every = max(1, int(cfg.get('journal_flush_every', 100)))
+        self.flush_interval = float(cfg.get('journal_flush_interval', 5.0))
+        self.run_id = f"{datetime.datetime.utcnow():%Y%m%dT%H%M%S%f}_{uuid.uuid4().hex[:8]}"
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.writes = 0
+        self._seq = 0
+        self._buf: List[Dict[str, Any]] = []
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+    def load(self) -> Dict[str, Dict[str, Any]]:
+        """Replay the day's journal; returns the latest record per idempotency key."""
+        for name in self.uploader.list(self.dir + '/'):
+            data = self.uploader.read(name)
+            for line in (data or b'').splitlines():
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    # a torn last line from a crashed writer; the record is simply redone
+                    continue
+                self.entries[rec['key']] = rec
+        return self.entries
+
+    def completed(self, client_id: str) -> Dict[str, Any] | None:
+        """The uploaded record for `client_id` from an earlier run today, if any."""
+        rec = self.entries.get(journal_key(client_id, self.day))
+        return rec if rec and rec.get('state') == 'uploaded' else None
+
+    def record(self, client_id: str, state: str, **fields):
+        if state not in STATES:
+            raise ValueError(f"state must be one of {STATES}, got {state!r}")
+        rec = {'key': journal_key(client_id, self.day), 'client_id': client_id, 'state': state,
+               'ts': datetime.datetime.utcnow().isoformat() + 'Z'}
+        rec.update(fields)
+        with self._lock:
+            self.entries[rec['key']] = rec
+            self._buf.append(rec)
+            due = len(self._buf) >= self.flush_every or time.monotonic() - self._last_flush >= self.flush_interval
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            batch, self._buf = self._buf, []
+            self._last_flush = time.monotonic()
+        if not batch:
+            return
+        data = b''.join(json.dumps(r, separators=(',', ':')).encode('utf-8') + b'\n' for r in batch)
+        with self._write_lock:
+            self._seq += 1
+            name = f"{self.dir}/part_{self.run_id}_{self._seq:05d}.ndjson"
+            try:
+                self.uploader.upload(name, data, content_type='application/x-ndjson')
+                self.writes += 1
+            except Exception as e:
+                # losing a checkpoint only means those clients are redone on resume
+                print(f"Writing run journal {name} failed: {e}")
+
+    def close(self):
+        self.flush()
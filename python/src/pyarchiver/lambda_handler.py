@@ -1,42 +1,116 @@
 """AWS Lambda handler for pyarchiver
 
 Behavior:
-- If event contains a `triggers` list -> those triggers will be archived
+- If event contains a `triggers` list, or is an SQS batch (`Records`), those triggers are
+  archived in event-batch mode (event_batch.py): validated in one pass, uploaded by
+  UPLOAD_WORKERS threads, and failures returned as `batchItemFailures` so only the failed
+  messages are retried
+- {"action": "run_clients"} runs the client archiver, optionally for one shard
+  ({"shard": k, "of": N, "client_ids": [...]}), scheduled against the invocation's remaining
+  time: clients that would not finish are listed under `deferred` for a follow-up
+  invocation; {"action": "fan_out", "of": N} coordinates
+  N such shard invocations and returns the merged run report. The workers stop before the
+  coordinator's own deadline; clients they deferred are dispatched asynchronously as a
+  follow-up {"action": "fan_out", "client_ids": [...]} (at most FANOUT_MAX_FOLLOWUPS deep)
+- {"action": "compact", "mode": "clients" | "triggers"} merges the small archives of past
+  months into compressed rollups (compaction.py); partitions that would run past the timeout
+  are returned under `deferred`
 - Else the lambda will try to fetch triggers from TRIGGER_URL environment variable using TriggerFetcher
 - Uploads each trigger as JSON into the S3 bucket defined by environment variable `BUCKET`
-- Returns a run summary JSON
+  (or, with ARCHIVE_LAYOUT=segments, packs them into NDJSON segments with a sidecar index)
+- Returns a run summary JSON; its run metrics (phase timings, bytes, retries, peak RSS) are
+  also logged as one CloudWatch Embedded Metric Format record per invocation
 
 Design notes:
 - Uses S3Uploader (which in Lambda will pick up IAM role credentials automatically)
 - Keeps business logic minimal so unit tests can be added easily
+- Cold start: only the standard library is imported at module load; each action imports what
+  it uses (requests, boto3, ...) on first call. The boto3 clients (aws.py), the pooled HTTP
+  session, the OAuth token cache and the client registry live at module scope and are reused by warm invocations.
+  The emitted metrics carry `cold_start` and, on the first invocation, `init_ms` (module
+  import time); benchmarks/bench_cold_start.py measures import cost in fresh interpreters.
 """
-import os
-import json
-import logging
-from typing import Any, Dict, List
+import time
 
-from .trigger.trigger_fetcher import TriggerFetcher
-from .storage.s3_uploader import S3Uploader
-from .archiver_lambda_service import ArchiverLambdaService
+_INIT_STARTED = time.perf_counter()
+
+import os  # noqa: E402
+import logging  # noqa: E402
+from typing import Any, Dict  # noqa: E402
 
 logger = logging.getLogger("pyarchiver.lambda_handler")
 logger.setLevel(os.environ.get("LOG_LEVEL", "INFO"))
 
 
-def _get_triggers_from_event(event: Dict[str, Any]) -> List[Dict[str, Any]]:
-    if not event:
-        return []
+_token_provider = None
+_registry = None
+_seen = None
+_cold = True
+
+
+def _shared_http():
+    from .http_client import get_shared_client
+
+    return get_shared_client()
+
+
+def _shared_token_provider():
+    global _token_provider
+    if _token_provider is None:
+        from .token_provider import TokenProvider
+
+        _token_provider = TokenProvider({}, http=_shared_http())
+    return _token_provider
+
+
+def _shared_registry():
+    global _registry
+    if _registry is None:
+        from .dao.registry import ClientRegistry
+
+        _registry = ClientRegistry.from_config({})
+    return _registry
+
+
+def _shared_seen(bucket: str, prefix: str):
+    """The seen-id index of bucket/prefix, kept across warm invocations and refreshed per run."""
+    global _seen
+    cache_dir = os.environ.get("SEEN_CACHE_DIR")
+    key = (bucket, prefix, cache_dir)
+    if _seen is not None and _seen[0] == key:
+        return _seen[1].refresh()
+    from .seen_index import SeenIndex
+    from .storage.s3_uploader import S3Uploader
+
+    if _seen is not None:
+        _seen[1].close()
+    index = SeenIndex(S3Uploader({"bucket": bucket, "prefix": prefix}), {"seen_cache_dir": cache_dir}).load()
+    _seen = (key, index)
+    return index
+
+
+def _make_invoker(context: Any):
+    from .sharding import InProcessInvoker, LambdaInvoker
+
+    if os.environ.get("FANOUT_INVOKER") == "inprocess":
+        return InProcessInvoker(handler)
+    function_name = os.environ.get("WORKER_FUNCTION_NAME") or getattr(context, "function_name", None)
+    if not function_name:
+        raise RuntimeError("fan_out needs WORKER_FUNCTION_NAME or a Lambda context to invoke workers")
+    return LambdaInvoker(function_name)
 
-    if "triggers" in event:
-        if isinstance(event["triggers"], list):
-            return event["triggers"]
-        return [event["triggers"]]
 
-    # Support direct single trigger payloads e.g. { "id": "abc", "payload": {...}}
-    if isinstance(event, dict) and event.get("id"):
-        return [event]
+def _emit_metrics(summary: Dict[str, Any], action: str, cold: bool):
+    metrics = summary.get("metrics")
+    if not metrics:
+        return
+    from .metrics import emit
 
-    return []
+    metrics["cold_start"] = cold
+    if cold:
+        metrics["init_ms"] = _INIT_MS
+    emit(metrics, os.environ.get("METRICS_FORMAT", "emf"), os.environ.get("METRICS_NAMESPACE", "pyarchiver"),
+         {"Action": action})
 
 
 def handler(event: Dict[str, Any], context: Any = None) -> Dict[str, Any]:
@@ -46,44 +120,167 @@ def handler(event: Dict[str, Any], context: Any = None) -> Dict[str, Any]:
     - BUCKET (required): S3 bucket name to upload JSON files
     - PREFIX (optional): S3 key prefix
     - TRIGGER_URL (optional): if no triggers in event then fetch from this URL
+    - ARCHIVE_FORMAT (optional): format of per-trigger objects (see storage/formats.py)
+    - ARCHIVE_LAYOUT (optional): 'per_object' (default) or 'segments'
+    - SEGMENT_MAX_BYTES / SEGMENT_MAX_COUNT (optional): bounds of one segment
+    - SHARDS (optional): shard count for {"action": "fan_out"} when the event has no "of"
+    - WORKER_FUNCTION_NAME (optional): function invoked for each shard (default: this function)
+    - FANOUT_MAX_FOLLOWUPS (optional): how many follow-up fan-outs may chain for clients that
+      were deferred (default 3; 0 only reports them)
+    - FANOUT_INVOKER=inprocess (optional): run shards in-process instead of invoking Lambda
+    - CLIENT_REGISTRY_TTL (optional): seconds a warm container reuses its client list without
+      calling CLIENTS_API_URL (default 0); CLIENT_REGISTRY_FILE snapshots it for cold starts
+    - DEADLINE_MARGIN_S (optional): run_clients stops starting clients this many seconds before
+      the Lambda timeout (default 10)
+    - UPLOAD_WORKERS (optional): concurrent per-trigger uploads (default 8)
+    - DEDUPE=1 (optional): skip triggers whose id is already in the seen-id index under PREFIX;
+      the index stays loaded across warm invocations and each run saves its ids as a delta
+    - SEEN_CACHE_DIR (optional): local directory for the downloaded index (default: system temp)
+    - COMPACTION_SOURCE_ACTION (optional): what compaction does with merged archives:
+      'tag' (default), 'delete' or 'keep'; COMPACTION_WORKERS partitions in parallel (default 4)
+    - TRIGGER_VALIDATION (optional): 'basic' (default, an id is required) or 'strict' (every
+      trigger column present, state among the allowed states); TRIGGER_QUARANTINE=1 writes
+      rejected triggers under _quarantine/ instead of only logging them
+    - JSON_CODEC (optional): 'auto' (default: orjson when installed), 'orjson' or 'json'
+    - METRICS_FORMAT (optional): 'emf' (default), 'json' for a plain structured log line, or 'off'
+    - METRICS_NAMESPACE (optional): CloudWatch namespace of the EMF metrics (default 'pyarchiver')
     """
+    global _cold
+    cold, _cold = _cold, False
     bucket = os.environ.get("BUCKET")
     prefix = os.environ.get("PREFIX", "")
 
     if not bucket:
         raise RuntimeError("Environment variable BUCKET must be set for Lambda to upload to S3")
 
-    s3_cfg = {"bucket": bucket, "prefix": prefix}
-    uploader = S3Uploader(s3_cfg)
+    # Coordinator: partition the clients into shards and fan out one worker invocation each
+    if event and event.get('action') == 'fan_out':
+        from .archiver_lambda_service import REQUIRED_SCOPE
+        from .client_fetcher import ClientFetcher
+        from .sharding import Coordinator
+
+        from .scheduler import Deadline
+
+        shards = int(event.get('of') or os.environ.get('SHARDS', 1))
+        invoker = _make_invoker(context)
+        coordinator = Coordinator(ClientFetcher(http=_shared_http()), invoker, shards, scope=REQUIRED_SCOPE,
+                                  client_ids=event.get('client_ids'))
+        # each worker logs its own metrics; the coordinator only reports the merged view
+        merged = coordinator.run(Deadline.from_context(context, float(os.environ.get('DEADLINE_MARGIN_S') or 10)))
+        deferred = merged.get('deferred')
+        if deferred:
+            # nobody reads a scheduled invocation's result: hand the leftovers to a follow-up run
+            depth = int(event.get('followup', 0)) + 1
+            if depth <= int(os.environ.get('FANOUT_MAX_FOLLOWUPS', 3)):
+                invoker.dispatch({'action': 'fan_out', 'of': shards, 'client_ids': deferred, 'followup': depth})
+                merged['followup'] = depth
+                logger.info("Dispatched follow-up %d for %d deferred clients", depth, len(deferred))
+            else:
+                logger.warning("Not archived in %d follow-ups, giving up: %s", depth - 1, ", ".join(deferred))
+        return merged
+
+    # Compaction of past months: {"action": "compact", "mode": "clients" | "triggers"}
+    if event and event.get('action') == 'compact':
+        from .compaction import Compactor
+        from .scheduler import Deadline
+
+        deadline = Deadline.from_context(context, float(os.environ.get('DEADLINE_MARGIN_S') or 10))
+        if event.get('mode', 'clients') == 'clients':
+            compactor = Compactor.for_clients({}, deadline)
+        else:
+            from .storage.s3_uploader import S3Uploader
+
+            compactor = Compactor(S3Uploader({"bucket": bucket, "prefix": prefix}), '', {}, deadline)
+        if event.get('before'):
+            compactor.before = str(event['before'])
+        return compactor.run(event.get('mode', 'clients'))
 
     # If called with run_clients or action=run_clients, run the client-based archiver
+    # (optionally only one shard of it: {"shard": k, "of": N, "client_ids": [...]})
     if event and (event.get('run_clients') or event.get('action') == 'run_clients'):
-        svc = ArchiverLambdaService()
-        return svc.run_once()
+        from .archiver_lambda_service import ArchiverLambdaService
+        from .scheduler import Deadline
+
+        svc = ArchiverLambdaService(http=_shared_http(), token_provider=_shared_token_provider(),
+                                    registry=_shared_registry())
+        # largest clients first; whatever would run past the timeout is returned as 'deferred'.
+        # A shard worker also stops before its coordinator's deadline, which started earlier
+        deadline = Deadline.earliest(
+            Deadline.from_context(context, svc.deadline_margin),
+            Deadline.at(event['deadline_at'], svc.deadline_margin) if event.get('deadline_at') else None)
+        summary = svc.run_once(shard=event.get('shard'), of=event.get('of'), client_ids=event.get('client_ids'),
+                               deadline=deadline)
+        _emit_metrics(summary, 'run_clients', cold)
+        return summary
 
     # Otherwise, treat event as direct triggers or fetch a default trigger url
-    triggers = _get_triggers_from_event(event)
-    if not triggers:
+    from .event_batch import TriggerBatch, batch_item_failures, iter_event, upload_all
+    from .metrics import RunMetrics
+
+    metrics = RunMetrics()
+    pairs = list(iter_event(event))
+    if not pairs:
         trigger_url = os.environ.get("TRIGGER_URL")
         if trigger_url:
-            fetcher = TriggerFetcher({"url": trigger_url, "sample_count": 0})
-            triggers = fetcher.fetch_triggers()
+            from .trigger.trigger_fetcher import TriggerFetcher
+
+            fetcher = TriggerFetcher({"url": trigger_url, "sample_count": 0}, metrics=metrics)
+            pairs = [(None, t) for t in fetcher.fetch_triggers()]
         else:
             # nothing to do
             logger.info("No triggers in event and no TRIGGER_URL configured. Exiting.")
             return {"archived": []}
 
-    archived = []
-    for t in triggers:
-        # basic validation
-        if not t.get("id"):
-            logger.warning("Skipping trigger with missing id: %s", t)
-            continue
-        key_filename = f"trigger_{t['id']}.json"
-        data = json.dumps(t, indent=2)
-        path = uploader.upload(key_filename, data.encode("utf-8"))
-        archived.append({"id": t["id"], "s3_path": path})
-        logger.info("Archived trigger %s -> %s", t["id"], path)
-
-    result = {"archived": archived, "count": len(archived)}
+    from .storage.formats import get_format
+    from .storage.s3_uploader import S3Uploader
+
+    uploader = S3Uploader({"bucket": bucket, "prefix": prefix})
+    fmt = get_format(os.environ.get("ARCHIVE_FORMAT"))
+    seen = None
+    if os.environ.get("DEDUPE", "").lower() in ("1", "true", "yes"):
+        seen = _shared_seen(bucket, prefix)
+    from .trigger.validation import Quarantine, TriggerValidator
+
+    validator = TriggerValidator.from_config({}, min_level="basic")
+    quarantine = Quarantine(uploader) if validator.quarantine else None
+    batch = TriggerBatch.from_pairs(pairs, seen, validator, quarantine)
+    del pairs
+    if quarantine is not None:
+        quarantine.close()
+
+    failed = []
+    if os.environ.get("ARCHIVE_LAYOUT") == "segments":
+        from .storage.segment_writer import SegmentWriter
+
+        # segments pack many triggers per object: a failed upload fails (and retries) the whole batch
+        writer = SegmentWriter(uploader, {
+            "segment_max_bytes": os.environ.get("SEGMENT_MAX_BYTES", 16 * 1024 * 1024),
+            "segment_max_count": os.environ.get("SEGMENT_MAX_COUNT", 50000),
+        })
+        with metrics.phase("serialize"):
+            for t in batch:
+                writer.add(t)
+        with metrics.phase("upload"):
+            segments = writer.close()
+        archived = []
+        for seg in segments:
+            archived.extend({"id": i, "s3_path": seg["path"]} for i in seg["ids"])
+            logger.info("Archived %d triggers -> %s", len(seg["ids"]), seg["path"])
+    else:
+        archived, failed = upload_all(batch, uploader, fmt, int(os.environ.get("UPLOAD_WORKERS", 8)), metrics)
+    if seen is not None:
+        # only ids whose upload succeeded are recorded; failed ones are archived on redelivery
+        for a in archived:
+            seen.add(a["id"])
+        seen.save()
+
+    result = {"archived": archived, "count": len(archived), "metrics": metrics.summary(),
+              "failed": failed, "invalid": batch.invalid,
+              "batchItemFailures": batch_item_failures(batch, failed)}
+    if seen is not None:
+        result["skipped_seen"] = batch.skipped_seen
+    _emit_metrics(result, "triggers", cold)
     return result
+
+
+_INIT_MS = round((time.perf_counter() - _INIT_STARTED) * 1000, 2)
@@ -0,0 +1,149 @@
+"""Run instrumentation: per-phase timers and byte counters, overall and per client.
+
+Phases used by the archivers: token, fetch, parse, serialize, upload (a streamed client is
+one 'upload' phase, since reading, parsing, encoding and uploading overlap there).
+
+    metrics = RunMetrics()
+    with metrics.phase('fetch', client_id):
+        ...
+    metrics.add_bytes('fetch', len(body), client_id)
+    metrics.summary(http_stats)   # -> dict stored under 'metrics' in the run summary
+
+summary() reports count / total / p50 / p95 / p99 / max per phase, byte totals, HTTP retry
+counts, peak RSS and a per-client breakdown. emit() writes it to stdout as one CloudWatch
+Embedded Metric Format record (METRICS_FORMAT=emf, the Lambda default) or a plain structured
+JSON log line (METRICS_FORMAT=json).
+"""
+import contextlib
+import json
+import math
+import sys
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, Iterator, List
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - not available on Windows
+    resource = None
+
+PHASES = ('token', 'fetch', 'parse', 'serialize', 'upload')
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """Nearest-rank percentile of an already sorted list (0 when empty)."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def peak_rss_mb() -> float | None:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+class RunMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._timings: Dict[str, List[float]] = defaultdict(list)
+        self._bytes: Dict[str, int] = defaultdict(int)
+        self._clients: Dict[str, Dict[str, float]] = defaultdict(dict)
+        self._started = time.perf_counter()
+
+    @contextlib.contextmanager
+    def phase(self, name: str, client_id: str | None = None) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - t0, client_id)
+
+    def observe(self, name: str, seconds: float, client_id: str | None = None):
+        with self._lock:
+            self._timings[name].append(seconds)
+            if client_id is not None:
+                per = self._clients[client_id]
+                per[f'{name}_s'] = per.get(f'{name}_s', 0.0) + seconds
+
+    def add_bytes(self, name: str, n: int, client_id: str | None = None):
+        with self._lock:
+            self._bytes[name] += n
+            if client_id is not None:
+                per = self._clients[client_id]
+                per[f'{name}_bytes'] = per.get(f'{name}_bytes', 0) + n
+
+    def summary(self, http_stats: Dict[str, Any] | None = None) -> Dict[str, Any]:
+        with self._lock:
+            timings = {k: sorted(v) for k, v in self._timings.items()}
+            nbytes = dict(self._bytes)
+            clients = {cid: {k: round(v, 4) if isinstance(v, float) else v for k, v in per.items()}
+                       for cid, per in self._clients.items()}
+        phases = {}
+        for name, values in timings.items():
+            phases[name] = {
+                'count': len(values),
+                'total_s': round(sum(values), 4),
+                'p50_ms': round(percentile(values, 50) * 1000, 2),
+                'p95_ms': round(percentile(values, 95) * 1000, 2),
+                'p99_ms': round(percentile(values, 99) * 1000, 2),
+                'max_ms': round(values[-1] * 1000, 2),
+            }
+        http_stats = http_stats or {}
+        return {
+            'wall_s': round(time.perf_counter() - self._started, 4),
+            'phases': phases,
+            'bytes': nbytes,
+            'retries': http_stats.get('retries', 0),
+            'throttled': http_stats.get('throttled', 0),
+            'peak_rss_mb': peak_rss_mb(),
+            'clients': clients,
+        }
+
+
+def to_emf(summary: Dict[str, Any], namespace: str = 'pyarchiver', dimensions: Dict[str, str] | None = None) -> Dict[str, Any]:
+    """Aggregate metrics of a summary() as one CloudWatch Embedded Metric Format record."""
+    dimensions = dimensions or {}
+    record: Dict[str, Any] = dict(dimensions)
+    defs = []
+
+    def put(name, value, unit):
+        if value is None:
+            return
+        record[name] = value
+        defs.append({'Name': name, 'Unit': unit})
+
+    for phase, agg in summary.get('phases', {}).items():
+        for stat in ('p50', 'p95', 'p99'):
+            put(f'{phase}_{stat}', agg[f'{stat}_ms'], 'Milliseconds')
+        put(f'{phase}_count', agg['count'], 'Count')
+    for name, n in summary.get('bytes', {}).items():
+        put(f'{name}_bytes', n, 'Bytes')
+    put('retries', summary.get('retries', 0), 'Count')
+    put('throttled', summary.get('throttled', 0), 'Count')
+    put('peak_rss', summary.get('peak_rss_mb'), 'Megabytes')
+    put('wall_time', round(summary.get('wall_s', 0) * 1000, 2), 'Milliseconds')
+    if 'cold_start' in summary:
+        put('cold_start', int(summary['cold_start']), 'Count')
+    put('init_time', summary.get('init_ms'), 'Milliseconds')
+    record['_aws'] = {
+        'Timestamp': int(time.time() * 1000),
+        'CloudWatchMetrics': [{'Namespace': namespace, 'Dimensions': [list(dimensions)], 'Metrics': defs}],
+    }
+    return record
+
+
+def emit(summary: Dict[str, Any], fmt: str = 'emf', namespace: str = 'pyarchiver',
+         dimensions: Dict[str, str] | None = None):
+    """Print the run metrics as one log line (EMF or structured JSON); 'off' prints nothing."""
+    if fmt == 'off':
+        return
+    if fmt == 'emf':
+        line = to_emf(summary, namespace, dimensions)
+    else:
+        line = {'event': 'run_metrics', **(dimensions or {}), **{k: v for k, v in summary.items() if k != 'clients'}}
+    print(json.dumps(line, separators=(',', ':')))
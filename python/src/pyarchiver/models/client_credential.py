@@ -1,10 +1,11 @@
 from dataclasses import dataclass
 
 
-@dataclass
+@dataclass(slots=True)
 class ClientCredential:
     client_id: str
     secret: str
+    oauth_client_id: str | None = None
 
     def __repr__(self):
         return f"ClientCredential(client_id={self.client_id!r}, secret=***hidden***)"
@@ -1,11 +1,19 @@
 from dataclasses import dataclass
+from typing import Tuple
 
 
-@dataclass
+@dataclass(slots=True)
 class ClientRecord:
     client_id: str
     name: str | None = None
     state: str | None = None
+    scopes: Tuple[str, ...] = ()
+    # resolved against TRIGGER_BASE_URL / CLIENT_TOKEN_URL when the client has none of its own
+    trigger_url: str | None = None
+    token_url: str | None = None
+    sample_count: int | None = None
+    # hash of the raw client dict the record was built from (see dao/registry.py)
+    fingerprint: str | None = None
 
     def to_dict(self):
         return {'client_id': self.client_id, 'name': self.name, 'state': self.state}
@@ -0,0 +1,151 @@
+"""Deadline-aware client scheduling for ArchiverLambdaService.
+
+A run with a deadline (the Lambda context's remaining time, or a CLI --budget) archives the
+clients largest-first, by the duration and upload size each one took in earlier runs, and
+stops launching clients once the expected time of the next one would eat into the safety
+margin. Clients not launched are reported under 'deferred' in the run summary, so a
+follow-up invocation ({"action": "run_clients", "client_ids": deferred}) can pick them up.
+
+Per-client costs are kept through the run's uploader under `<prefix>/_history/`:
+
+    costs_<shard>.json   {"<client_id>": {"seconds": ..., "bytes": ..., "runs": n, "at": "<iso>"}}
+
+one file per shard so concurrent shard workers never overwrite each other; load() merges all
+files and keeps the newest entry per client. Durations are smoothed (EWMA) across runs.
+Clients with no history are estimated at the median known cost.
+
+A client list streamed from the clients API is not drained to sort it: iter_largest_first()
+keeps a bounded lookahead of clients and starts the largest of those, so archiving starts
+with the first page and largest-first holds within each window.
+"""
+import datetime
+import heapq
+import json
+import statistics
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple
+
+HISTORY_DIR = '_history'
+# weight of the latest run in the smoothed cost
+ALPHA = 0.5
+
+
+class Deadline:
+    def __init__(self, remaining_s: Callable[[], float], margin_s: float = 10.0):
+        self._remaining = remaining_s
+        self.margin_s = max(0.0, float(margin_s))
+
+    @classmethod
+    def from_context(cls, context: Any, margin_s: float = 10.0) -> 'Deadline | None':
+        """Deadline of a Lambda invocation; None when `context` has no remaining-time clock."""
+        remaining_ms = getattr(context, 'get_remaining_time_in_millis', None)
+        if not callable(remaining_ms):
+            return None
+        return cls(lambda: remaining_ms() / 1000.0, margin_s)
+
+    @classmethod
+    def from_budget(cls, seconds: float, margin_s: float = 10.0) -> 'Deadline':
+        end = time.monotonic() + float(seconds)
+        return cls(lambda: end - time.monotonic(), margin_s)
+
+    @classmethod
+    def at(cls, epoch_s: float, margin_s: float = 10.0) -> 'Deadline':
+        """Deadline at a wall-clock time, for one handed to another process or invocation."""
+        end = float(epoch_s)
+        return cls(lambda: end - time.time(), margin_s)
+
+    @classmethod
+    def earliest(cls, *deadlines: 'Deadline | None') -> 'Deadline | None':
+        """The deadline that leaves the least time of those given (None when all are None)."""
+        given = [d for d in deadlines if d is not None]
+        if len(given) <= 1:
+            return given[0] if given else None
+        return cls(lambda: min(d.remaining() for d in given), max(d.margin_s for d in given))
+
+    def expires_at(self) -> float:
+        """Wall-clock time at which the margin starts, e.g. for a worker's own deadline."""
+        return time.time() + self.remaining() - self.margin_s
+
+    def remaining(self) -> float:
+        return self._remaining()
+
+    def allows(self, estimate_s: float) -> bool:
+        """Whether work expected to take `estimate_s` still finishes before the margin."""
+        return self.remaining() - self.margin_s >= estimate_s
+
+
+class CostHistory:
+    def __init__(self, uploader, prefix: str, shard: int | None = None):
+        self.uploader = uploader
+        self.dir = f"{prefix.rstrip('/')}/{HISTORY_DIR}"
+        self.name = f"{self.dir}/costs_{int(shard or 0)}.json"
+        self.costs: Dict[str, Dict[str, Any]] = {}
+        self._updated: Dict[str, Dict[str, Any]] = {}
+
+    def load(self) -> 'CostHistory':
+        for name in self.uploader.list(self.dir + '/'):
+            data = self.uploader.read(name)
+            if not data:
+                continue
+            for cid, entry in json.loads(data).items():
+                if cid not in self.costs or entry.get('at', '') > self.costs[cid].get('at', ''):
+                    self.costs[cid] = entry
+        return self
+
+    def estimate(self, client_id: str, default: float = 0.0) -> float:
+        entry = self.costs.get(client_id)
+        return float(entry['seconds']) if entry else default
+
+    def cost(self, client_id: str | None, default: float = 0.0) -> Tuple[float, int]:
+        """(seconds, bytes) expected for a client, the sort key of order()."""
+        entry = self.costs.get(client_id or '')
+        if entry is None:
+            return (default, 0)
+        return (float(entry['seconds']), int(entry.get('bytes', 0)))
+
+    def order(self, clients: List[Dict[str, Any]], key: Callable[[Dict[str, Any]], str]) -> List[Dict[str, Any]]:
+        """Clients sorted by expected cost, largest first (stable for equal costs)."""
+        default = self.default_estimate()
+        return sorted(clients, key=lambda c: self.cost(key(c), default), reverse=True)
+
+    def iter_largest_first(self, clients: Iterable[Any], key: Callable[[Any], str],
+                           lookahead: int | None = None) -> Iterator[Any]:
+        """Yield `clients` largest-first like order(), holding at most `lookahead` of them
+        (None: all); the next client is only read from `clients` when one is taken."""
+        if lookahead is None:
+            yield from self.order(list(clients), key)
+            return
+        default = self.default_estimate()
+        heap: List[Tuple[float, int, int, Any]] = []
+        for seq, c in enumerate(clients):
+            seconds, nbytes = self.cost(key(c), default)
+            # arrival order breaks ties, as the stable sort of order() does
+            heapq.heappush(heap, (-seconds, -nbytes, seq, c))
+            if len(heap) >= max(1, lookahead):
+                yield heapq.heappop(heap)[-1]
+        while heap:
+            yield heapq.heappop(heap)[-1]
+
+    def default_estimate(self) -> float:
+        known = [float(e['seconds']) for e in self.costs.values()]
+        return statistics.median(known) if known else 0.0
+
+    def record(self, client_id: str, seconds: float, nbytes: int):
+        prev = self.costs.get(client_id)
+        if prev:
+            seconds = ALPHA * seconds + (1 - ALPHA) * float(prev['seconds'])
+            nbytes = int(ALPHA * nbytes + (1 - ALPHA) * int(prev.get('bytes', 0)))
+        entry = {'seconds': round(seconds, 3), 'bytes': int(nbytes), 'runs': (prev or {}).get('runs', 0) + 1,
+                 'at': datetime.datetime.utcnow().isoformat() + 'Z'}
+        self.costs[client_id] = self._updated[client_id] = entry
+
+    def save(self):
+        if not self._updated:
+            return
+        # this shard's file: what it held before plus this run's measurements
+        previous = self.uploader.read(self.name)
+        costs = json.loads(previous) if previous else {}
+        costs.update(self._updated)
+        self.uploader.upload(self.name, json.dumps(costs, sort_keys=True).encode('utf-8'),
+                             content_type='application/json')
+        self._updated = {}
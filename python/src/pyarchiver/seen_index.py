@@ -0,0 +1,335 @@
+"""Persistent index of trigger ids that are already archived, so overlapping fetch windows do
+not re-upload the same `trigger_<id>` objects.
+
+Ids are reduced to 64-bit hashes (blake2b) and kept in objects under the archive prefix,
+written through the run's uploader:
+
+    _seen/ids.idx     b'PYSEEN01', count, a 65537-entry fan-out table by the top 16 hash bits,
+                      then `count` sorted little-endian uint64 hashes (8 bytes per id)
+    _seen/bloom.bin   Bloom filter over the same hashes (~1.2 bytes per id at 1% false positives)
+    _seen/delta/<yyyymmddTHHMMSS>_<rand>.ids
+                      b'PYSEEND1', count, sorted uint64 hashes: the ids one save() added
+
+A lookup first asks the Bloom filter, which answers "new id" in O(1) for almost every unseen
+trigger; a "maybe" is confirmed by a binary search in the id file, narrowed by the fan-out
+table to ~count/65536 entries. The id file is memory-mapped (S3 copies are downloaded to
+`seen_cache_dir` first), so tens of millions of ids cost page cache, not process memory.
+
+save() only uploads this run's new hashes as a delta object, so a batch of a hundred triggers
+costs a PUT of ~1 KB, not a rewrite of the id file. Deltas are held in memory (and in the
+Bloom filter) next to the mapped id file. merge() folds them into ids.idx by copying the old
+file in ranges, linear in bytes but with Python work per *new* id, and uploads it and a Bloom
+filter grown to double capacity when the id count outgrew it. Compaction of trigger objects
+merges; so does save() once `seen_merge_deltas` (default 64) deltas have piled up.
+
+An index is meant to be kept across runs (module scope in Lambda, the service in a daemon):
+refresh() re-downloads ids.idx only when its ETag changed and otherwise just reads the deltas
+it has not seen yet, one LIST per run.
+
+Writers never overwrite each other's deltas. Two merges at the same time keep only the last
+id file; ids lost that way are simply archived again by a later run. A 64-bit hash collision
+would wrongly skip a new trigger; with 10^8 ids the chance is below one in a million.
+"""
+import datetime
+import hashlib
+import math
+import mmap
+import os
+import struct
+import tempfile
+import uuid
+from array import array
+from typing import Iterator, List, Set
+
+MAGIC = b'PYSEEN01'
+DELTA_MAGIC = b'PYSEEND1'
+BLOOM_MAGIC = b'PYBLOOM1'
+HEADER = struct.Struct('<8sQ')
+BLOOM_HEADER = struct.Struct('<8sQQQ')
+FANOUT = 1 << 16
+FANOUT_BYTES = 8 * (FANOUT + 1)
+DATA_OFFSET = HEADER.size + FANOUT_BYTES
+_U64 = struct.Struct('<Q')
+COPY_CHUNK = 4 * 1024 * 1024
+
+
+def id_hash(trigger_id) -> int:
+    return int.from_bytes(hashlib.blake2b(str(trigger_id).encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+class BloomFilter:
+    def __init__(self, capacity: int, fp_rate: float = 0.01, m: int | None = None, k: int | None = None,
+                 bits: bytearray | None = None):
+        self.capacity = max(1, int(capacity))
+        self.m = m or max(64, int(-self.capacity * math.log(fp_rate) / (math.log(2) ** 2)))
+        self.k = k or max(1, round(self.m / self.capacity * math.log(2)))
+        self.bits = bits if bits is not None else bytearray((self.m + 7) // 8)
+
+    def _positions(self, h: int) -> Iterator[int]:
+        # double hashing over the two halves of the 64-bit id hash
+        h1 = h & 0xFFFFFFFF
+        h2 = (h >> 32) | 1
+        for i in range(self.k):
+            yield (h1 + i * h2) % self.m
+
+    def add(self, h: int):
+        for p in self._positions(h):
+            self.bits[p >> 3] |= 1 << (p & 7)
+
+    def __contains__(self, h: int) -> bool:
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self._positions(h))
+
+    def to_bytes(self) -> bytes:
+        return BLOOM_HEADER.pack(BLOOM_MAGIC, self.m, self.k, self.capacity) + bytes(self.bits)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'BloomFilter':
+        magic, m, k, capacity = BLOOM_HEADER.unpack_from(data)
+        if magic != BLOOM_MAGIC:
+            raise ValueError('not a pyarchiver bloom filter')
+        return cls(capacity, m=m, k=k, bits=bytearray(data[BLOOM_HEADER.size:]))
+
+
+class SeenIndex:
+    def __init__(self, uploader, cfg: dict | None = None):
+        cfg = cfg or {}
+        self.uploader = uploader
+        prefix = (cfg.get('seen_prefix') or '_seen').rstrip('/')
+        self.ids_name = f'{prefix}/ids.idx'
+        self.bloom_name = f'{prefix}/bloom.bin'
+        self.delta_dir = f'{prefix}/delta'
+        self.cache_dir = cfg.get('seen_cache_dir') or os.path.join(tempfile.gettempdir(), 'pyarchiver-seen')
+        self.capacity = int(cfg.get('seen_capacity', 1_000_000))
+        self.merge_after = int(cfg.get('seen_merge_deltas', 64))
+        self.count = 0
+        self.bloom = BloomFilter(self.capacity)
+        self._fanout = array('Q', bytes(FANOUT_BYTES))
+        self._mm: mmap.mmap | None = None
+        self._file = None
+        self._owned: List[str] = []
+        self._etag: str | None = None
+        self._deltas: Set[str] = set()
+        self._delta_hashes: set = set()
+        self._new: set = set()
+
+    # -- loading -------------------------------------------------------------------------
+    def load(self) -> 'SeenIndex':
+        """(Re)load the id file, its Bloom filter and every delta."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._etag = self.uploader.etag(self.ids_name)
+        path = self.uploader.local_copy(self.ids_name, self.cache_dir)
+        if path:
+            self._map(path)
+        else:
+            self._unmap()
+            self.count = 0
+            self._fanout = array('Q', bytes(FANOUT_BYTES))
+        data = self.uploader.read(self.bloom_name)
+        bloom = BloomFilter.from_bytes(data) if data else None
+        self._deltas = set()
+        self._delta_hashes = set()
+        if bloom is None or (self.count and bloom.capacity < self.count):
+            self._rebuild_bloom()
+        else:
+            self.bloom = bloom
+            for h in self._new:
+                self.bloom.add(h)
+        self._load_deltas(self.uploader.list(self.delta_dir + '/'))
+        return self
+
+    def refresh(self) -> 'SeenIndex':
+        """Catch up with other writers: reload when the id file was rewritten (or a delta
+        this index holds is gone), else only read the deltas added since."""
+        names = self.uploader.list(self.delta_dir + '/')
+        if self.uploader.etag(self.ids_name) != self._etag or not self._deltas <= set(names):
+            return self.load()
+        self._load_deltas(names)
+        return self
+
+    def _load_deltas(self, names: List[str]):
+        for name in names:
+            if name in self._deltas:
+                continue
+            data = self.uploader.read(name)
+            if data is None:
+                continue
+            magic, count = HEADER.unpack_from(data)
+            if magic != DELTA_MAGIC:
+                raise ValueError(f'{name} is not a pyarchiver seen-id delta')
+            hashes = array('Q')
+            hashes.frombytes(data[HEADER.size:HEADER.size + 8 * count])
+            self._delta_hashes.update(hashes)
+            self._deltas.add(name)
+            for h in hashes:
+                self.bloom.add(h)
+        if self.bloom.capacity < len(self):
+            self._rebuild_bloom()
+
+    def _map(self, path: str):
+        """Map `path` as the id file; cache copies of the files it replaces are removed."""
+        self._unmap()
+        for old in self._owned:
+            if old != path:
+                try:
+                    os.unlink(old)
+                except OSError:
+                    pass
+        self._owned = []
+        if os.path.dirname(os.path.abspath(path)) == os.path.abspath(self.cache_dir):
+            self._owned.append(path)
+        self._file = open(path, 'rb')
+        magic, count = HEADER.unpack(self._file.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not a pyarchiver seen-id index')
+        self.count = count
+        self._fanout = array('Q')
+        self._fanout.frombytes(self._file.read(FANOUT_BYTES))
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _unmap(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._file.close()
+            self._mm = self._file = None
+
+    def _iter_hashes(self) -> Iterator[int]:
+        step = COPY_CHUNK // 8
+        for start in range(0, self.count, step):
+            chunk = array('Q')
+            end = min(self.count, start + step)
+            chunk.frombytes(self._mm[DATA_OFFSET + 8 * start:DATA_OFFSET + 8 * end])
+            yield from chunk
+
+    def _rebuild_bloom(self):
+        self.bloom = BloomFilter(max(self.capacity, 2 * len(self)))
+        for h in self._iter_hashes():
+            self.bloom.add(h)
+        for h in self._delta_hashes:
+            self.bloom.add(h)
+        for h in self._new:
+            self.bloom.add(h)
+
+    # -- lookups -------------------------------------------------------------------------
+    def _at(self, i: int) -> int:
+        return _U64.unpack_from(self._mm, DATA_OFFSET + 8 * i)[0]
+
+    def _lower_bound(self, h: int) -> int:
+        """Index of the first stored hash >= h."""
+        top = h >> 48
+        lo, hi = self._fanout[top], self._fanout[top + 1]
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._at(mid) < h:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _stored(self, h: int) -> bool:
+        if not self.count:
+            return False
+        i = self._lower_bound(h)
+        return i < self.count and self._at(i) == h
+
+    def __contains__(self, trigger_id) -> bool:
+        h = id_hash(trigger_id)
+        if h not in self.bloom:
+            return False
+        return h in self._new or h in self._delta_hashes or self._stored(h)
+
+    def add(self, trigger_id):
+        h = id_hash(trigger_id)
+        if h in self._new or (h in self.bloom and (h in self._delta_hashes or self._stored(h))):
+            return
+        self._new.add(h)
+        self.bloom.add(h)
+
+    def discard(self):
+        """Forget ids added since the last save(). They may still pass the Bloom filter, which
+        only costs an exact lookup."""
+        self._new = set()
+
+    def __len__(self) -> int:
+        return self.count + len(self._delta_hashes) + len(self._new)
+
+    # -- saving --------------------------------------------------------------------------
+    def _write_merged(self, path: str, new: List[int]):
+        fanout = array('Q', self._fanout)
+        # every new hash shifts the fan-out boundaries above its bucket by one
+        added = [0] * (FANOUT + 1)
+        for h in new:
+            added[(h >> 48) + 1] += 1
+        running = 0
+        for t in range(FANOUT + 1):
+            running += added[t]
+            fanout[t] += running
+
+        with open(path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, self.count + len(new)))
+            f.write(fanout.tobytes())
+            prev = 0
+            for h in new:
+                pos = self._lower_bound(h) if self.count else 0
+                self._copy(f, prev, pos)
+                f.write(_U64.pack(h))
+                prev = pos
+            self._copy(f, prev, self.count)
+
+    def _copy(self, f, start: int, end: int):
+        """Copy stored hashes [start, end) from the current file, in bounded chunks."""
+        a = DATA_OFFSET + 8 * start
+        b = DATA_OFFSET + 8 * end
+        while a < b:
+            n = min(COPY_CHUNK, b - a)
+            f.write(self._mm[a:a + n])
+            a += n
+
+    def save(self) -> int:
+        """Upload this run's new ids as one delta object; returns how many were added."""
+        if not self._new:
+            return 0
+        new = sorted(self._new)
+        name = f"{self.delta_dir}/{datetime.datetime.utcnow():%Y%m%dT%H%M%S}_{uuid.uuid4().hex[:8]}.ids"
+        self.uploader.upload(name, HEADER.pack(DELTA_MAGIC, len(new)) + array('Q', new).tobytes(),
+                             content_type='application/octet-stream')
+        self._deltas.add(name)
+        self._delta_hashes.update(new)
+        self._new = set()
+        if self.merge_after and len(self._deltas) >= self.merge_after:
+            self.merge()
+        return len(new)
+
+    def merge(self) -> int:
+        """Fold every delta into the id file and Bloom filter, then delete the deltas; returns
+        how many ids the id file gained."""
+        self.refresh()
+        names = sorted(self._deltas)
+        if not names:
+            return 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # a delta may repeat ids another merge already folded in
+        new = sorted(h for h in self._delta_hashes if not self._stored(h))
+        path = os.path.join(self.cache_dir, f'ids-{uuid.uuid4().hex}.idx')
+        self._write_merged(path, new)
+        with open(path, 'rb') as f:
+            self.uploader.upload_stream(self.ids_name, f, content_type='application/octet-stream')
+        self._map(path)
+        self._etag = self.uploader.etag(self.ids_name)
+        self._deltas = set()
+        self._delta_hashes = set()
+        if self.bloom.capacity < len(self):
+            self._rebuild_bloom()
+        self.uploader.upload(self.bloom_name, self.bloom.to_bytes(), content_type='application/octet-stream')
+        # only after the id file holds them: a reader in between sees the ids twice, never not at all
+        for name in names:
+            self.uploader.delete(name)
+        return len(new)
+
+    def close(self):
+        self._unmap()
+        for path in self._owned:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+        self._owned = []
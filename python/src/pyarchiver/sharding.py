@@ -0,0 +1,226 @@
+"""Sharded fan-out of the client run across several workers.
+
+- HashRing assigns each client_id to one of N shards with consistent hashing (virtual nodes),
+  so changing N only moves ~1/N of the clients
+- Coordinator enumerates eligible clients, partitions them, dispatches one worker event per
+  shard through an invoker and merges the per-shard summaries into one run report
+
+Worker events have the shape {"action": "run_clients", "shard": k, "of": N, "client_ids": [...]},
+plus "deadline_at" (epoch seconds) when the coordinator runs against a deadline: it waits for
+its workers, so a worker must stop starting clients before the coordinator's own margin.
+
+Invokers (all expose invoke_all(events) -> list of summaries, in event order):
+- LambdaInvoker: synchronous (RequestResponse) invocations of a Lambda function, in parallel;
+  dispatch(event) invokes it asynchronously (the coordinator's follow-up for deferred clients)
+- ProcessPoolInvoker: local worker processes, used by the CLI (with an optional shared time budget)
+- InProcessInvoker: calls a handler function directly; a stand-in for local tests
+"""
+import bisect
+import hashlib
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List
+
+from .client_fetcher import ClientFetcher, client_id_of
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode('utf-8')).digest()[:8], 'big')
+
+
+class HashRing:
+    def __init__(self, shards: int, vnodes: int = 64):
+        if shards < 1:
+            raise ValueError('shards must be >= 1')
+        self.shards = shards
+        points = sorted((_hash(f'shard-{k}#{v}'), k) for k in range(shards) for v in range(vnodes))
+        self._keys = [p for p, _ in points]
+        self._owners = [k for _, k in points]
+
+    def shard_for(self, client_id: str) -> int:
+        i = bisect.bisect(self._keys, _hash(str(client_id))) % len(self._keys)
+        return self._owners[i]
+
+    def partition(self, client_ids: Iterable[str]) -> List[List[str]]:
+        out: List[List[str]] = [[] for _ in range(self.shards)]
+        for cid in client_ids:
+            out[self.shard_for(cid)].append(cid)
+        return out
+
+
+def _sum_counters(dicts: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    out: Dict[str, Any] = {}
+    for d in dicts:
+        for k, v in (d or {}).items():
+            if isinstance(v, (int, float)):
+                out[k] = out.get(k, 0) + v
+    return out
+
+
+def _merge_metrics(metrics: List[Dict[str, Any]]) -> Dict[str, Any]:
+    # percentiles do not combine; keep counts and totals, and the worst shard's p99 / max
+    phases: Dict[str, Dict[str, Any]] = {}
+    for m in metrics:
+        for name, agg in m.get('phases', {}).items():
+            p = phases.setdefault(name, {'count': 0, 'total_s': 0.0, 'max_p99_ms': 0.0, 'max_ms': 0.0})
+            p['count'] += agg['count']
+            p['total_s'] = round(p['total_s'] + agg['total_s'], 4)
+            p['max_p99_ms'] = max(p['max_p99_ms'], agg['p99_ms'])
+            p['max_ms'] = max(p['max_ms'], agg['max_ms'])
+    rss = [m['peak_rss_mb'] for m in metrics if m.get('peak_rss_mb') is not None]
+    return {
+        'phases': phases,
+        'bytes': _sum_counters(m.get('bytes') for m in metrics),
+        'retries': sum(m.get('retries', 0) for m in metrics),
+        'peak_rss_mb': max(rss) if rss else None,
+    }
+
+
+def merge_summaries(summaries: List[Dict[str, Any]], shard_ids: List[int] | None = None) -> Dict[str, Any]:
+    """Combine per-shard run summaries into one report; `shard_ids` names each summary's shard."""
+    archived: List[Dict[str, Any]] = []
+    failed: List[Dict[str, Any]] = []
+    shards = []
+    for i, s in enumerate(summaries):
+        s = s or {}
+        k = shard_ids[i] if shard_ids else i
+        archived.extend(s.get('archived', []))
+        failed.extend(s.get('failed', []))
+        if s.get('error'):
+            failed.append({'shard': k, 'error': s['error']})
+        shards.append({'shard': k, 'count': s.get('count', 0), 'failed': len(s.get('failed', [])),
+                       'error': s.get('error')})
+    merged = {
+        'archived': archived,
+        'count': len(archived),
+        'failed': failed,
+        'shards': shards,
+        'http': _sum_counters(s.get('http') for s in summaries if s),
+    }
+    saved = [s['saved'] for s in summaries if s and 'saved' in s]
+    if saved:
+        merged['saved'] = _sum_counters(saved)
+    metrics = [s['metrics'] for s in summaries if s and s.get('metrics')]
+    if metrics:
+        merged['metrics'] = _merge_metrics(metrics)
+    deferred = [s['deferred'] for s in summaries if s and 'deferred' in s]
+    if deferred:
+        merged['deferred'] = [cid for d in deferred for cid in d]
+    resumed = [s['resumed'] for s in summaries if s and 'resumed' in s]
+    if resumed:
+        merged['resumed'] = sum(resumed)
+    return merged
+
+
+class InProcessInvoker:
+    def __init__(self, handler: Callable[[Dict[str, Any], Any], Dict[str, Any]]):
+        self.handler = handler
+
+    def invoke_all(self, events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return [self.handler(e, None) for e in events]
+
+    def dispatch(self, event: Dict[str, Any]):
+        self.handler(event, None)
+
+
+# above the longest Lambda timeout (900s): a worker invocation is never cut off by the client
+INVOKE_READ_TIMEOUT = 910
+
+
+class LambdaInvoker:
+    def __init__(self, function_name: str, client=None, max_parallel: int = 16):
+        self.function_name = function_name
+        self.max_parallel = max_parallel
+        if client is None:
+            from .aws import get_client
+
+            # no botocore retries: a retried RequestResponse invoke runs the shard a second time
+            client = get_client('lambda', read_timeout=INVOKE_READ_TIMEOUT, retries={'max_attempts': 0})
+        self.client = client
+
+    def _invoke(self, event: Dict[str, Any]) -> Dict[str, Any]:
+        resp = self.client.invoke(FunctionName=self.function_name, InvocationType='RequestResponse',
+                                  Payload=json.dumps(event).encode('utf-8'))
+        body = json.loads(resp['Payload'].read() or b'null')
+        if resp.get('FunctionError'):
+            msg = body.get('errorMessage') if isinstance(body, dict) else body
+            return {'archived': [], 'count': 0, 'error': f"{resp['FunctionError']}: {msg}"}
+        return body
+
+    def invoke_all(self, events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_parallel, len(events)))) as pool:
+            return list(pool.map(self._invoke, events))
+
+    def dispatch(self, event: Dict[str, Any]):
+        """Invoke the function asynchronously, without waiting for its result."""
+        self.client.invoke(FunctionName=self.function_name, InvocationType='Event',
+                           Payload=json.dumps(event).encode('utf-8'))
+
+
+def _run_local_worker(cfg: Dict[str, Any], event: Dict[str, Any], deadline_at: float | None = None) -> Dict[str, Any]:
+    from .archiver_lambda_service import ArchiverLambdaService
+    from .scheduler import Deadline
+
+    svc = ArchiverLambdaService(cfg)
+    deadline = None
+    if deadline_at is not None:
+        # wall clock: monotonic clocks are not comparable across processes
+        deadline = Deadline.at(deadline_at, svc.deadline_margin)
+    return svc.run_once(shard=event.get('shard'), of=event.get('of'), client_ids=event.get('client_ids'),
+                        deadline=deadline)
+
+
+class ProcessPoolInvoker:
+    def __init__(self, cfg: Dict[str, Any], max_workers: int | None = None, budget_s: float | None = None):
+        self.cfg = cfg
+        self.max_workers = max_workers
+        self.budget_s = budget_s
+
+    def invoke_all(self, events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        deadline_at = time.time() + self.budget_s if self.budget_s else None
+        with ProcessPoolExecutor(max_workers=self.max_workers or len(events) or 1) as pool:
+            futures = [pool.submit(_run_local_worker, self.cfg, e, deadline_at) for e in events]
+        out = []
+        for f in futures:
+            try:
+                out.append(f.result())
+            except Exception as e:
+                out.append({'archived': [], 'count': 0, 'error': str(e)})
+        return out
+
+
+class Coordinator:
+    def __init__(self, client_fetcher: ClientFetcher, invoker, shards: int, scope: str | None = None,
+                 client_ids: List[str] | None = None):
+        self.client_fetcher = client_fetcher
+        self.invoker = invoker
+        self.ring = HashRing(shards)
+        self.scope = scope
+        # a follow-up run for clients deferred earlier: only these, without listing the clients
+        self.client_ids = client_ids
+
+    def plan(self) -> List[Dict[str, Any]]:
+        """One worker event per shard, listing the client ids assigned to it."""
+        if self.client_ids is not None:
+            ids = iter(self.client_ids)
+        else:
+            ids = (client_id_of(c) for c in self.client_fetcher.get_clients(scope=self.scope))
+        parts = self.ring.partition(cid for cid in ids if cid)
+        n = self.ring.shards
+        return [{'action': 'run_clients', 'shard': k, 'of': n, 'client_ids': part} for k, part in enumerate(parts)]
+
+    def run(self, deadline=None) -> Dict[str, Any]:
+        """Dispatch the shards and merge their reports; with a scheduler.Deadline the workers get
+        its wall-clock expiry as their own deadline, so they return before the coordinator has to."""
+        events = [e for e in self.plan() if e['client_ids']]
+        if deadline is not None:
+            deadline_at = round(deadline.expires_at(), 3)
+            for e in events:
+                e['deadline_at'] = deadline_at
+        print(f"Dispatching {sum(len(e['client_ids']) for e in events)} clients across {len(events)} shards")
+        summaries = self.invoker.invoke_all(events)
+        merged = merge_summaries(summaries, [e['shard'] for e in events])
+        for entry, event in zip(merged['shards'], events):
+            entry['clients'] = len(event['client_ids'])
+        return merged
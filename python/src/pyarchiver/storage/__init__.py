@@ -0,0 +1,13 @@
+# storage package
+import os
+
+
+def uploader_for(bucket: str, prefix: str = ''):
+    """Uploader for a BUCKET setting: a local directory when it is a path (local testing), else S3."""
+    if os.path.isabs(bucket) or bucket.startswith('.') or bucket.startswith('/'):
+        from .local_uploader import LocalUploader
+
+        return LocalUploader({'local_dir': os.path.join(bucket, prefix) if prefix else bucket})
+    from .s3_uploader import S3Uploader
+
+    return S3Uploader({'bucket': bucket, 'prefix': prefix})
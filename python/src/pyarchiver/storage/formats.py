@@ -0,0 +1,319 @@
+"""Pluggable archive output formats.
+
+Each format knows its key suffix, the Content-Type / Content-Encoding to store with the
+object, and how to encode a list of triggers (iter_encode, streaming) or a single trigger
+(encode_one, used by the per-trigger object layout). iter_decode() reads a stored object
+back (format_for_key() picks the format from an object key).
+
+Available formats (select with cfg `format` or env ARCHIVE_FORMAT):
+- json          pretty-printed JSON array (indent=2), the historical default
+- json-compact  JSON without whitespace
+- ndjson        one compact JSON object per line
+- ndjson.gz     gzip-compressed NDJSON
+- ndjson.zst    zstd-compressed NDJSON (requires the optional `zstandard` package)
+- parquet       columnar file with the trigger `Columns` (requires the optional `pyarrow` package);
+                `payload` is stored as a JSON string column, every other field in an `extra` JSON
+                column, so iter_decode() gives back the triggers as they were written
+
+JSON is encoded and decoded through the codec of codec.py (orjson when installed).
+
+Optional dependencies are imported when their format is first instantiated, so importing this
+module (and the Lambda handler) does not pay for pyarrow.
+"""
+import gzip
+import importlib
+import json
+import zlib
+from typing import Any, Dict, Iterable, Iterator, List
+
+from ..codec import get_codec
+from ..trigger.constants import Columns
+from ..trigger.json_stream import iter_json_array_chunks
+
+CHUNK_SIZE = 64 * 1024
+EXTRA_COLUMN = 'extra'
+_COLUMN_SET = frozenset(Columns)
+
+
+def _optional(module: str):
+    """Import an optional dependency on first use; None when it is not installed."""
+    try:
+        return importlib.import_module(module)
+    except Exception:  # pragma: no cover - optional dependency
+        return None
+
+
+class ArchiveFormat:
+    name = ''
+    suffix = ''
+    content_type = 'application/octet-stream'
+    content_encoding: str | None = None
+
+    def iter_encode(self, triggers: Iterable[Dict[str, Any]]) -> Iterator[bytes]:
+        raise NotImplementedError
+
+    def encode(self, triggers: Iterable[Dict[str, Any]]) -> bytes:
+        return b''.join(self.iter_encode(triggers))
+
+    def encode_one(self, trigger: Dict[str, Any]) -> bytes:
+        return self.encode([trigger])
+
+    def iter_decode(self, data: bytes) -> Iterator[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def restores_exactly(self, data: bytes) -> bool:
+        """Whether iter_decode(data) yields the triggers exactly as they were encoded."""
+        return True
+
+    def upload_args(self) -> Dict[str, str]:
+        """Keyword arguments for uploader.upload / upload_stream."""
+        args = {'content_type': self.content_type}
+        if self.content_encoding:
+            args['content_encoding'] = self.content_encoding
+        return args
+
+
+class JsonFormat(ArchiveFormat):
+    name = 'json'
+    suffix = '.json'
+    content_type = 'application/json'
+    indent: int | None = 2
+
+    def iter_encode(self, triggers):
+        return iter_json_array_chunks(triggers, indent=self.indent, chunk_size=CHUNK_SIZE)
+
+    def encode_one(self, trigger):
+        return get_codec().dumps(trigger, self.indent)
+
+    def iter_decode(self, data):
+        value = get_codec().loads(data)
+        return iter(value if isinstance(value, list) else [value])
+
+
+class CompactJsonFormat(JsonFormat):
+    name = 'json-compact'
+    indent = None
+
+
+def _iter_ndjson(triggers: Iterable[Dict[str, Any]]) -> Iterator[bytes]:
+    dumps = get_codec().dumps
+    parts: List[bytes] = []
+    size = 0
+    for t in triggers:
+        line = dumps(t)
+        parts.append(line)
+        size += len(line) + 1
+        if size >= CHUNK_SIZE:
+            parts.append(b'')
+            yield b'\n'.join(parts)
+            parts = []
+            size = 0
+    if parts:
+        parts.append(b'')
+        yield b'\n'.join(parts)
+
+
+def _iter_ndjson_lines(data: bytes) -> Iterator[Dict[str, Any]]:
+    loads = get_codec().loads
+    for line in data.splitlines():
+        if line.strip():
+            yield loads(line)
+
+
+class NdjsonFormat(ArchiveFormat):
+    name = 'ndjson'
+    suffix = '.ndjson'
+    content_type = 'application/x-ndjson'
+
+    def iter_encode(self, triggers):
+        return _iter_ndjson(triggers)
+
+    def iter_decode(self, data):
+        return _iter_ndjson_lines(data)
+
+
+class GzipNdjsonFormat(NdjsonFormat):
+    name = 'ndjson.gz'
+    suffix = '.ndjson.gz'
+    content_encoding = 'gzip'
+
+    def __init__(self, level: int = 6):
+        self.level = level
+
+    def iter_encode(self, triggers):
+        # wbits=31 -> gzip container, so the object is a plain .gz file
+        comp = zlib.compressobj(self.level, zlib.DEFLATED, 31)
+        for chunk in _iter_ndjson(triggers):
+            out = comp.compress(chunk)
+            if out:
+                yield out
+        yield comp.flush()
+
+    def iter_decode(self, data):
+        # gzip.decompress reads every member; compaction rollups are multi-member files
+        return _iter_ndjson_lines(gzip.decompress(data))
+
+
+class ZstdNdjsonFormat(NdjsonFormat):
+    name = 'ndjson.zst'
+    suffix = '.ndjson.zst'
+    content_encoding = 'zstd'
+
+    def __init__(self, level: int = 3):
+        self.zstandard = _optional('zstandard')
+        if self.zstandard is None:
+            raise RuntimeError("Format 'ndjson.zst' requires the 'zstandard' package")
+        self.level = level
+
+    def iter_encode(self, triggers):
+        comp = self.zstandard.ZstdCompressor(level=self.level).compressobj()
+        for chunk in _iter_ndjson(triggers):
+            out = comp.compress(chunk)
+            if out:
+                yield out
+        yield comp.flush()
+
+    def iter_decode(self, data):
+        # decompressobj copes with frames written without a content size (streamed uploads)
+        return _iter_ndjson_lines(self.zstandard.ZstdDecompressor().decompressobj().decompress(data))
+
+
+class _DrainSink:
+    """Write-only file object that hands written bytes back to a generator."""
+
+    def __init__(self):
+        self.parts: List[bytes] = []
+        self.pos = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.parts.append(data)
+        self.pos += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.pos
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        out = b''.join(self.parts)
+        self.parts = []
+        return out
+
+
+class ParquetFormat(ArchiveFormat):
+    name = 'parquet'
+    suffix = '.parquet'
+    content_type = 'application/vnd.apache.parquet'
+
+    def __init__(self, row_group_size: int = 10000, compression: str = 'zstd'):
+        self.pq = _optional('pyarrow.parquet')
+        if self.pq is None:
+            raise RuntimeError("Format 'parquet' requires the 'pyarrow' package")
+        self.pa = importlib.import_module('pyarrow')
+        self.row_group_size = row_group_size
+        self.compression = compression
+        # every column is nullable text; payload keeps its structure as a JSON string. `extra`
+        # holds what the columns cannot: fields outside Columns, which columns were JSON-encoded
+        # and which were absent ({"fields": {...}, "json": [...], "absent": [...]}, null if none)
+        self.schema = self.pa.schema([(c, self.pa.string()) for c in Columns + [EXTRA_COLUMN]])
+
+    def _table(self, rows: List[Dict[str, Any]]):
+        cols = {c: [] for c in Columns}
+        extras = []
+        known = _COLUMN_SET
+        for t in rows:
+            info = {}
+            for c in Columns:
+                v = t.get(c)
+                if v is None:
+                    if c not in t:
+                        info.setdefault('absent', []).append(c)
+                elif not isinstance(v, str):
+                    v = json.dumps(v, separators=(',', ':'))
+                    info.setdefault('json', []).append(c)
+                cols[c].append(v)
+            if len(t) > len(Columns) - len(info.get('absent', ())):
+                info['fields'] = {k: v for k, v in t.items() if k not in known}
+            extras.append(json.dumps(info, separators=(',', ':')) if info else None)
+        cols[EXTRA_COLUMN] = extras
+        return self.pa.table(cols, schema=self.schema)
+
+    def iter_encode(self, triggers):
+        sink = _DrainSink()
+        writer = self.pq.ParquetWriter(sink, self.schema, compression=self.compression)
+        rows: List[Dict[str, Any]] = []
+        for t in triggers:
+            rows.append(t)
+            if len(rows) >= self.row_group_size:
+                writer.write_table(self._table(rows))
+                rows = []
+                yield sink.drain()
+        if rows:
+            writer.write_table(self._table(rows))
+        writer.close()
+        yield sink.drain()
+
+    def iter_decode(self, data):
+        table = self.pq.read_table(self.pa.BufferReader(data))
+        if EXTRA_COLUMN not in table.column_names:
+            # written before the extra column existed: rows as stored, payload a JSON string
+            return iter(table.to_pylist())
+        return self._restore(table.to_pylist())
+
+    @staticmethod
+    def _restore(rows):
+        for row in rows:
+            extra = row.pop(EXTRA_COLUMN)
+            if extra:
+                info = json.loads(extra)
+                for c in info.get('json', ()):
+                    row[c] = json.loads(row[c])
+                for c in info.get('absent', ()):
+                    del row[c]
+                row.update(info.get('fields', {}))
+            yield row
+
+    def restores_exactly(self, data):
+        return EXTRA_COLUMN in self.pq.read_schema(self.pa.BufferReader(data)).names
+
+
+FORMATS = {
+    f.name: f
+    for f in (JsonFormat, CompactJsonFormat, NdjsonFormat, GzipNdjsonFormat, ZstdNdjsonFormat, ParquetFormat)
+}
+
+
+def get_format(name: str | None) -> ArchiveFormat:
+    """Instantiate the format registered under `name` (default 'json')."""
+    name = name or 'json'
+    try:
+        return FORMATS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown archive format {name!r}; choose one of {sorted(FORMATS)}") from None
+
+
+def format_for_key(key: str) -> ArchiveFormat:
+    """Format of a stored object, by the longest registered suffix its key ends with."""
+    for f in sorted(FORMATS.values(), key=lambda f: -len(f.suffix)):
+        if key.endswith(f.suffix):
+            return f()
+    raise ValueError(f"No archive format matches {key!r}")
+
+
+def available_formats() -> List[str]:
+    """Formats whose optional dependencies are installed."""
+    out = []
+    for name in FORMATS:
+        try:
+            get_format(name)
+        except RuntimeError:
+            continue
+        out.append(name)
+    return out
@@ -1,5 +1,13 @@
-"""Write bytes to a local directory (default ./archives)"""
+"""Write bytes to a local directory (default ./archives)
+
+content_type / content_encoding are accepted for parity with S3Uploader; the local filesystem
+has nowhere to keep them, so the file suffix is the only hint.
+"""
 import os
+import tempfile
+from typing import List
+
+from .streams import StreamSource, iter_source
 
 
 class LocalUploader:
@@ -7,11 +15,89 @@ class LocalUploader:
         self.dir = cfg.get('local_dir', './archives')
         os.makedirs(self.dir, exist_ok=True)
 
-    def upload(self, filename: str, data: bytes) -> str:
+    def _path(self, filename: str) -> str:
         path = os.path.join(self.dir, filename)
         parent = os.path.dirname(path)
         if parent:
             os.makedirs(parent, exist_ok=True)
+        return path
+
+    def upload(self, filename: str, data: bytes, content_type: str | None = None,
+               content_encoding: str | None = None) -> str:
+        path = self._path(filename)
         with open(path, 'wb') as f:
             f.write(data)
         return os.path.abspath(path)
+
+    def upload_stream(self, filename: str, source: StreamSource, chunk_size: int = 1024 * 1024,
+                      content_type: str | None = None, content_encoding: str | None = None) -> str:
+        """Write a chunk iterator or file-like object chunk by chunk to a temp file next to the
+        target, then atomically rename it into place; readers never see a partial archive."""
+        path = self._path(filename)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix=f".{os.path.basename(path)}.", suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in iter_source(source, chunk_size):
+                    f.write(chunk)
+            # mkstemp creates 0600 files; match what upload() produces
+            os.chmod(tmp, 0o644)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        return os.path.abspath(path)
+
+    def list(self, prefix: str = '') -> List[str]:
+        """Names (relative to the upload dir) starting with `prefix`, sorted.
+
+        Like an S3 key prefix, `prefix` need not end at a directory ('trigger_' lists the
+        top-level trigger_* files); only directories that can hold matches are walked.
+        """
+        base = prefix.rsplit('/', 1)[0] + '/' if '/' in prefix else ''
+        out = []
+        for dirpath, dirnames, files in os.walk(os.path.join(self.dir, base)):
+            rel = os.path.relpath(dirpath, self.dir).replace(os.sep, '/')
+            rel = '' if rel == '.' else rel + '/'
+            dirnames[:] = [d for d in dirnames if (rel + d + '/').startswith(prefix) or prefix.startswith(rel + d + '/')]
+            for name in files:
+                if name.endswith('.part') and name.startswith('.'):
+                    continue  # in-progress upload_stream temp file
+                if (rel + name).startswith(prefix):
+                    out.append(rel + name)
+        return sorted(out)
+
+    def local_copy(self, filename: str, cache_dir: str) -> str | None:
+        """Path of a local file holding the object (here: the stored file itself), or None."""
+        path = os.path.join(self.dir, filename)
+        return path if os.path.exists(path) else None
+
+    def etag(self, filename: str) -> str | None:
+        """A version tag of the file (mtime and size), or None when it does not exist."""
+        try:
+            st = os.stat(os.path.join(self.dir, filename))
+        except FileNotFoundError:
+            return None
+        return f'{st.st_mtime_ns}-{st.st_size}'
+
+    def read(self, filename: str) -> bytes | None:
+        """Return the stored bytes, or None when the file does not exist."""
+        try:
+            with open(os.path.join(self.dir, filename), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def delete(self, filename: str):
+        try:
+            os.remove(os.path.join(self.dir, filename))
+        except FileNotFoundError:
+            pass
+
+    def tag(self, filename: str, tags: dict) -> bool:
+        """Object tags have no local equivalent; returns False so callers can fall back."""
+        return False
+
+    def read_range(self, filename: str, offset: int, length: int) -> bytes:
+        with open(os.path.join(self.dir, filename), 'rb') as f:
+            f.seek(offset)
+            return f.read(length)
@@ -1,5 +1,18 @@
-"""Basic S3 uploader wrapper using boto3. If boto3 is not configured it provides a helpful message."""
+"""Basic S3 uploader wrapper using boto3. If boto3 is not configured it provides a helpful message.
+
+upload_stream() accepts an iterator of byte chunks or a file-like object and uses a parallel
+multipart upload for anything larger than one part. Configuration (cfg dict):
+- part_size: multipart part size in bytes (default 8 MiB, S3 minimum 5 MiB)
+- max_concurrency: parts uploaded in parallel (default 4); at most this many parts are buffered
+"""
+import itertools
 import os
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import List
+
+from ..aws import get_client
+from .streams import StreamSource, iter_parts
 
 try:
     import boto3
@@ -7,23 +20,147 @@ try:
 except Exception:  # pragma: no cover - optional dependency
     boto3 = None
 
+MIN_PART_SIZE = 5 * 1024 * 1024
+
 
 class S3Uploader:
-    def __init__(self, cfg: dict):
+    def __init__(self, cfg: dict, client=None):
         self.bucket = cfg.get('bucket')
         self.prefix = cfg.get('prefix', '')
+        self.part_size = max(MIN_PART_SIZE, int(cfg.get('part_size', 8 * 1024 * 1024)))
+        self.max_concurrency = max(1, int(cfg.get('max_concurrency', 4)))
         if boto3 is None:
             print('boto3 not available — S3Uploader will not function until boto3 is installed')
             self.client = None
         else:
-            self.client = boto3.client('s3')
+            # shared per process (see aws.py): warm invocations skip client construction
+            self.client = client or get_client('s3')
 
-    def upload(self, filename: str, data: bytes) -> str:
+    def _key(self, filename: str) -> str:
         if not self.client:
             raise RuntimeError('S3 client not configured (boto3 missing or not initialized)')
-        key = f"{self.prefix.rstrip('/')}/{filename}" if self.prefix else filename
+        return f"{self.prefix.rstrip('/')}/{filename}" if self.prefix else filename
+
+    @staticmethod
+    def _object_args(content_type: str | None, content_encoding: str | None) -> dict:
+        args = {}
+        if content_type:
+            args['ContentType'] = content_type
+        if content_encoding:
+            args['ContentEncoding'] = content_encoding
+        return args
+
+    def upload(self, filename: str, data: bytes, content_type: str | None = None,
+               content_encoding: str | None = None) -> str:
+        key = self._key(filename)
         try:
-            self.client.put_object(Bucket=self.bucket, Key=key, Body=data)
+            self.client.put_object(Bucket=self.bucket, Key=key, Body=data, **self._object_args(content_type, content_encoding))
             return f"s3://{self.bucket}/{key}"
         except (BotoCoreError, ClientError) as e:
             raise
+
+    def upload_stream(self, filename: str, source: StreamSource, part_size: int | None = None,
+                      max_concurrency: int | None = None, content_type: str | None = None,
+                      content_encoding: str | None = None) -> str:
+        """Upload a chunk iterator or file-like object without buffering the whole object.
+
+        Bodies that fit in a single part go through put_object; larger ones use a multipart
+        upload with up to `max_concurrency` parts in flight. Any failure aborts the multipart
+        upload so no orphaned parts are left behind.
+        """
+        key = self._key(filename)
+        object_args = self._object_args(content_type, content_encoding)
+        part_size = max(MIN_PART_SIZE, int(part_size or self.part_size))
+        max_concurrency = max(1, int(max_concurrency or self.max_concurrency))
+
+        parts = iter_parts(source, part_size)
+        first = next(parts, b'')
+        second = next(parts, None)
+        if second is None:
+            self.client.put_object(Bucket=self.bucket, Key=key, Body=first, **object_args)
+            return f"s3://{self.bucket}/{key}"
+
+        upload_id = self.client.create_multipart_upload(Bucket=self.bucket, Key=key, **object_args)['UploadId']
+        pool = ThreadPoolExecutor(max_workers=max_concurrency)
+        try:
+            futures = []
+            in_flight = set()
+            for number, body in enumerate(itertools.chain([first, second], parts), start=1):
+                while len(in_flight) >= max_concurrency:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for f in done:
+                        f.result()
+                fut = pool.submit(self._upload_part, key, upload_id, number, body)
+                futures.append(fut)
+                in_flight.add(fut)
+            completed = [f.result() for f in futures]
+            self.client.complete_multipart_upload(
+                Bucket=self.bucket, Key=key, UploadId=upload_id,
+                MultipartUpload={'Parts': completed},
+            )
+        except BaseException:
+            pool.shutdown(wait=True, cancel_futures=True)
+            self.client.abort_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id)
+            raise
+        finally:
+            pool.shutdown(wait=True)
+        return f"s3://{self.bucket}/{key}"
+
+    def list(self, prefix: str = '') -> List[str]:
+        """Names (relative to the uploader prefix) of the objects under `prefix`, sorted."""
+        full = self._key(prefix)
+        root = self._key('')
+        out = []
+        for page in self.client.get_paginator('list_objects_v2').paginate(Bucket=self.bucket, Prefix=full):
+            out.extend(o['Key'][len(root):] for o in page.get('Contents', []))
+        return sorted(out)
+
+    def local_copy(self, filename: str, cache_dir: str) -> str | None:
+        """Download the object into `cache_dir` and return the file path, or None when missing."""
+        key = self._key(filename)
+        path = os.path.join(cache_dir, f"{uuid.uuid4().hex}-{os.path.basename(key)}")
+        try:
+            self.client.download_file(self.bucket, key, path)
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey'):
+                return None
+            raise
+        return path
+
+    def etag(self, filename: str) -> str | None:
+        """The object's ETag (changes whenever it is rewritten), or None when missing."""
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self._key(filename))['ETag']
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            raise
+
+    def read(self, filename: str) -> bytes | None:
+        """Return the object's bytes, or None when the key does not exist."""
+        key = self._key(filename)
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=key)['Body'].read()
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+                return None
+            raise
+
+    def delete(self, filename: str):
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(filename))
+
+    def tag(self, filename: str, tags: dict) -> bool:
+        """Replace the object's tags (e.g. for a lifecycle rule that expires tagged objects)."""
+        self.client.put_object_tagging(Bucket=self.bucket, Key=self._key(filename), Tagging={
+            'TagSet': [{'Key': k, 'Value': str(v)} for k, v in tags.items()]})
+        return True
+
+    def read_range(self, filename: str, offset: int, length: int) -> bytes:
+        """Fetch `length` bytes starting at `offset` with a single ranged GET."""
+        key = self._key(filename)
+        resp = self.client.get_object(Bucket=self.bucket, Key=key, Range=f'bytes={offset}-{offset + length - 1}')
+        return resp['Body'].read()
+
+    def _upload_part(self, key: str, upload_id: str, number: int, body: bytes) -> dict:
+        resp = self.client.upload_part(Bucket=self.bucket, Key=key, UploadId=upload_id, PartNumber=number, Body=body)
+        return {'PartNumber': number, 'ETag': resp['ETag']}
@@ -0,0 +1,80 @@
+"""Pack many triggers into a few segment objects instead of one object per trigger.
+
+Each segment is an NDJSON file (one compact JSON trigger per line) closed once it reaches
+`segment_max_bytes` or `segment_max_count`. Next to it a small sidecar index records where
+every trigger lives, so one trigger can still be fetched with a single ranged read:
+
+    <prefix>/segment_<run>_<seq>.ndjson
+    <prefix>/segment_<run>_<seq>.ndjson.index.json
+        {"segment": "...ndjson", "count": n, "bytes": n, "triggers": {"<id>": [offset, length]}}
+
+Works with any uploader exposing upload(), read() and read_range().
+"""
+import datetime
+import json
+import uuid
+from typing import Any, Dict, List
+
+from ..codec import get_codec
+
+INDEX_SUFFIX = '.index.json'
+
+
+class SegmentWriter:
+    def __init__(self, uploader, cfg: Dict[str, Any] | None = None):
+        cfg = cfg or {}
+        self.uploader = uploader
+        self.prefix = (cfg.get('segment_prefix') or 'segments').rstrip('/')
+        self.max_bytes = int(cfg.get('segment_max_bytes', 16 * 1024 * 1024))
+        self.max_count = int(cfg.get('segment_max_count', 50000))
+        # unique per writer so concurrent runs never overwrite each other's segments
+        self.run_id = cfg.get('run_id') or f"{datetime.datetime.utcnow():%Y%m%dT%H%M%S}_{uuid.uuid4().hex[:8]}"
+        self._seq = 0
+        self._buf = bytearray()
+        self._offsets: Dict[str, List[int]] = {}
+        self.segments: List[Dict[str, Any]] = []
+
+    def add(self, trigger: Dict[str, Any]):
+        line = get_codec().dumps(trigger)
+        if self._offsets and (len(self._buf) + len(line) + 1 > self.max_bytes or len(self._offsets) >= self.max_count):
+            self.flush()
+        # the trailing newline is outside the indexed range so a ranged read returns pure JSON
+        self._offsets[str(trigger['id'])] = [len(self._buf), len(line)]
+        self._buf += line
+        self._buf += b'\n'
+
+    def flush(self) -> Dict[str, Any] | None:
+        """Upload the current segment and its index; returns the segment summary."""
+        if not self._offsets:
+            return None
+        self._seq += 1
+        name = f"{self.prefix}/segment_{self.run_id}_{self._seq:05d}.ndjson"
+        path = self.uploader.upload(name, bytes(self._buf), content_type='application/x-ndjson')
+        index = {'segment': name, 'count': len(self._offsets), 'bytes': len(self._buf), 'triggers': self._offsets}
+        index_path = self.uploader.upload(name + INDEX_SUFFIX, json.dumps(index, separators=(',', ':')).encode('utf-8'),
+                                          content_type='application/json')
+        summary = {'segment': name, 'path': path, 'index': index_path, 'ids': list(self._offsets)}
+        self.segments.append(summary)
+        self._buf = bytearray()
+        self._offsets = {}
+        return summary
+
+    def close(self) -> List[Dict[str, Any]]:
+        self.flush()
+        return self.segments
+
+
+def load_index(uploader, segment: str) -> Dict[str, Any]:
+    data = uploader.read(segment + INDEX_SUFFIX)
+    if data is None:
+        raise FileNotFoundError(f"No index for segment {segment}")
+    return json.loads(data)
+
+
+def read_trigger(uploader, index: Dict[str, Any], trigger_id: str) -> Dict[str, Any] | None:
+    """Fetch a single trigger from a segment using its index entry (one ranged read)."""
+    loc = index['triggers'].get(str(trigger_id))
+    if loc is None:
+        return None
+    offset, length = loc
+    return get_codec().loads(uploader.read_range(index['segment'], offset, length))
@@ -0,0 +1,34 @@
+"""Helpers shared by the uploaders for streaming sources.
+
+A streaming source is either an iterable of byte chunks or a binary file-like object
+exposing read().
+"""
+from typing import BinaryIO, Iterable, Iterator, Union
+
+StreamSource = Union[Iterable[bytes], BinaryIO]
+
+
+def iter_source(source: StreamSource, chunk_size: int = 1024 * 1024) -> Iterator[bytes]:
+    """Yield the non-empty chunks of `source`, reading file-likes `chunk_size` bytes at a time."""
+    if hasattr(source, 'read'):
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+    else:
+        for chunk in source:
+            if chunk:
+                yield chunk
+
+
+def iter_parts(source: StreamSource, part_size: int) -> Iterator[bytes]:
+    """Regroup `source` into parts of exactly `part_size` bytes (the last one may be shorter)."""
+    buf = bytearray()
+    for chunk in iter_source(source, part_size):
+        buf += chunk
+        while len(buf) >= part_size:
+            yield bytes(buf[:part_size])
+            del buf[:part_size]
+    if buf:
+        yield bytes(buf)
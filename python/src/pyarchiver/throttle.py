@@ -0,0 +1,132 @@
+"""Per-host request throttling for HttpClient: an adaptive token bucket and a circuit breaker.
+
+HostBucket paces requests to one host. With a configured rate it is a token bucket
+(`rate` requests/second, `burst` capacity) that halves its rate on every 429 and creeps back
+up by 5% of the configured rate per successful response (AIMD). With or without a rate, a
+429's Retry-After pauses *all* requests to the host until it has passed, not just the one
+being retried. A pause longer than `max_pause` is not waited out: requests to the host raise
+ThrottledError until it has passed, so a host asking for an hour cannot hold a run that long.
+
+CircuitBreaker fails fast once a host looks down: after `failures` consecutive failed
+requests (a connection error, timeout or 5xx response that is still there once HttpClient
+has used up its retries; retries are not counted separately) it opens and rejects requests
+with CircuitOpenError for `cooldown` seconds, then lets a single probe through (half-open);
+the probe's outcome closes or re-opens it.
+"""
+import threading
+import time
+
+import requests
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(requests.RequestException):
+    """Raised instead of sending a request to a host whose circuit is open."""
+
+
+class ThrottledError(requests.RequestException):
+    """Raised instead of waiting out a Retry-After pause longer than the configured maximum."""
+
+    def __init__(self, message: str, retry_after: float = 0.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class HostBucket:
+    def __init__(self, rate: float | None = None, burst: float | None = None, min_rate: float | None = None,
+                 max_pause: float | None = None):
+        self.max_rate = float(rate) if rate else None
+        self.rate = self.max_rate
+        self.burst = float(burst) if burst else max(1.0, self.max_rate or 1.0)
+        self.min_rate = float(min_rate) if min_rate else (self.max_rate / 20 if self.max_rate else None)
+        self._tokens = self.burst
+        self._stamp = time.monotonic()
+        self._paused_until = 0.0
+        self.max_pause = max_pause
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Block until a request may be sent; returns the seconds spent waiting.
+
+        Raises ThrottledError when the host is paused for longer than `max_pause`.
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                wait = self._paused_until - now
+                if self.max_pause is not None and wait > self.max_pause:
+                    raise ThrottledError(f"host asked for a {wait:.0f}s pause, more than {self.max_pause:g}s", wait)
+                if wait <= 0:
+                    if self.rate is None:
+                        return waited
+                    self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+                    self._stamp = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return waited
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+    def throttled(self, retry_after: float = 0.0):
+        """The host answered 429: back off multiplicatively and honour Retry-After."""
+        with self._lock:
+            if self.rate is not None:
+                self.rate = max(self.min_rate, self.rate / 2)
+                self._tokens = min(self._tokens, 0.0)
+            if retry_after > 0:
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+
+    def succeeded(self):
+        if self.rate is None or self.rate >= self.max_rate:
+            return
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+
+
+class CircuitBreaker:
+    def __init__(self, failures: int = 5, cooldown: float = 30.0):
+        self.threshold = int(failures)
+        self.cooldown = float(cooldown)
+        self.state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def before(self, host: str):
+        """Raise CircuitOpenError when the request must not be sent."""
+        if self.threshold <= 0:
+            return
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            if self.state == OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+                # let exactly one probe through; everyone else keeps failing fast
+                self.state = HALF_OPEN
+                return
+            raise CircuitOpenError(f"circuit open for {host}; failing fast")
+
+    def success(self):
+        with self._lock:
+            self._failures = 0
+            self.state = CLOSED
+
+    def release(self):
+        """End a request that says nothing about the host (e.g. an invalid URL); a probe
+        hands its slot back so the next request probes again."""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self.state = OPEN
+
+    def failure(self):
+        if self.threshold <= 0:
+            return
+        with self._lock:
+            self._failures += 1
+            if self.state == HALF_OPEN or self._failures >= self.threshold:
+                self.state = OPEN
+                self._opened_at = time.monotonic()
@@ -1,18 +1,148 @@
-"""Token provider stub — handles simple token provider logic
-In a full implementation this would fetch tokens from an OAuth server or local secrets store.
+"""Token provider — OAuth2 client-credentials exchange with an expiry-aware cache.
+
+- get_token_for_client() POSTs `grant_type=client_credentials` to the token URL and caches
+  the access token keyed by (token_url, client_id, scope)
+- cached tokens are refreshed `refresh_margin` seconds (default 60) before `expires_in` runs out,
+  or halfway through the lifetime of tokens shorter than twice the margin, so they are still reused
+- concurrent callers asking for the same key share one in-flight exchange (single-flight)
+- optional persistence to a local JSON file (cfg `cache_file` or env TOKEN_CACHE_FILE) lets warm
+  Lambda containers and repeated CLI runs skip the round-trip
+- cfg `auth_method`: 'basic' (default, HTTP Basic client auth) or 'post' (credentials in the form body)
+
+get_token() keeps the old synthetic behaviour for local demos.
 """
+import json
+import os
+import threading
 import time
+from typing import Any, Dict, Tuple
+
+from .http_client import HttpClient, get_shared_client
+
+_CacheKey = Tuple[str, str, str]
+
+
+class _Flight:
+    """One in-flight exchange that concurrent callers for the same key wait on."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.token: str | None = None
+        self.error: Exception | None = None
 
 
 class TokenProvider:
-    def __init__(self, cfg: dict):
+    def __init__(self, cfg: dict, http: HttpClient | None = None):
         self.cfg = cfg or {}
+        self.http = http or get_shared_client()
         self.token = None
         self.expires_at = 0
 
+        self.refresh_margin = float(self.cfg.get('refresh_margin', 60))
+        self.default_expires_in = int(self.cfg.get('default_expires_in', 3600))
+        self.auth_method = self.cfg.get('auth_method', 'basic')
+        self.cache_file = os.environ.get('TOKEN_CACHE_FILE') or self.cfg.get('cache_file')
+
+        self._cache: Dict[_CacheKey, Dict[str, Any]] = {}
+        self._inflight: Dict[_CacheKey, _Flight] = {}
+        self._lock = threading.Lock()
+        self.exchanges = 0
+        if self.cache_file:
+            self._load_cache()
+
     def get_token(self):
         if not self.token or time.time() > self.expires_at - 5:
             # refresh synthetically
             self.token = self.cfg.get('token', 'demo-token')
             self.expires_at = time.time() + 3600
         return self.token
+
+    def get_token_for_client(self, client_id: str, client_secret: str, token_url: str, scope: str | None = None) -> str:
+        """Return a valid access token for the client, exchanging credentials only when needed."""
+        key = (token_url, client_id, scope or '')
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry and entry['refresh_at'] > time.time():
+                return entry['access_token']
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._inflight[key] = flight
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.token
+
+        try:
+            entry = self._exchange(client_id, client_secret, token_url, scope)
+            flight.token = entry['access_token']
+            with self._lock:
+                self._cache[key] = entry
+            if self.cache_file:
+                self._save_cache()
+            return flight.token
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.event.set()
+
+    def _exchange(self, client_id: str, client_secret: str, token_url: str, scope: str | None) -> Dict[str, Any]:
+        data = {'grant_type': 'client_credentials'}
+        if scope:
+            data['scope'] = scope
+        auth = None
+        if self.auth_method == 'post':
+            data.update({'client_id': client_id, 'client_secret': client_secret})
+        else:
+            auth = (client_id, client_secret)
+
+        resp = self.http.post(token_url, data=data, auth=auth, headers={'Accept': 'application/json'})
+        resp.raise_for_status()
+        body = resp.json()
+        access_token = body.get('access_token')
+        if not access_token:
+            raise RuntimeError(f'Token response from {token_url} has no access_token')
+        with self._lock:
+            self.exchanges += 1
+        expires_in = int(body.get('expires_in') or self.default_expires_in)
+        now = time.time()
+        return {'access_token': access_token, 'expires_at': now + expires_in,
+                'refresh_at': now + expires_in - min(self.refresh_margin, expires_in / 2)}
+
+    def _load_cache(self):
+        try:
+            with open(self.cache_file, 'r') as f:
+                raw = json.load(f)
+        except (OSError, ValueError):
+            return
+        now = time.time()
+        for k, entry in raw.items():
+            try:
+                key = tuple(json.loads(k))
+                # files written before refresh_at was stored: the plain margin
+                refresh_at = float(entry.get('refresh_at', entry['expires_at'] - self.refresh_margin))
+                if refresh_at > now:
+                    self._cache[key] = {'access_token': entry['access_token'], 'expires_at': float(entry['expires_at']),
+                                        'refresh_at': refresh_at}
+            except (ValueError, KeyError, TypeError):
+                continue
+
+    def _save_cache(self):
+        now = time.time()
+        with self._lock:
+            raw = {json.dumps(list(k)): v for k, v in self._cache.items() if v['expires_at'] > now}
+        parent = os.path.dirname(self.cache_file)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        tmp = f"{self.cache_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+        # tokens are credentials: keep the file private to the current user
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(raw, f)
+        os.replace(tmp, self.cache_file)
@@ -0,0 +1,143 @@
+"""Incremental JSON helpers for streaming trigger responses.
+
+- iter_json_values() decodes a byte stream that is either a JSON array (yielding its
+  elements one at a time), a single JSON value, or NDJSON / concatenated JSON values
+- iter_json_array_chunks() encodes an iterable of items back into a JSON array, emitted as
+  bounded byte chunks through the JSON codec (codec.py); with indent=2 the output matches
+  json.dumps(items, indent=2), with indent=None it is compact (no whitespace)
+
+Only the current element and one read chunk are held in memory at any time.
+"""
+import codecs
+import json
+from typing import Any, Iterable, Iterator
+
+from ..codec import get_codec
+
+_WS = ' \t\r\n'
+_decoder = json.JSONDecoder()
+
+
+def _skip_ws(buf: str, pos: int) -> int:
+    n = len(buf)
+    while pos < n and buf[pos] in _WS:
+        pos += 1
+    return pos
+
+
+def iter_json_values(chunks: Iterable[bytes]) -> Iterator[Any]:
+    """Yield JSON values from a byte stream as soon as each one is complete."""
+    it = iter(chunks)
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    buf = ''
+    pos = 0
+    eof = False
+
+    def fill(min_new: int = 1) -> bool:
+        """Append at least `min_new` characters (or whatever is left) to the buffer."""
+        nonlocal buf, pos, eof
+        if eof:
+            return False
+        parts = []
+        got = 0
+        while got < min_new:
+            chunk = next(it, None)
+            if chunk is None:
+                eof = True
+                tail = utf8.decode(b'', final=True)
+                if tail:
+                    parts.append(tail)
+                break
+            text = utf8.decode(chunk)
+            parts.append(text)
+            got += len(text)
+        buf = buf[pos:] + ''.join(parts)
+        pos = 0
+        return bool(parts)
+
+    def next_value():
+        """Decode the value starting at `pos`, reading more input until it is complete."""
+        nonlocal pos
+        while True:
+            try:
+                value, end = _decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                # grow geometrically so a large element is not re-parsed once per chunk
+                fill(max(1, len(buf) - pos))
+                continue
+            # a number (or literal) touching the end of the buffer may continue in the next chunk;
+            # so may a number cut right after its '.', 'e' or exponent sign, which raw_decode
+            # returns without them ('1.' -> 1)
+            if not eof and (end == len(buf) or (
+                    len(buf) - end <= 2 and type(value) in (int, float) and not buf[end:].strip('.eE+-'))):
+                fill()
+                continue
+            pos = end
+            return value
+
+    def skip():
+        nonlocal pos
+        while True:
+            pos = _skip_ws(buf, pos)
+            if pos < len(buf) or not fill():
+                return
+
+    skip()
+    if pos >= len(buf):
+        return
+
+    if buf[pos] != '[':
+        # single object, NDJSON or concatenated values
+        while pos < len(buf):
+            yield next_value()
+            skip()
+        return
+
+    pos += 1
+    skip()
+    if pos < len(buf) and buf[pos] == ']':
+        return
+    while True:
+        skip()
+        yield next_value()
+        skip()
+        if pos >= len(buf):
+            raise ValueError('Unterminated JSON array in trigger stream')
+        ch = buf[pos]
+        pos += 1
+        if ch == ']':
+            return
+        if ch != ',':
+            raise ValueError(f'Expected "," or "]" in trigger stream, got {ch!r}')
+
+
+def iter_json_array_chunks(items: Iterable[Any], indent: int | None = 2, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    """Encode `items` as a JSON array, yielding UTF-8 chunks of roughly `chunk_size` bytes."""
+    dumps = get_codec().dumps
+    if indent is None:
+        sep, first_open, close = b',', b'[', b']'
+        newline = None
+    else:
+        newline = b'\n' + b' ' * indent
+        sep, first_open, close = b',' + newline, b'[' + newline, b'\n]'
+
+    parts = []
+    size = 0
+    empty = True
+    for item in items:
+        data = dumps(item, indent)
+        if newline is not None:
+            # JSON strings never contain raw newlines, so this only re-indents structure
+            data = data.replace(b'\n', newline)
+        parts.append(first_open if empty else sep)
+        parts.append(data)
+        size += len(data)
+        empty = False
+        if size >= chunk_size:
+            yield b''.join(parts)
+            parts = []
+            size = 0
+    parts.append(b'[]' if empty else close)
+    yield b''.join(parts)
@@ -1,31 +1,97 @@
 """Simple HTTP trigger fetcher; returns a list of trigger-like dicts.
-This is intentionally minimal: it will either call a real endpoint or fall back to a
-hard-coded sample for local testing.
+This is intentionally minimal: it calls the configured endpoint, or returns a hard-coded
+sample when no URL is configured (local testing). A failed request to a real endpoint is
+raised, never replaced with sample data.
+
+iter_triggers() is the streaming variant: it yields triggers one at a time while the
+response body is still being read (JSON array, single object or NDJSON), so callers can
+pipe very large responses into an uploader without materializing them.
+
+With a RunMetrics passed in, fetch_triggers() records 'fetch' (request and body read) and
+'parse' timings plus fetched bytes; iter_triggers() records 'fetch' up to the response
+headers and the bytes read while streaming.
 """
-import requests
+import contextlib
+from typing import Any, Dict, Iterator, List
+
+from ..codec import get_codec
+from ..http_client import HttpClient, get_shared_client
+from ..metrics import RunMetrics
+from .json_stream import iter_json_values
 
 
 class TriggerFetcher:
-    def __init__(self, cfg: dict):
+    def __init__(self, cfg: dict, http: HttpClient | None = None, metrics: RunMetrics | None = None,
+                 client_id: str | None = None):
         self.cfg = cfg or {}
+        self.http = http or get_shared_client()
+        self.metrics = metrics
+        self.client_id = client_id
         self.url = self.cfg.get('url')
         self.sample_count = int(self.cfg.get('sample_count', 2))
+        self.chunk_size = int(self.cfg.get('stream_chunk_size', 64 * 1024))
 
-    def fetch_triggers(self):
-        if self.url:
-            print(f"Fetching triggers from {self.url}")
-            try:
-                resp = requests.get(self.url, timeout=10)
-                resp.raise_for_status()
-                data = resp.json()
-                if isinstance(data, list):
-                    return data
-                return [data]
-            except Exception as e:
-                print(f"HTTP fetch failed: {e}")
-
-        # fallback sample data
+    def _phase(self, name: str):
+        return self.metrics.phase(name, self.client_id) if self.metrics else contextlib.nullcontext()
+
+    def _count_bytes(self, n: int):
+        if self.metrics:
+            self.metrics.add_bytes('fetch', n, self.client_id)
+
+    def _headers(self, token: str | None) -> Dict[str, str] | None:
+        return {'Authorization': f'Bearer {token}'} if token else None
+
+    def _sample_triggers(self) -> List[Dict[str, Any]]:
         return [
             {'id': f'sample-{i+1}', 'payload': {'message': 'Hello', 'index': i+1}}
             for i in range(self.sample_count)
         ]
+
+    def fetch_triggers(self, token: str | None = None):
+        if not self.url:
+            # no endpoint configured: sample data for local runs
+            return self._sample_triggers()
+
+        print(f"Fetching triggers from {self.url}")
+        try:
+            with self._phase('fetch'):
+                resp = self.http.get(self.url, headers=self._headers(token))
+                resp.raise_for_status()
+                body = resp.content
+        except Exception as e:
+            print(f"HTTP fetch failed: {e}")
+            raise
+        self._count_bytes(len(body))
+        with self._phase('parse'):
+            data = get_codec().loads(body)
+        if isinstance(data, list):
+            return data
+        return [data]
+
+    def iter_triggers(self, token: str | None = None) -> Iterator[Dict[str, Any]]:
+        """Stream triggers from the endpoint.
+
+        The request itself is sent eagerly so connection and HTTP status errors surface here;
+        errors in the middle of the body are raised while iterating.
+        """
+        if not self.url:
+            return iter(self._sample_triggers())
+
+        print(f"Streaming triggers from {self.url}")
+        try:
+            with self._phase('fetch'):
+                resp = self.http.get(self.url, headers=self._headers(token), stream=True)
+                resp.raise_for_status()
+        except Exception as e:
+            print(f"HTTP fetch failed: {e}")
+            raise
+        return self._iter_response(resp)
+
+    def _iter_response(self, resp) -> Iterator[Dict[str, Any]]:
+        def counted(chunks):
+            for chunk in chunks:
+                self._count_bytes(len(chunk))
+                yield chunk
+
+        with resp:
+            yield from iter_json_values(counted(resp.iter_content(chunk_size=self.chunk_size)))
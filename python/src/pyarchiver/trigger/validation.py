@@ -0,0 +1,145 @@
+"""Single-pass trigger validation built from trigger/constants.py.
+
+Levels (env TRIGGER_VALIDATION first, then cfg `validation.level`):
+- off     triggers are archived as received
+- basic   a trigger must be an object with a non-empty `id` (what archiving always required)
+- strict  additionally every column of `Columns` must be present, and `state`, when the trigger
+          has one, must be one of ValidationValues['allowed_states']; states are compared
+          case-insensitively and rewritten to their canonical spelling in place
+
+The check is compiled once per validator into a closure over frozen sets and runs inside the
+loop that archives the triggers: valid triggers are passed through as the same objects, never
+copied, and a rejected one costs a reason string.
+
+Rejected triggers are logged and dropped, or with `on_invalid: quarantine` (env
+TRIGGER_QUARANTINE=1) written through the run's uploader for inspection and replay:
+
+    <prefix>/_quarantine/<yyyymmdd>/rejected_<run>_<seq>.ndjson
+        {"reason": "missing id", "source": "<client id or SQS messageId>", "trigger": {...}, "at": "..."}
+"""
+import datetime
+import os
+import threading
+import uuid
+from typing import Any, Callable, Dict, Iterable, Iterator, List
+
+from ..codec import get_codec
+from .constants import Columns, ValidationValues
+
+LEVELS = ('off', 'basic', 'strict')
+QUARANTINE_DIR = '_quarantine'
+
+
+class TriggerValidator:
+    def __init__(self, level: str = 'basic', required: Iterable[str] | None = None,
+                 allowed_states: Iterable[str] | None = None, state_field: str = 'state',
+                 quarantine: bool = False):
+        level = (level or 'basic').lower()
+        if level not in LEVELS:
+            raise ValueError(f"validation level must be one of {LEVELS}, got {level!r}")
+        self.level = level
+        self.required = tuple(Columns if required is None else required)
+        self.allowed_states = tuple(ValidationValues['allowed_states'] if allowed_states is None else allowed_states)
+        self.state_field = state_field
+        self.quarantine = quarantine
+        self.check: Callable[[Any], str | None] = self._compile()
+
+    @classmethod
+    def from_config(cls, cfg: Dict[str, Any] | None = None, default_level: str = 'basic',
+                    min_level: str = 'off') -> 'TriggerValidator':
+        """Validator configured by env / cfg; paths that key objects by trigger id pass
+        min_level='basic' so the id check cannot be turned off."""
+        vcfg = (cfg or {}).get('validation') or {}
+        on_invalid = (os.environ.get('TRIGGER_QUARANTINE') or vcfg.get('on_invalid') or 'drop')
+        level = str(os.environ.get('TRIGGER_VALIDATION') or vcfg.get('level') or default_level).lower()
+        if level in LEVELS and LEVELS.index(level) < LEVELS.index(min_level):
+            level = min_level
+        return cls(
+            level=level,
+            required=vcfg.get('required'),
+            allowed_states=vcfg.get('allowed_states'),
+            quarantine=str(on_invalid).lower() in ('quarantine', '1', 'true', 'yes'),
+        )
+
+    def _compile(self) -> Callable[[Any], str | None]:
+        if self.level == 'off':
+            return lambda t: None
+        strict = self.level == 'strict'
+        required = frozenset(c for c in self.required if c != 'id')
+        canonical = {s.upper(): s for s in self.allowed_states}
+        field = self.state_field
+
+        def check(t: Any) -> str | None:
+            """Reason `t` is rejected, or None; normalizes the state in place."""
+            # anything but an object with an id (None for an unparseable body) is 'missing id'
+            if not isinstance(t, dict) or not t.get('id'):
+                return 'missing id'
+            if strict:
+                if not required <= t.keys():
+                    return 'missing ' + ', '.join(sorted(required - t.keys()))
+                state = t.get(field)
+                if state is not None:
+                    spelled = canonical.get(state.upper()) if isinstance(state, str) else None
+                    if spelled is None:
+                        return f'{field} {state!r} not allowed'
+                    if spelled != state:
+                        t[field] = spelled
+            return None
+
+        return check
+
+    def filter(self, triggers: Iterable[Any], rejected: List[str] | None = None,
+               quarantine: 'Quarantine | None' = None, source: str | None = None) -> Iterator[Any]:
+        """Yield the valid triggers; the reason of each rejected one is appended to `rejected`
+        and the trigger goes to `quarantine` (or the log)."""
+        check = self.check
+        for t in triggers:
+            reason = check(t)
+            if reason is None:
+                yield t
+                continue
+            if rejected is not None:
+                rejected.append(reason)
+            if quarantine is not None:
+                quarantine.add(t, reason, source)
+            else:
+                print(f"Skipping invalid trigger ({reason}): {t}")
+
+
+class Quarantine:
+    """Buffers rejected triggers of one run and writes them as NDJSON part objects."""
+
+    def __init__(self, uploader, prefix: str = '', day: datetime.datetime | None = None, flush_every: int = 1000):
+        day = day or datetime.datetime.utcnow()
+        prefix = prefix.rstrip('/')
+        self.uploader = uploader
+        self.dir = f"{prefix}/{QUARANTINE_DIR}/{day:%Y%m%d}" if prefix else f"{QUARANTINE_DIR}/{day:%Y%m%d}"
+        self.flush_every = max(1, int(flush_every))
+        self.run_id = f"{datetime.datetime.utcnow():%Y%m%dT%H%M%S}_{uuid.uuid4().hex[:8]}"
+        self.count = 0
+        self.paths: List[str] = []
+        self._seq = 0
+        self._pending: List[bytes] = []
+        self._lock = threading.Lock()
+
+    def add(self, trigger: Any, reason: str, source: str | None = None):
+        line = get_codec().dumps({'reason': reason, 'source': source, 'trigger': trigger,
+                                  'at': datetime.datetime.utcnow().isoformat() + 'Z'})
+        with self._lock:
+            self._pending.append(line)
+            self.count += 1
+            due = len(self._pending) >= self.flush_every
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+            if not pending:
+                return
+            self._seq += 1
+            name = f"{self.dir}/rejected_{self.run_id}_{self._seq:05d}.ndjson"
+        self.paths.append(self.uploader.upload(name, b'\n'.join(pending) + b'\n', content_type='application/x-ndjson'))
+
+    def close(self):
+        self.flush()
@@ -0,0 +1,57 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+WRITE_CHUNK = 16 * 1024
+
+
+def _handler_for(respond):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def _reply(self):
+            out = respond(self)
+            status, headers = 200, {}
+            if isinstance(out, tuple):
+                status, out, *rest = out
+                headers = rest[0] if rest else {}
+            body = out if isinstance(out, bytes) else json.dumps(out).encode('utf-8')
+            self.send_response(status)
+            for name, value in {'Content-Type': 'application/json', **headers}.items():
+                self.send_header(name, value)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            # in slices, so clients see the body arrive in parts as from a real endpoint
+            view = memoryview(body)
+            for i in range(0, len(body), WRITE_CHUNK):
+                self.wfile.write(view[i:i + WRITE_CHUNK])
+
+        do_GET = do_POST = _reply
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+@pytest.fixture
+def local_http_server():
+    """Start a local HTTP/1.1 server per call and return its base URL; all are stopped after the test.
+
+    `respond(request)` is called with the BaseHTTPRequestHandler of every GET / POST and returns
+    the body (bytes, or a value sent as JSON) or (status, body[, headers]).
+    """
+    servers = []
+
+    def start(respond) -> str:
+        srv = ThreadingHTTPServer(('127.0.0.1', 0), _handler_for(respond))
+        threading.Thread(target=srv.serve_forever, daemon=True).start()
+        servers.append(srv)
+        return f'http://127.0.0.1:{srv.server_address[1]}'
+
+    yield start
+    for srv in servers:
+        srv.shutdown()
+        srv.server_close()
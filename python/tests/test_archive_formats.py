@@ -0,0 +1,74 @@
+import gzip
+import io
+import json
+
+import pytest
+
+from pyarchiver.archiver_lambda_service import ArchiverLambdaService
+from pyarchiver.storage.formats import available_formats, get_format
+
+TRIGGERS = [{'id': f't-{i}', 'payload': {'index': i, 'message': 'hé'}, 'timestamp': '2024-01-01T00:00:00Z'} for i in range(50)]
+
+
+def _decode(name, data):
+    if name in ('json', 'json-compact'):
+        return json.loads(data)
+    if name == 'ndjson':
+        return [json.loads(line) for line in data.splitlines()]
+    if name == 'ndjson.gz':
+        return [json.loads(line) for line in gzip.decompress(data).splitlines()]
+    if name == 'ndjson.zst':
+        zstandard = pytest.importorskip('zstandard')
+        raw = zstandard.ZstdDecompressor().stream_reader(io.BytesIO(data)).read()
+        return [json.loads(line) for line in raw.splitlines()]
+    if name == 'parquet':
+        pq = pytest.importorskip('pyarrow.parquet')
+        rows = pq.read_table(io.BytesIO(data)).to_pylist()
+        # payload is stored as a JSON string, which `extra` records
+        assert all(json.loads(r.pop('extra')) == {'json': ['payload']} for r in rows)
+        return [dict(r, payload=json.loads(r['payload'])) for r in rows]
+    raise AssertionError(name)
+
+
+@pytest.mark.parametrize('name', available_formats())
+def test_formats_round_trip(name):
+    fmt = get_format(name)
+    assert _decode(name, fmt.encode(TRIGGERS)) == TRIGGERS
+    assert _decode(name, fmt.encode([])) == []
+
+
+@pytest.mark.parametrize('name', available_formats())
+def test_iter_decode_restores_every_field(name):
+    triggers = [
+        {'id': 'a', 'payload': {'n': 1}, 'timestamp': 't', 'state': 'NEW', 'tags': ['x']},
+        {'id': 'b', 'payload': 'plain text', 'timestamp': None},
+        {'id': 'c', 'payload': [1, 2], 'extra': {'nested': True}},
+    ]
+    fmt = get_format(name)
+    assert list(fmt.iter_decode(fmt.encode(triggers))) == triggers
+    assert fmt.restores_exactly(fmt.encode(triggers))
+
+
+def test_json_format_matches_legacy_output():
+    assert get_format('json').encode(TRIGGERS) == json.dumps(TRIGGERS, indent=2).encode('utf-8')
+    assert get_format('json').encode_one(TRIGGERS[0]) == json.dumps(TRIGGERS[0], indent=2).encode('utf-8')
+
+
+def test_unknown_format_is_rejected():
+    with pytest.raises(ValueError):
+        get_format('xml')
+
+
+def test_lambda_service_writes_selected_format(tmp_path):
+    cfg = {
+        'api': {'sample_count': 3},
+        'client_fetch': {'clients': [{'client_id': 'c1', 'scopes': ['dex/trigger:all']}]},
+        'bucket': str(tmp_path / 'bucket'),
+        'prefix': 'trigger',
+        'format': 'ndjson.gz',
+    }
+    out = ArchiverLambdaService(cfg).run_once()
+    path = out['archived'][0]['s3']
+    assert path.endswith('.ndjson.gz')
+    with open(path, 'rb') as f:
+        assert [t['id'] for t in _decode('ndjson.gz', f.read())] == ['sample-1', 'sample-2', 'sample-3']
@@ -0,0 +1,133 @@
+import datetime
+import hashlib
+import json
+
+import pytest
+
+from pyarchiver import archive_index
+from pyarchiver.archive_index import ArchiveIndex, ArchiveReader
+from pyarchiver.archiver_lambda_service import ArchiverLambdaService
+from pyarchiver.storage.local_uploader import LocalUploader
+
+
+def _clients(n=3, count=4):
+    return [{'client_id': f'c{i}', 'scopes': ['dex/trigger:all'], 'sample_count': count} for i in range(n)]
+
+
+def test_uploads_are_indexed_and_read_back(tmp_path):
+    bucket = str(tmp_path / 'bucket')
+    cfg = {'client_fetch': {'clients': _clients()}, 'bucket': bucket, 'prefix': 'trigger', 'format': 'ndjson.gz',
+           'stream': True}
+    out = ArchiverLambdaService(cfg).run_once()
+    assert out['count'] == 3
+
+    uploader = LocalUploader({'local_dir': f'{bucket}/trigger'})
+    reader = ArchiveReader(uploader, 'trigger', {'read_part_size': 16, 'read_workers': 3})
+    today = datetime.datetime.utcnow().date()
+    entries = reader.entries('c1', today, today)
+    assert len(entries) == 1
+    entry = entries[0]
+    assert (entry['client_id'], entry['count'], entry['format']) == ('c1', 4, 'ndjson.gz')
+    stored = uploader.read(entry['key'])
+    assert entry['size'] == len(stored) and entry['sha256'] == hashlib.sha256(stored).hexdigest()
+
+    ranged = []
+    real_range = uploader.read_range
+    uploader.read_range = lambda key, off, n: ranged.append(off) or real_range(key, off, n)
+    triggers = list(reader.iter_triggers(reader.entries()))
+    assert len(triggers) == 12
+    assert len(ranged) == 3 * -(-entry['size'] // 16)
+
+    with open(f"{bucket}/trigger/{entry['key']}", 'r+b') as f:
+        f.write(b'x')
+    with pytest.raises(ValueError, match='Checksum'):
+        reader.fetch(reader.entries('c1')[0])
+
+
+def test_date_ranges_only_list_their_months(tmp_path):
+    uploader = LocalUploader({'local_dir': str(tmp_path)})
+    index = ArchiveIndex(uploader, 'trigger', {'index_flush_every': 1000})
+    for day in ('2024-01-31', '2024-02-01', '2024-02-15', '2024-03-01'):
+        d = datetime.date.fromisoformat(day)
+        index.record('a', d, f'trigger/a/a_trigger_{d:%Y%m%d}.json', None, 2, 0, 'h', 'json')
+    index.record('a', datetime.date(2024, 2, 1), 'trigger/a/a_trigger_20240201.json', None, 3, 1, 'h2', 'json')
+    index.close()
+    assert index.writes == 3
+
+    listed = []
+    real_list = uploader.list
+    uploader.list = lambda prefix='': listed.append(prefix) or real_list(prefix)
+    reader = ArchiveReader(uploader, 'trigger')
+    entries = reader.entries('a', '2024-02-01', '2024-02-29')
+    # the client's bucket of the month, plus parts written before buckets existed
+    assert listed == [f"trigger/_index/202402/{archive_index.client_bucket('a')}/", 'trigger/_index/202402/part_']
+    # the re-archived key is represented by its newest entry
+    assert [(e['date'], e['size']) for e in entries] == [('2024-02-01', 3), ('2024-02-15', 2)]
+    assert [e['date'] for e in reader.entries(start='2024-02-10')] == ['2024-02-15', '2024-03-01']
+
+
+def test_closed_months_consolidate_to_one_sorted_object_per_bucket(tmp_path):
+    uploader = LocalUploader({'local_dir': str(tmp_path)})
+    clients = [f'c{i}' for i in range(40)]
+    # a part from before client buckets: every client of the month in one object
+    uploader.upload('trigger/_index/202401/part_old_00001.ndjson', json.dumps(
+        {'client_id': 'c0', 'date': '2024-01-01', 'key': 'k/c0/1', 'path': None, 'size': 1, 'count': 1,
+         'sha256': 'old', 'format': 'json', 'at': '2024-01-01T00:00:00Z'}).encode('utf-8'))
+    for run in range(3):
+        index = ArchiveIndex(uploader, 'trigger')
+        for cid in clients:
+            for day in (1, 2):
+                index.record(cid, datetime.date(2024, 1, day), f'k/{cid}/{day}', None, 1, 1, f'h{run}', 'json')
+        index.record('c0', datetime.date(2024, 2, 1), 'k/c0/feb', None, 1, 1, 'h', 'json')
+        index.close()
+    reader = ArchiveReader(uploader, 'trigger')
+    before = reader.entries()
+    assert [e['sha256'] for e in reader.entries('c0', '2024-01-01', '2024-01-31')] == ['h2', 'h2']
+
+    index = ArchiveIndex(uploader, 'trigger')
+    months = index.months('202402')
+    assert list(months) == ['202401']
+    merged = index.consolidate('202401', months['202401'])
+    assert merged == len(months['202401'])
+    names = uploader.list('trigger/_index/202401/')
+    buckets = sorted({archive_index.client_bucket(c) for c in clients})
+    assert [n.split('/')[3] for n in names] == buckets and all('/month_' in n for n in names)
+    # a bucket's object is sorted by client, date and key and holds each key once
+    lines = [json.loads(line) for line in uploader.read(names[0]).splitlines()]
+    assert [(e['client_id'], e['date'], e['key']) for e in lines] == sorted({(e['client_id'], e['date'], e['key'])
+                                                                             for e in lines})
+    assert reader.entries() == before
+    assert len(uploader.list('trigger/_index/202402/')) == 3
+
+    # a single-client query of the month now reads one index object
+    read = []
+    real_read = uploader.read
+    uploader.read = lambda name: read.append(name) or real_read(name)
+    assert len(reader.entries('c5', '2024-01-01', '2024-01-31')) == 2
+    assert read == [n for n in names if n.split('/')[3] == archive_index.client_bucket('c5')]
+    # consolidated buckets are left alone
+    assert index.consolidate('202401') == 0
+
+
+def test_cli_against_s3(monkeypatch, tmp_path, capsys):
+    moto = pytest.importorskip('moto')
+    boto3 = pytest.importorskip('boto3')
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    config = tmp_path / 'config.yaml'
+    config.write_text('bucket: archive\nprefix: trigger\n')
+
+    with moto.mock_aws():
+        boto3.client('s3').create_bucket(Bucket='archive')
+        ArchiverLambdaService({'client_fetch': {'clients': _clients(2, 3)}, 'bucket': 'archive',
+                               'prefix': 'trigger'}).run_once()
+        capsys.readouterr()
+        assert archive_index.main([str(config), 'list', '--client', 'c0']) == 0
+        listed = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+        assert [e['client_id'] for e in listed] == ['c0'] and listed[0]['path'].startswith('s3://archive/')
+        assert archive_index.main([str(config), 'stream']) == 0
+        streamed = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+        assert len(streamed) == 6
+        assert archive_index.main([str(config), 'fetch', '--client', 'c1', '--out', str(tmp_path / 'out')]) == 0
+    assert (tmp_path / 'out' / listed[0]['key'].replace('c0', 'c1')).exists()
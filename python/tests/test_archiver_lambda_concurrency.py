@@ -0,0 +1,64 @@
+import threading
+import time
+
+from pyarchiver.archiver_lambda_service import ArchiverLambdaService
+from pyarchiver.trigger.trigger_fetcher import TriggerFetcher
+
+
+def _cfg(bucket, clients, **extra):
+    cfg = {
+        'api': {'sample_count': 1},
+        'client_fetch': {'clients': clients},
+        'bucket': bucket,
+        'prefix': 'trigger',
+    }
+    cfg.update(extra)
+    return cfg
+
+
+def test_concurrent_run_keeps_order_and_isolates_failures(tmp_path):
+    clients = [{'client_id': f'client-{i}', 'scopes': ['dex/trigger:all']} for i in range(12)]
+    svc = ArchiverLambdaService(_cfg(str(tmp_path / 'bucket'), clients, max_workers=4))
+
+    real_upload = svc.uploader.upload
+
+    def flaky_upload(key, data, **kwargs):
+        if '/client-5/' in key:
+            raise RuntimeError('boom')
+        time.sleep(0.01)
+        return real_upload(key, data, **kwargs)
+
+    svc.uploader.upload = flaky_upload
+    out = svc.run_once()
+
+    expected = [f'client-{i}' for i in range(12) if i != 5]
+    assert [a['client_id'] for a in out['archived']] == expected
+    assert out['count'] == 11
+    assert [f['client_id'] for f in out['failed']] == ['client-5']
+
+
+def test_per_host_limit_bounds_concurrent_fetches(tmp_path, monkeypatch):
+    clients = [
+        {'client_id': f'client-{i}', 'scopes': ['dex/trigger:all'], 'trigger_url': 'https://triggers.example.com/data-exchange/trigger'}
+        for i in range(8)
+    ]
+    active = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def fake_fetch(self, token=None):
+        nonlocal active, peak
+        with lock:
+            active += 1
+            peak = max(peak, active)
+        time.sleep(0.02)
+        with lock:
+            active -= 1
+        return [{'id': 'x'}]
+
+    monkeypatch.setattr(TriggerFetcher, 'fetch_triggers', fake_fetch)
+    svc = ArchiverLambdaService(_cfg(str(tmp_path / 'bucket'), clients, max_workers=8, max_per_host=2))
+    out = svc.run_once()
+
+    assert out['count'] == 8
+    assert peak <= 2
@@ -0,0 +1,71 @@
+import time
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from pyarchiver.client_fetcher import ClientFetcher
+from pyarchiver.http_client import HttpClient
+
+CLIENTS = [
+    {'client_id': f'c{i}', 'scopes': ['dex/trigger:all'] if i % 3 else ['other:scope']}
+    for i in range(1, 11)
+]
+
+
+class _ClientsApi:
+    """Serves CLIENTS by page number, or by cursor under /cursor; records each query."""
+
+    def __init__(self):
+        self.requests = []
+        self.slow_page = None
+
+    def __call__(self, request):
+        q = {k: v[0] for k, v in parse_qs(urlparse(request.path).query).items()}
+        self.requests.append(q)
+        size = int(q.get('page_size', 4))
+        if urlparse(request.path).path == '/cursor':
+            start = int(q.get('cursor', 0))
+            page = CLIENTS[start:start + size]
+            nxt = start + size if start + size < len(CLIENTS) else None
+            return {'clients': page, 'next_cursor': str(nxt) if nxt is not None else None}
+        n = int(q['page'])
+        if n == self.slow_page:
+            time.sleep(0.5)
+        return CLIENTS[(n - 1) * size:n * size]
+
+
+@pytest.fixture
+def clients_api():
+    return _ClientsApi()
+
+
+@pytest.fixture
+def api(local_http_server, clients_api):
+    return local_http_server(clients_api)
+
+
+def _eligible():
+    return [c['client_id'] for c in CLIENTS if 'dex/trigger:all' in c['scopes']]
+
+
+def test_page_mode_filters_scope_and_keeps_order(api):
+    fetcher = ClientFetcher({'clients_api_url': api + '/clients', 'page_size': 4, 'prefetch': 3}, http=HttpClient())
+    got = [c['client_id'] for c in fetcher.get_clients(scope='dex/trigger:all')]
+    assert got == _eligible()
+
+
+def test_cursor_mode_follows_next_cursor(api, clients_api):
+    fetcher = ClientFetcher({'clients_api_url': api + '/cursor', 'pagination': 'cursor', 'page_size': 3}, http=HttpClient())
+    got = [c['client_id'] for c in fetcher.get_clients()]
+    assert got == [c['client_id'] for c in CLIENTS]
+    assert [r.get('cursor') for r in clients_api.requests] == [None, '3', '6', '9']
+
+
+def test_first_clients_are_yielded_before_slow_pages_finish(api, clients_api):
+    clients_api.slow_page = 3
+    fetcher = ClientFetcher({'clients_api_url': api + '/clients', 'page_size': 4, 'prefetch': 3}, http=HttpClient())
+    start = time.perf_counter()
+    it = fetcher.get_clients()
+    assert next(it)['client_id'] == 'c1'
+    assert time.perf_counter() - start < 0.4
+    assert len(list(it)) == 9
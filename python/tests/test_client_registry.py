@@ -0,0 +1,85 @@
+import os
+import stat
+
+from pyarchiver.archiver_lambda_service import ArchiverLambdaService
+from pyarchiver.dao.registry import ClientRegistry
+
+SCOPE = 'dex/trigger:all'
+
+
+def _raw():
+    return [
+        {'client_id': 'a', 'scopes': [SCOPE], 'oauth_client_id': 'oa', 'oauth_client_secret': 's1', 'state': 'active'},
+        {'ClientID': 'b', 'scope': SCOPE, 'trigger_url': 'https://other.example/t'},
+        {'oauth_client_id': 'c', 'scopes': ['read'], 'status': 'suspended'},
+        {'name': 'no id'},
+    ]
+
+
+def test_normalizes_client_shapes_into_indexed_records():
+    registry = ClientRegistry(trigger_base='https://api.example/', token_url='https://auth.example/token')
+    assert registry.refresh(_raw()) == {'added': 3, 'changed': 0, 'unchanged': 0, 'removed': 0}
+    assert [r.client_id for r in registry.by_scope(SCOPE)] == ['a', 'b']
+    a = registry.clients.get_client('a')
+    assert a.trigger_url == 'https://api.example/data-exchange/trigger'
+    assert a.token_url == 'https://auth.example/token'
+    assert [r.client_id for r in registry.clients.by_state('suspended')] == ['c']
+    assert [r.client_id for r in registry.clients.by_host('other.example')] == ['b']
+    cred = registry.credential_for('a')
+    assert (cred.oauth_client_id, cred.secret) == ('oa', 's1') and 's1' not in repr(cred)
+    assert registry.credential_for('b') is None
+
+
+def test_refresh_applies_only_changes():
+    registry = ClientRegistry()
+    registry.refresh(_raw())
+    before = registry.clients.get_client('b')
+    raw = _raw()
+    raw[0]['scopes'] = ['read']
+    del raw[2]
+    raw.append({'client_id': 'd', 'scopes': [SCOPE]})
+    assert registry.refresh(raw) == {'added': 1, 'changed': 1, 'unchanged': 1, 'removed': 1}
+    assert registry.clients.get_client('b') is before
+    assert [r.client_id for r in registry.by_scope(SCOPE)] == ['b', 'd']
+    assert [r.client_id for r in registry.by_scope('read')] == ['a']
+    assert 'c' not in registry.clients and registry.clients.by_state('suspended') == []
+
+
+def test_snapshot_round_trip(tmp_path, monkeypatch):
+    path = str(tmp_path / 'registry.json')
+    registry = ClientRegistry(trigger_base='https://api.example', snapshot_file=path)
+    registry.refresh(_raw())
+    registry.save_snapshot()
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+
+    monkeypatch.setenv('TRIGGER_BASE_URL', 'https://api.example')
+    monkeypatch.setenv('CLIENT_REGISTRY_FILE', path)
+    loaded = ClientRegistry.from_config()
+    assert [r.client_id for r in loaded.by_scope(SCOPE)] == ['a', 'b']
+    assert loaded.clients.get_client('a') == registry.clients.get_client('a')
+    assert loaded.credential_for('a').secret == 's1'
+    # records hold URLs resolved against the old base; a different base starts empty
+    monkeypatch.setenv('TRIGGER_BASE_URL', 'https://elsewhere.example')
+    assert len(ClientRegistry.from_config()) == 0
+
+
+def test_service_reuses_a_fresh_registry_without_the_clients_api(tmp_path):
+    clients = [{'client_id': f'c{i}', 'scopes': [SCOPE], 'sample_count': 1} for i in range(3)]
+    clients.append({'client_id': 'reader', 'scopes': ['read'], 'sample_count': 1})
+    cfg = {'client_fetch': {'clients': clients}, 'bucket': str(tmp_path / 'bucket'), 'prefix': 'trigger',
+           'registry_ttl': 300, 'registry_file': str(tmp_path / 'registry.json')}
+    svc = ArchiverLambdaService(cfg)
+    assert svc.run_once()['count'] == 3
+    # the scope is pushed down to the fetcher: ineligible clients are never registered
+    assert 'reader' not in svc.registry.clients and len(svc.registry) == 3
+
+    def unreachable(*args, **kwargs):
+        raise AssertionError('clients API called while the registry is fresh')
+
+    svc.client_fetcher.get_clients = unreachable
+    assert svc.run_once()['count'] == 3
+
+    # a new process picks the snapshot up
+    again = ArchiverLambdaService(cfg)
+    again.client_fetcher.get_clients = unreachable
+    assert [a['client_id'] for a in again.run_once()['archived']] == ['c0', 'c1', 'c2']
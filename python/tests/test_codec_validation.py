@@ -0,0 +1,80 @@
+import dataclasses
+import datetime
+import json
+
+import pytest
+
+from pyarchiver.archiver_service import ArchiverService
+from pyarchiver.codec import JsonCodec, available_codecs, get_codec
+from pyarchiver.storage.local_uploader import LocalUploader
+from pyarchiver.trigger.validation import TriggerValidator
+
+DOCS = [
+    {'id': 'a', 'payload': {'n': [1, 2.5, None, True], 'nested': {}, 'empty': []}, 'timestamp': '2024-01-01T00:00:00Z'},
+    {'id': 'b', 'payload': {'text': 'café ☕'}},
+]
+
+
+@pytest.mark.parametrize('name', available_codecs())
+def test_codecs_write_the_legacy_bytes(name):
+    codec = get_codec(name)
+    for doc in DOCS:
+        assert codec.dumps(doc) == json.dumps(doc, separators=(',', ':')).encode('utf-8')
+        assert codec.dumps(doc, 2) == json.dumps(doc, indent=2).encode('utf-8')
+        assert codec.loads(codec.dumps(doc)) == doc
+    # values or documents a fast backend refuses are handled like the standard library does
+    assert codec.dumps({1: 2 ** 70}) == b'{"1":1180591620717411303424}'
+    assert codec.loads(b'{"x": NaN}')['x'] != codec.loads(b'{"x": NaN}')['x']
+    with pytest.raises(ValueError):
+        codec.loads(b'{"x": ')
+
+
+@dataclasses.dataclass
+class _Point:
+    x: int
+
+
+@pytest.mark.parametrize('name', available_codecs())
+@pytest.mark.parametrize('value', [datetime.datetime(2024, 1, 1), datetime.date(2024, 1, 1), _Point(1)])
+def test_codecs_reject_what_the_standard_library_rejects(name, value):
+    with pytest.raises(TypeError):
+        get_codec(name).dumps({'payload': value})
+
+
+def test_unknown_codec_is_rejected(monkeypatch):
+    monkeypatch.setenv('JSON_CODEC', 'json')
+    assert type(get_codec()) is JsonCodec
+    with pytest.raises(ValueError, match='Unknown JSON codec'):
+        get_codec('simdjson')
+
+
+def test_strict_validation_in_one_pass_without_copies():
+    validator = TriggerValidator('strict')
+    good = {'id': 'a', 'payload': {}, 'timestamp': 't', 'state': 'processed'}
+    triggers = [good, {'id': 'b', 'payload': {}}, {'payload': {}, 'timestamp': 't'},
+                {'id': 'c', 'payload': {}, 'timestamp': 't', 'state': 'DONE'}, 'junk']
+    rejected = []
+    valid = list(validator.filter(triggers, rejected, quarantine=None))
+    assert valid == [good] and valid[0] is good and good['state'] == 'PROCESSED'
+    assert rejected == ['missing timestamp', 'missing id', "state 'DONE' not allowed", 'missing id']
+    # basic only needs an id; 'off' passes everything through
+    assert [t['id'] for t in TriggerValidator('basic').filter(triggers[:4])] == ['a', 'b', 'c']
+    assert len(list(TriggerValidator('off').filter(triggers))) == 5
+
+
+def test_rejected_triggers_are_quarantined(tmp_path, monkeypatch):
+    monkeypatch.setenv('TRIGGER_VALIDATION', 'strict')
+    monkeypatch.setenv('TRIGGER_QUARANTINE', '1')
+    storage = str(tmp_path / 'archive')
+    svc = ArchiverService({'storage': {'local_dir': storage}, 'output': str(tmp_path)})
+    out = svc.archive([{'id': '1', 'payload': {}, 'timestamp': 't', 'state': 'NEW'},
+                       {'id': '2', 'payload': {}, 'timestamp': 't', 'state': 'LOST'},
+                       {'payload': {}}])
+    assert [a['id'] for a in out['archived']] == ['1'] and out['invalid'] == 2
+
+    uploader = LocalUploader({'local_dir': storage})
+    parts = uploader.list('_quarantine/')
+    assert len(parts) == 1
+    records = [json.loads(line) for line in uploader.read(parts[0]).splitlines()]
+    assert [(r['reason'], r['trigger'].get('id')) for r in records] == [("state 'LOST' not allowed", '2'),
+                                                                         ('missing id', None)]
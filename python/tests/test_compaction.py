@@ -0,0 +1,161 @@
+import datetime
+import hashlib
+import json
+
+import pytest
+
+from pyarchiver.archive_index import ArchiveIndex, ArchiveReader, client_bucket
+from pyarchiver.compaction import Compactor
+from pyarchiver.seen_index import SeenIndex
+from pyarchiver.storage.formats import get_format
+from pyarchiver.storage.local_uploader import LocalUploader
+
+
+def _archive(uploader, days):
+    """Write one daily archive per (client, day, format) and index it, as the service does."""
+    index = ArchiveIndex(uploader, 'trigger', {'index_flush_every': 1000})
+    for client_id, day, fmt_name in days:
+        fmt = get_format(fmt_name)
+        d = datetime.date.fromisoformat(day)
+        triggers = [{'id': f'{client_id}-{day}-{i}', 'n': i} for i in range(3)]
+        data = fmt.encode(triggers)
+        key = f'trigger/{client_id}/{client_id}_trigger_{d:%Y%m%d}{fmt.suffix}'
+        path = uploader.upload(key, data)
+        index.record(client_id, d, key, path, len(data), len(triggers), hashlib.sha256(data).hexdigest(), fmt.name)
+    index.close()
+
+
+def test_client_months_are_rolled_up_verified_and_sources_deleted(tmp_path):
+    uploader = LocalUploader({'local_dir': str(tmp_path)})
+    _archive(uploader, [('a', '2024-01-02', 'json'), ('a', '2024-01-03', 'ndjson.gz'), ('a', '2024-01-20', 'ndjson'),
+                        ('b', '2024-01-05', 'json'), ('b', '2024-01-06', 'json'),
+                        ('b', '2024-02-01', 'json')])
+    reader = ArchiveReader(uploader, 'trigger', {'read_workers': 2})
+    before = [(e['client_id'], e['date'], t) for e in reader.entries() for t in reader.iter_triggers([e])]
+
+    out = Compactor(uploader, 'trigger', {'source_action': 'delete', 'before': '202402', 'workers': 2}).run()
+    assert out['failed'] == [] and out['partitions'] == 2 and out['sources'] == 5
+    assert uploader.list('trigger/a/') == [] and uploader.list('trigger/b/') == ['trigger/b/b_trigger_20240201.json']
+    rollup = out['rollups'][0]['rollup']
+    assert rollup.startswith('trigger/_rollups/202401/a/a_trigger_202401_') and rollup.endswith('.ndjson.gz')
+    sidecar = json.loads(uploader.read(rollup + '.index.json'))
+    assert [b['date'] for b in sidecar['blocks']] == ['2024-01-02', '2024-01-03', '2024-01-20']
+
+    # the reader serves the same days and triggers, each day with one ranged read of its member
+    ranged = []
+    real_range = uploader.read_range
+    uploader.read_range = lambda key, off, n: ranged.append(key) or real_range(key, off, n)
+    entries = reader.entries()
+    assert [(e['client_id'], e['date']) for e in entries] == [
+        ('a', '2024-01-02'), ('a', '2024-01-03'), ('b', '2024-01-05'), ('b', '2024-01-06'),
+        ('a', '2024-01-20'), ('b', '2024-02-01')]
+    after = [(e['client_id'], e['date'], t) for e in entries for t in reader.iter_triggers([e])]
+    assert sorted(after, key=repr) == sorted(before, key=repr)
+    assert [e['date'] for e in reader.entries('a', '2024-01-03', '2024-01-03')] == ['2024-01-03']
+    assert ranged.count(rollup) == 3
+
+    # the closed month's index is consolidated to one sorted object per client bucket
+    assert out['index_merged'] > 0
+    consolidated = uploader.list('trigger/_index/202401/')
+    assert len(consolidated) == len({client_bucket('a'), client_bucket('b')})
+    assert all('/month_' in n for n in consolidated)
+    assert len(uploader.list('trigger/_index/202402/')) == 1
+
+    # nothing left to compact
+    assert Compactor(uploader, 'trigger', {'source_action': 'delete', 'before': '202402'}).run()['partitions'] == 0
+
+
+def test_local_listing_takes_key_prefixes(tmp_path):
+    uploader = LocalUploader({'local_dir': str(tmp_path)})
+    for name in ('trigger_1.json', 'trigger_2.json', 'trigger/a/a_trigger_20240101.json', 'trigger_x/nested.json',
+                 'trigger/_index/202401/part.ndjson'):
+        uploader.upload(name, b'{}')
+    assert uploader.list('trigger_') == ['trigger_1.json', 'trigger_2.json', 'trigger_x/nested.json']
+    assert uploader.list('trigger/_ind') == ['trigger/_index/202401/part.ndjson']
+    assert uploader.list('trigger/a/') == ['trigger/a/a_trigger_20240101.json']
+    assert len(uploader.list()) == 5
+
+
+def test_failed_verification_keeps_sources(tmp_path):
+    uploader = LocalUploader({'local_dir': str(tmp_path)})
+    _archive(uploader, [('a', '2024-01-02', 'json'), ('a', '2024-01-03', 'json')])
+    real_range = uploader.read_range
+    uploader.read_range = lambda key, off, n: b'x' + real_range(key, off, n)[1:] if '_rollups' in key \
+        else real_range(key, off, n)
+
+    out = Compactor(uploader, 'trigger', {'source_action': 'delete', 'before': '202402'}).run()
+    assert out['partitions'] == 0 and 'checksum' in out['failed'][0]['error']
+    assert len(uploader.list('trigger/a/')) == 2
+    assert all('rollup' not in e for e in ArchiveReader(uploader, 'trigger').entries())
+
+
+def test_trigger_objects_are_tagged_on_s3(monkeypatch, tmp_path):
+    moto = pytest.importorskip('moto')
+    boto3 = pytest.importorskip('boto3')
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    from pyarchiver.storage.s3_uploader import S3Uploader
+
+    with moto.mock_aws():
+        s3 = boto3.client('s3')
+        s3.create_bucket(Bucket='archive')
+        uploader = S3Uploader({'bucket': 'archive', 'prefix': 'p'})
+        for i in range(5):
+            uploader.upload(f'trigger_{i}.json', json.dumps({'id': str(i)}).encode('utf-8'))
+        uploader.upload('trigger/c/c_trigger_20240101.json', b'[]')
+        seen_cfg = {'seen_cache_dir': str(tmp_path / 'seen')}
+        seen = SeenIndex(uploader, seen_cfg).load()
+        seen.add('0')
+        seen.save()
+        seen.close()
+
+        listed = []
+        real_list = uploader.list
+        uploader.list = lambda prefix='': listed.append(prefix) or real_list(prefix)
+        out = Compactor(uploader, '', {'rollup_max_count': 3, 'block_size': 2, 'min_sources': 3,
+                                       **seen_cfg}).run('triggers')
+        # 5 objects -> a rollup of 3; the group of 2 left is below min_sources
+        assert (out['partitions'], out['sources'], out['failed']) == (1, 3, [])
+        # planning lists the trigger_ key prefix only, not the whole archive
+        assert listed[0] == 'trigger_'
+        # the seen-id delta of the run that archived them is merged too
+        assert out['seen_merged'] == 1 and real_list('_seen/delta/') == []
+        assert '0' in SeenIndex(uploader, seen_cfg).load()
+        name = out['rollups'][0]['rollup']
+        sidecar = json.loads(uploader.read(name + '.index.json'))
+        assert sidecar['triggers'] == {'0': 0, '1': 0, '2': 1}
+        tags = s3.get_object_tagging(Bucket='archive', Key='p/trigger_1.json')['TagSet']
+        assert tags == [{'Key': 'pyarchiver-compacted', 'Value': name}]
+        assert s3.get_object_tagging(Bucket='archive', Key='p/trigger_4.json')['TagSet'] == []
+
+        # the rollup is indexed, so readers see its triggers and not the objects it replaced
+        reader = ArchiveReader(uploader, '')
+        entries = reader.entries('_triggers')
+        assert [(e['count'], e['key']) for e in entries] == [(2, name), (1, name)]
+        assert sorted(t['id'] for t in reader.iter_triggers(entries)) == ['0', '1', '2']
+
+
+def test_parquet_sources_keep_their_fields_and_legacy_files_stay(tmp_path):
+    pa = pytest.importorskip('pyarrow')
+    pq = pytest.importorskip('pyarrow.parquet')
+    uploader = LocalUploader({'local_dir': str(tmp_path)})
+    _archive(uploader, [('a', '2024-01-02', 'parquet'), ('a', '2024-01-03', 'parquet')])
+    # a parquet archive written before the extra column: its JSON columns cannot be told apart
+    buf = pa.BufferOutputStream()
+    pq.write_table(pa.table({'id': ['old'], 'payload': ['{"k":1}']}), buf)
+    data = buf.getvalue().to_pybytes()
+    key = 'trigger/a/a_trigger_20240104.parquet'
+    uploader.upload(key, data)
+    index = ArchiveIndex(uploader, 'trigger', {'index_flush_every': 1000})
+    index.record('a', datetime.date(2024, 1, 4), key, key, len(data), 1, hashlib.sha256(data).hexdigest(), 'parquet')
+    index.close()
+
+    out = Compactor(uploader, 'trigger', {'source_action': 'delete', 'before': '202402', 'min_sources': 2}).run()
+    assert out['failed'] == [] and out['sources'] == 2
+    assert uploader.list('trigger/a/') == [key]
+    reader = ArchiveReader(uploader, 'trigger')
+    entries = reader.entries('a')
+    assert [(e['date'], 'rollup' in e) for e in entries] == [('2024-01-02', True), ('2024-01-03', True),
+                                                              ('2024-01-04', False)]
+    assert list(reader.iter_triggers(entries[:1])) == [{'id': f'a-2024-01-02-{i}', 'n': i} for i in range(3)]
@@ -0,0 +1,73 @@
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+import yaml
+
+from pyarchiver.daemon import ArchiverDaemon
+
+
+def test_fetch_of_next_cycle_overlaps_upload():
+    second_fetch = threading.Event()
+    events = []
+    cycle = iter(range(1, 100))
+
+    def fetch():
+        n = next(cycle)
+        events.append(f'fetch-{n}')
+        if n == 2:
+            second_fetch.set()
+        return n
+
+    def archive(n):
+        if n == 1:
+            # cycle 1's upload can only finish once cycle 2 is being fetched
+            assert second_fetch.wait(5)
+        events.append(f'archive-{n}')
+        return {'cycle': n}
+
+    out = ArchiverDaemon(fetch, archive, interval=0, max_cycles=3).run(install_signals=False)
+    assert out == {'cycles': 3, 'archived': 3, 'failed': 0, 'last': {'cycle': 3}}
+    assert events.index('fetch-2') < events.index('archive-1')
+
+
+def test_failed_fetch_keeps_polling_and_stop_drains_upload():
+    calls = {'fetch': 0}
+    daemon = None
+
+    def fetch():
+        calls['fetch'] += 1
+        if calls['fetch'] == 1:
+            raise RuntimeError('trigger host down')
+        return 'batch'
+
+    def archive(batch):
+        daemon.stop()
+        time.sleep(0.2)  # still uploading when the stop arrives
+        return {'archived': batch}
+
+    daemon = ArchiverDaemon(fetch, archive, interval=0.01)
+    out = daemon.run(install_signals=False)
+    assert out == {'cycles': 2, 'archived': 1, 'failed': 1, 'last': {'archived': 'batch'}}
+
+
+def test_cli_daemon_stops_cleanly_on_sigterm(tmp_path):
+    cfg = {'api': {'sample_count': 2}, 'storage': {'type': 'local', 'local_dir': str(tmp_path / 'archives')},
+           'output': str(tmp_path / 'out')}
+    cfg_file = tmp_path / 'config.yaml'
+    cfg_file.write_text(yaml.safe_dump(cfg))
+    env = dict(os.environ, PYTHONPATH=os.path.join(os.path.dirname(__file__), '..', 'src'))
+    proc = subprocess.Popen([sys.executable, '-m', 'pyarchiver.archiver_app', str(cfg_file), '--daemon', '--interval', '0.1'],
+                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, env=env)
+    summary = tmp_path / 'out' / 'last_run_summary.json'
+    deadline = time.monotonic() + 20
+    while not summary.exists() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    proc.send_signal(signal.SIGTERM)
+    output, _ = proc.communicate(timeout=20)
+    assert proc.returncode == 0, output
+    assert 'Daemon stopped after' in output
+    assert sorted(os.listdir(tmp_path / 'archives')) == ['trigger_sample-1.json', 'trigger_sample-2.json']
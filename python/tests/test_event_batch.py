@@ -0,0 +1,89 @@
+import json
+import threading
+import time
+
+import pytest
+
+from pyarchiver.event_batch import TriggerBatch, batch_item_failures, iter_event, upload_all
+from pyarchiver.metrics import RunMetrics
+from pyarchiver.storage.formats import get_format
+
+
+def _sqs(*bodies):
+    return {'Records': [{'messageId': f'm{i}', 'eventSource': 'aws:sqs', 'body': b} for i, b in enumerate(bodies)]}
+
+
+class SlowUploader:
+    def __init__(self, fail=()):
+        self.fail = set(fail)
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def upload(self, filename, data, **kwargs):
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            time.sleep(0.02)
+            if any(f'_{f}.' in filename for f in self.fail):
+                raise RuntimeError('SlowDown')
+            return f'mem://{filename}'
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+def test_single_pass_validation_groups_items_by_trigger():
+    event = _sqs(json.dumps({'id': 'a'}), json.dumps({'triggers': [{'id': 'b'}, {'id': 'a'}, {'x': 1}]}),
+                 'not json', json.dumps([{'id': 'c'}]))
+    batch = TriggerBatch.from_pairs(iter_event(event), seen={'c'})
+    assert list(batch.triggers) == ['a', 'b']
+    assert batch.items == {'a': ['m0', 'm1'], 'b': ['m1']}
+    assert batch.invalid == [{'item': 'm1', 'reason': 'missing id'}, {'item': 'm2', 'reason': 'missing id'}]
+    assert batch.skipped_seen == 1
+    assert batch_item_failures(batch, [{'id': 'a', 'error': 'x'}]) == [{'itemIdentifier': 'm0'}, {'itemIdentifier': 'm1'}]
+
+
+def test_uploads_run_in_a_bounded_pool_and_keep_order():
+    batch = TriggerBatch.from_pairs((None, {'id': f't{i}'}) for i in range(20))
+    uploader = SlowUploader(fail={'t3'})
+    archived, failed = upload_all(batch, uploader, get_format('json'), 4, RunMetrics())
+    assert 1 < uploader.peak <= 4
+    assert [a['id'] for a in archived] == [f't{i}' for i in range(20) if i != 3]
+    assert failed == [{'id': 't3', 'error': 'RuntimeError: SlowDown'}]
+    assert batch_item_failures(batch, failed) == [{'itemIdentifier': 't3'}]
+
+
+def test_handler_returns_partial_batch_response(monkeypatch):
+    moto = pytest.importorskip('moto')
+    boto3 = pytest.importorskip('boto3')
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    monkeypatch.setenv('BUCKET', 'archive')
+    monkeypatch.setenv('PREFIX', 'trigger')
+    monkeypatch.setenv('METRICS_FORMAT', 'off')
+
+    from pyarchiver import lambda_handler
+    from pyarchiver.storage.s3_uploader import S3Uploader
+
+    real_upload = S3Uploader.upload
+
+    def flaky(self, filename, data, **kwargs):
+        if filename.startswith('trigger_bad'):
+            raise RuntimeError('SlowDown')
+        return real_upload(self, filename, data, **kwargs)
+
+    monkeypatch.setattr(S3Uploader, 'upload', flaky)
+    event = _sqs(json.dumps({'id': 'ok-1'}), json.dumps({'triggers': [{'id': 'ok-2'}, {'id': 'bad'}]}), '{}')
+    with moto.mock_aws():
+        s3 = boto3.client('s3')
+        s3.create_bucket(Bucket='archive')
+        out = lambda_handler.handler(event)
+        keys = sorted(o['Key'] for o in s3.list_objects_v2(Bucket='archive')['Contents'])
+
+    assert out['batchItemFailures'] == [{'itemIdentifier': 'm1'}]
+    assert [a['id'] for a in out['archived']] == ['ok-1', 'ok-2']
+    assert out['invalid'] == [{'item': 'm2', 'reason': 'missing id'}]
+    assert keys == ['trigger/trigger_ok-1.json', 'trigger/trigger_ok-2.json']
@@ -0,0 +1,133 @@
+import time
+
+import pytest
+import requests
+
+from pyarchiver.http_client import HttpClient
+from pyarchiver.throttle import CircuitOpenError, HostBucket, ThrottledError
+from pyarchiver.trigger.trigger_fetcher import TriggerFetcher
+
+
+class _Flaky:
+    """Answers the next `failures_left` requests with `status`, then with a trigger list."""
+
+    def __init__(self):
+        self.failures_left = 0
+        self.status = 503
+        self.retry_after = '0'
+        self.hits = 0
+
+    def __call__(self, request):
+        self.hits += 1
+        if self.failures_left > 0:
+            self.failures_left -= 1
+            return self.status, b'busy', {'Content-Type': 'text/plain', 'Retry-After': self.retry_after}
+        return [{'id': 't1'}]
+
+
+@pytest.fixture
+def flaky():
+    return _Flaky()
+
+
+@pytest.fixture
+def server(local_http_server, flaky):
+    return local_http_server(flaky)
+
+
+def test_connections_are_reused_across_fetchers(server):
+    http = HttpClient()
+    for _ in range(5):
+        # a fresh fetcher per client, as run_once does, still shares the pool
+        assert TriggerFetcher({'url': server + '/data-exchange/trigger'}, http=http).fetch_triggers() == [{'id': 't1'}]
+
+    stats = http.stats()
+    assert stats['requests'] == 5
+    assert stats['connections_opened'] == 1
+    assert stats['connections_reused'] == 4
+
+
+def test_retries_on_5xx_with_backoff(server, flaky):
+    flaky.failures_left = 2
+    http = HttpClient({'max_retries': 3, 'backoff_base': 0.01})
+    resp = http.get(server)
+    assert resp.status_code == 200
+    assert http.stats()['retries'] == 2
+
+
+def test_failed_fetch_is_raised_not_replaced_with_samples(server, flaky):
+    flaky.failures_left = 10
+    fetcher = TriggerFetcher({'url': server, 'sample_count': 2}, http=HttpClient({'max_retries': 0}))
+    with pytest.raises(requests.HTTPError):
+        fetcher.fetch_triggers()
+    with pytest.raises(requests.HTTPError):
+        fetcher.iter_triggers()
+
+
+def test_circuit_opens_and_fails_fast(server, flaky):
+    flaky.failures_left = 100
+    http = HttpClient({'max_retries': 1, 'backoff_base': 0.01, 'breaker_failures': 2, 'breaker_cooldown': 60})
+    # each call fails once, however many attempts its retries took
+    assert http.get(server).status_code == 503
+    assert http.get(server).status_code == 503
+    with pytest.raises(CircuitOpenError):
+        http.get(server)
+    assert flaky.hits == 4
+    stats = http.stats()
+    assert stats['rejected'] == 1
+    assert stats['circuits_open'] == 1
+
+
+def test_retried_failures_do_not_open_the_circuit(server, flaky):
+    flaky.failures_left = 2
+    http = HttpClient({'max_retries': 2, 'backoff_base': 0.01, 'breaker_failures': 1})
+    assert http.get(server).status_code == 200
+    # a request that never reached the host is not held against it either
+    with pytest.raises(requests.exceptions.InvalidHeader):
+        http.get(server, headers={'X-Bad': 'a\nb'})
+    assert http.get(server).status_code == 200
+    assert http.stats()['circuits_open'] == 0
+
+
+def test_retry_after_pauses_the_host(server, flaky):
+    flaky.failures_left = 1
+    flaky.status = 429
+    flaky.retry_after = '0.3'
+    # the retry's own backoff is capped well below Retry-After; the host pause still applies
+    http = HttpClient({'max_retries': 1, 'backoff_max': 0.01})
+    started = time.monotonic()
+    assert http.get(server).status_code == 200
+    assert time.monotonic() - started >= 0.25
+    stats = http.stats()
+    assert stats['throttled'] == 1
+    assert stats['rate_wait'] > 0
+
+
+def test_long_retry_after_raises_instead_of_waiting(server, flaky):
+    flaky.failures_left = 1
+    flaky.status = 429
+    flaky.retry_after = '3600'
+    http = HttpClient({'max_retries': 3, 'backoff_max': 1, 'max_retry_after': 5})
+    started = time.monotonic()
+    with pytest.raises(ThrottledError) as exc:
+        http.get(server)
+    assert exc.value.retry_after == 3600
+    # the rest of the host's requests fail fast too, without being sent
+    with pytest.raises(ThrottledError):
+        http.get(server)
+    assert time.monotonic() - started < 1
+    assert flaky.hits == 1
+    stats = http.stats()
+    assert stats['throttled'] == 1 and stats['rejected'] == 1 and stats['circuits_open'] == 0
+
+
+def test_bucket_paces_and_adapts():
+    bucket = HostBucket(rate=50, burst=1)
+    started = time.monotonic()
+    for _ in range(6):
+        bucket.acquire()
+    assert time.monotonic() - started >= 0.09
+    bucket.throttled()
+    assert bucket.rate == 25
+    bucket.succeeded()
+    assert bucket.rate == 27.5
@@ -0,0 +1,46 @@
+import json
+import os
+
+from pyarchiver.archiver_lambda_service import ArchiverLambdaService
+
+
+def _svc(bucket, mode, sample_count):
+    return ArchiverLambdaService({
+        'client_fetch': {'clients': [{'client_id': 'c1', 'scopes': ['dex/trigger:all'], 'sample_count': sample_count}]},
+        'bucket': bucket,
+        'prefix': 'trigger',
+        'incremental': mode,
+    })
+
+
+def test_skip_mode_skips_unchanged_payload(tmp_path):
+    bucket = str(tmp_path / 'bucket')
+    first = _svc(bucket, 'skip', 2).run_once()
+    assert first['saved'] == {'bytes': 0, 'objects': 0}
+    archived = first['archived'][0]['s3']
+    size = os.path.getsize(archived)
+
+    second = _svc(bucket, 'skip', 2).run_once()
+    entry = second['archived'][0]
+    assert entry['skipped'] is True
+    assert entry['s3'] == archived
+    assert second['saved'] == {'bytes': size, 'objects': 1}
+
+    third = _svc(bucket, 'skip', 3).run_once()
+    assert 'skipped' not in third['archived'][0]
+    assert len(json.load(open(third['archived'][0]['s3']))) == 3
+
+
+def test_delta_mode_writes_only_new_triggers(tmp_path):
+    bucket = str(tmp_path / 'bucket')
+    _svc(bucket, 'delta', 2).run_once()
+
+    out = _svc(bucket, 'delta', 3).run_once()
+    entry = out['archived'][0]
+    assert entry['delta'] == 1
+    assert '_delta_' in entry['s3']
+    assert [t['id'] for t in json.load(open(entry['s3']))] == ['sample-3']
+    assert out['saved']['bytes'] > 0
+
+    again = _svc(bucket, 'delta', 3).run_once()
+    assert again['archived'][0]['skipped'] is True
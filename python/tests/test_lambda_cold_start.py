@@ -0,0 +1,37 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+
+def test_handler_import_defers_heavy_dependencies():
+    code = ("import sys, pyarchiver.lambda_handler; "
+            "print([m for m in ('requests', 'boto3', 'yaml', 'pyarrow') if m in sys.modules])")
+    out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == '[]'
+
+
+def test_clients_and_sessions_are_reused_across_invocations(monkeypatch, capsys):
+    moto = pytest.importorskip('moto')
+    boto3 = pytest.importorskip('boto3')
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    monkeypatch.setenv('BUCKET', 'archive')
+    monkeypatch.setenv('METRICS_FORMAT', 'json')
+
+    from pyarchiver import lambda_handler
+    from pyarchiver.aws import get_client
+
+    monkeypatch.setattr(lambda_handler, '_cold', True)
+    with moto.mock_aws():
+        boto3.client('s3').create_bucket(Bucket='archive')
+        for i in range(2):
+            assert lambda_handler.handler({'triggers': [{'id': f'w-{i}'}]})['count'] == 1
+
+    logs = [json.loads(line) for line in capsys.readouterr().out.splitlines() if '"run_metrics"' in line]
+    assert [m['cold_start'] for m in logs] == [True, False]
+    assert logs[0]['init_ms'] > 0 and 'init_ms' not in logs[1]
+    assert get_client('s3') is get_client('s3')
+    assert lambda_handler._shared_token_provider() is lambda_handler._shared_token_provider()
@@ -0,0 +1,66 @@
+import datetime
+
+import pytest
+
+from pyarchiver.archiver_lambda_service import ArchiverLambdaService
+from pyarchiver.journal import RunJournal
+from pyarchiver.storage.local_uploader import LocalUploader
+
+
+class Crash(BaseException):
+    """Stands in for the Lambda being killed mid-run."""
+
+
+def _svc(bucket, **cfg):
+    clients = [{'client_id': f'c{i}', 'scopes': ['dex/trigger:all'], 'sample_count': 2} for i in range(1, 5)]
+    return ArchiverLambdaService({'client_fetch': {'clients': clients}, 'bucket': bucket, 'prefix': 'trigger',
+                                  'journal': True, 'journal_flush_every': 1, **cfg})
+
+
+def test_restarted_run_resumes_unfinished_clients(tmp_path):
+    bucket = str(tmp_path / 'bucket')
+    svc = _svc(bucket)
+    real_upload = svc.uploader.upload
+    uploads = []
+
+    def crashing_upload(key, data, **kwargs):
+        if '/c3/' in key:
+            raise Crash()
+        uploads.append(key)
+        return real_upload(key, data, **kwargs)
+
+    svc.uploader.upload = crashing_upload
+    with pytest.raises(Crash):
+        svc.run_once()
+    assert [u.split('/')[1] for u in uploads if '/_' not in u] == ['c1', 'c2']
+
+    again = _svc(bucket)
+    uploads.clear()
+    real_upload = again.uploader.upload
+    again.uploader.upload = lambda key, data, **kw: uploads.append(key) or real_upload(key, data, **kw)
+    out = again.run_once()
+    assert [a['client_id'] for a in out['archived']] == ['c1', 'c2', 'c3', 'c4']
+    assert [a.get('resumed', False) for a in out['archived']] == [True, True, False, False]
+    assert out['resumed'] == 2
+    assert sorted(u.split('/')[1] for u in uploads if '/_' not in u) == ['c3', 'c4']
+
+
+def test_failed_clients_are_retried_and_writes_are_batched(tmp_path):
+    uploader = LocalUploader({'local_dir': str(tmp_path)})
+    day = datetime.datetime(2024, 1, 2)
+    journal = RunJournal(uploader, 'trigger', day, {'journal_flush_every': 3, 'journal_flush_interval': 3600})
+    journal.record('a', 'pending')
+    journal.record('a', 'uploaded', s3='s3://b/a', count=2)
+    journal.record('b', 'failed', error='fetch: boom')
+    journal.record('c', 'pending')
+    assert journal.writes == 1
+    journal.close()
+    assert journal.writes == 2
+
+    resumed = RunJournal(uploader, 'trigger', day)
+    entries = resumed.load()
+    assert entries['a:20240102']['state'] == 'uploaded'
+    assert resumed.completed('a')['count'] == 2
+    assert resumed.completed('b') is None
+    assert resumed.completed('c') is None
+    assert uploader.list('trigger/_journal/20240102/')[0].endswith('_00001.ndjson')
@@ -0,0 +1,77 @@
+import json
+
+import pytest
+
+from pyarchiver.archiver_lambda_service import ArchiverLambdaService
+from pyarchiver.archiver_service import ArchiverService
+from pyarchiver.metrics import RunMetrics, percentile, to_emf
+
+BODY = json.dumps([{'id': f't{i}', 'payload': {'i': i}} for i in range(20)]).encode('utf-8')
+
+
+@pytest.fixture
+def server(local_http_server):
+    return local_http_server(lambda request: BODY)
+
+
+def test_percentiles_and_emf_record():
+    values = sorted(i / 1000 for i in range(1, 101))
+    assert percentile(values, 50) == 0.05
+    assert percentile(values, 99) == 0.099
+    assert percentile([], 95) == 0
+
+    m = RunMetrics()
+    for v in values:
+        m.observe('fetch', v, 'c1')
+    m.add_bytes('upload', 10, 'c1')
+    summary = m.summary({'retries': 3})
+    assert summary['phases']['fetch']['count'] == 100
+    assert summary['phases']['fetch']['p95_ms'] == 95.0
+    assert summary['clients']['c1']['upload_bytes'] == 10
+    assert summary['retries'] == 3
+
+    emf = to_emf(summary, dimensions={'Action': 'run_clients'})
+    directive = emf['_aws']['CloudWatchMetrics'][0]
+    assert directive['Dimensions'] == [['Action']]
+    names = {d['Name'] for d in directive['Metrics']}
+    assert {'fetch_p50', 'fetch_p99', 'upload_bytes', 'retries'} <= names
+    assert emf['fetch_p99'] == 99.0 and emf['Action'] == 'run_clients'
+
+
+@pytest.mark.parametrize('stream', [False, True])
+def test_client_run_reports_phase_metrics(tmp_path, server, stream):
+    svc = ArchiverLambdaService({
+        'client_fetch': {'clients': [{'client_id': 'c1', 'scopes': ['dex/trigger:all'], 'trigger_url': server}]},
+        'bucket': str(tmp_path / 'bucket'),
+        'stream': stream,
+    })
+    metrics = svc.run_once()['metrics']
+    expected = {'fetch', 'upload'} if stream else {'fetch', 'parse', 'serialize', 'upload'}
+    assert set(metrics['phases']) == expected
+    assert metrics['bytes']['fetch'] == len(BODY)
+    assert metrics['clients']['c1']['upload_bytes'] == metrics['bytes']['upload'] > 0
+    assert metrics['peak_rss_mb'] > 0
+
+
+def test_cli_summary_includes_metrics(tmp_path):
+    cfg = {'api': {'sample_count': 3}, 'storage': {'type': 'local', 'local_dir': str(tmp_path / 'a')},
+           'output': str(tmp_path / 'out')}
+    ArchiverService(cfg).run_once()
+    summary = json.load(open(tmp_path / 'out' / 'last_run_summary.json'))
+    assert summary['metrics']['phases']['upload']['count'] == 3
+    assert summary['metrics']['bytes']['upload'] > 0
+
+
+def test_each_cycle_reports_its_own_retries(tmp_path, local_http_server):
+    hits = []
+
+    def respond(request):
+        hits.append(1)
+        return (503, b'busy') if len(hits) == 1 else BODY
+
+    cfg = {'api': {'url': local_http_server(respond)}, 'http': {'backoff_base': 0.01},
+           'storage': {'type': 'local', 'local_dir': str(tmp_path / 'a')}, 'output': str(tmp_path / 'out')}
+    svc = ArchiverService(cfg)
+    # the daemon keeps one service, and its HttpClient, across cycles
+    assert svc.run_once()['metrics']['retries'] == 1
+    assert svc.run_once()['metrics']['retries'] == 0
@@ -0,0 +1,86 @@
+import json
+
+from pyarchiver.archiver_lambda_service import ArchiverLambdaService
+from pyarchiver.scheduler import CostHistory, Deadline
+from pyarchiver.storage.local_uploader import LocalUploader
+
+
+class FakeContext:
+    def __init__(self, remaining_ms):
+        self.remaining_ms = remaining_ms
+
+    def get_remaining_time_in_millis(self):
+        return self.remaining_ms
+
+
+def _seed(uploader, shard, costs):
+    uploader.upload(f'trigger/_history/costs_{shard}.json', json.dumps(costs).encode('utf-8'))
+
+
+def test_history_merges_shards_and_orders_largest_first(tmp_path):
+    uploader = LocalUploader({'local_dir': str(tmp_path)})
+    _seed(uploader, 0, {'a': {'seconds': 1.0, 'bytes': 10, 'runs': 1, 'at': '2024-01-01T00:00:00Z'},
+                        'b': {'seconds': 9.0, 'bytes': 10, 'runs': 1, 'at': '2024-01-01T00:00:00Z'}})
+    _seed(uploader, 1, {'a': {'seconds': 5.0, 'bytes': 10, 'runs': 3, 'at': '2024-01-02T00:00:00Z'}})
+    history = CostHistory(uploader, 'trigger', shard=1).load()
+    assert history.estimate('a') == 5.0
+    clients = [{'client_id': cid} for cid in ('a', 'new', 'b')]
+    # unknown clients are estimated at the median known cost (7s)
+    assert [c['client_id'] for c in history.order(clients, lambda c: c['client_id'])] == ['b', 'new', 'a']
+
+    history.record('a', 3.0, 100)
+    history.save()
+    stored = json.loads(uploader.read('trigger/_history/costs_1.json'))
+    assert stored['a']['seconds'] == 4.0 and stored['a']['runs'] == 4
+    assert 'b' not in stored
+
+
+def test_streamed_clients_are_ordered_within_the_lookahead(tmp_path):
+    uploader = LocalUploader({'local_dir': str(tmp_path)})
+    _seed(uploader, 0, {cid: {'seconds': s, 'bytes': 1, 'at': 'x'} for cid, s in
+                        (('a', 1.0), ('b', 5.0), ('c', 3.0), ('d', 9.0), ('e', 2.0))})
+    history = CostHistory(uploader, 'trigger').load()
+    pulled = []
+
+    def stream():
+        for cid in 'abcde':
+            pulled.append(cid)
+            yield {'client_id': cid}
+
+    ordered = history.iter_largest_first(stream(), lambda c: c['client_id'], lookahead=2)
+    # the first client is taken after two were read, not after the whole stream
+    assert next(ordered)['client_id'] == 'b' and pulled == ['a', 'b']
+    assert [c['client_id'] for c in ordered] == ['c', 'd', 'e', 'a']
+    everything = history.iter_largest_first(stream(), lambda c: c['client_id'])
+    assert [c['client_id'] for c in everything] == ['d', 'b', 'c', 'e', 'a']
+
+
+def test_run_defers_clients_that_would_overrun_the_deadline(tmp_path):
+    bucket = str(tmp_path / 'bucket')
+    clients = [{'client_id': f'c{i}', 'scopes': ['dex/trigger:all'], 'sample_count': 1} for i in range(1, 5)]
+    cfg = {'client_fetch': {'clients': clients}, 'bucket': bucket, 'prefix': 'trigger', 'deadline_margin': 10,
+           'max_workers': 2}
+    # the service uploads under <bucket>/<prefix>
+    uploader = LocalUploader({'local_dir': f'{bucket}/trigger'})
+    _seed(uploader, 0, {'c1': {'seconds': 30.0, 'bytes': 1, 'at': 'x'}, 'c2': {'seconds': 1.0, 'bytes': 1, 'at': 'x'},
+                        'c3': {'seconds': 16.0, 'bytes': 1, 'at': 'x'}, 'c4': {'seconds': 2.0, 'bytes': 1, 'at': 'x'}})
+
+    deadline = Deadline.from_context(FakeContext(25_000), margin_s=10)
+    out = ArchiverLambdaService(cfg).run_once(deadline=deadline)
+    assert out['deferred'] == ['c1', 'c3']
+    assert [a['client_id'] for a in out['archived']] == ['c4', 'c2']
+
+    history = CostHistory(uploader, 'trigger').load()
+    assert history.costs['c2']['runs'] == 1 and history.costs['c2']['seconds'] < 1.0
+    assert history.costs['c1']['seconds'] == 30.0
+
+    follow_up = ArchiverLambdaService(cfg).run_once(client_ids=out['deferred'])
+    assert sorted(a['client_id'] for a in follow_up['archived']) == ['c1', 'c3']
+    assert 'deferred' not in follow_up
+
+
+def test_deadline_from_context_and_budget():
+    assert Deadline.from_context(None) is None
+    assert not Deadline.from_context(FakeContext(5_000), margin_s=10).allows(0)
+    budget = Deadline.from_budget(60, margin_s=10)
+    assert budget.allows(45) and not budget.allows(55)
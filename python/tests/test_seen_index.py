@@ -0,0 +1,144 @@
+import pytest
+
+from pyarchiver import seen_index
+from pyarchiver.archiver_service import ArchiverService
+from pyarchiver.seen_index import SeenIndex
+from pyarchiver.storage.local_uploader import LocalUploader
+
+
+def test_index_round_trip_merges_batches_and_grows_bloom(tmp_path):
+    uploader = LocalUploader({'local_dir': str(tmp_path / 'archive')})
+    cfg = {'seen_cache_dir': str(tmp_path / 'cache'), 'seen_capacity': 10}
+
+    first = SeenIndex(uploader, cfg).load()
+    assert len(first) == 0 and 't-1' not in first
+    for i in range(50):
+        first.add(f't-{i}')
+    first.add('t-1')
+    assert first.save() == 50
+    first.close()
+
+    second = SeenIndex(uploader, cfg).load()
+    assert len(second) == 50
+    assert second.bloom.capacity >= 50
+    assert all(f't-{i}' in second for i in range(50))
+    assert 't-50' not in second
+    for i in range(40, 120):
+        second.add(f't-{i}')
+    assert second.save() == 70
+    second.close()
+
+    # each save is a delta until something merges them into the id file
+    assert len(uploader.list('_seen/delta/')) == 2
+    assert SeenIndex(uploader, cfg).load().merge() == 120
+    assert uploader.list('_seen/delta/') == []
+
+    third = SeenIndex(uploader, cfg).load()
+    assert len(third) == 120
+    assert all(f't-{i}' in third for i in range(120))
+    assert sum(f'other-{i}' in third for i in range(1000)) == 0
+    # the stored hashes stay sorted and the fan-out table points into them
+    hashes = list(third._iter_hashes())
+    assert hashes == sorted(hashes)
+    assert third._fanout[seen_index.FANOUT] == 120
+    third.close()
+
+
+def test_refresh_reads_new_deltas_and_reloads_only_a_rewritten_id_file(tmp_path):
+    uploader = LocalUploader({'local_dir': str(tmp_path / 'archive')})
+    cfg = {'seen_cache_dir': str(tmp_path / 'cache')}
+    base = SeenIndex(uploader, cfg).load()
+    base.add('a')
+    base.save()
+    base.merge()
+
+    warm = SeenIndex(uploader, cfg).load()
+    copies = []
+    real_copy = uploader.local_copy
+    uploader.local_copy = lambda *a: copies.append(a) or real_copy(*a)
+    other = SeenIndex(uploader, cfg).load()
+    other.add('b')
+    other.save()
+    copies.clear()
+    assert 'b' in warm.refresh() and 'a' in warm
+    assert copies == []
+
+    other.add('c')
+    other.save()
+    assert other.merge() == 2
+    assert 'c' in warm.refresh() and len(warm) == 3
+    assert len(copies) == 1
+    for index in (base, warm, other):
+        index.close()
+
+
+def test_save_merges_once_enough_deltas_pile_up(tmp_path):
+    uploader = LocalUploader({'local_dir': str(tmp_path / 'archive')})
+    index = SeenIndex(uploader, {'seen_cache_dir': str(tmp_path / 'cache'), 'seen_merge_deltas': 3}).load()
+    for i in range(3):
+        index.add(f't-{i}')
+        index.save()
+    assert uploader.list('_seen/delta/') == []
+    assert index.count == 3 and len(index) == 3
+    index.close()
+
+
+def test_discarded_ids_are_not_saved(tmp_path):
+    uploader = LocalUploader({'local_dir': str(tmp_path / 'archive')})
+    index = SeenIndex(uploader, {'seen_cache_dir': str(tmp_path / 'cache')}).load()
+    index.add('kept')
+    index.save()
+    index.add('lost')
+    index.discard()
+    assert 'kept' in index and 'lost' not in index
+    assert index.save() == 0
+    index.close()
+    assert 'lost' not in SeenIndex(uploader, {'seen_cache_dir': str(tmp_path / 'cache')}).load()
+
+
+def test_service_skips_triggers_archived_by_an_earlier_run(tmp_path):
+    cfg = {'storage': {'type': 'local', 'local_dir': str(tmp_path / 'archive'),
+                       'seen_cache_dir': str(tmp_path / 'cache')},
+           'output': str(tmp_path), 'dedupe': True}
+    first = ArchiverService(cfg).run_once()
+    assert first['archived'] and first['skipped_seen'] == 0
+
+    uploads = []
+    svc = ArchiverService(cfg)
+    real_upload = svc.uploader.upload
+    svc.uploader.upload = lambda key, data, **kw: uploads.append(key) or real_upload(key, data, **kw)
+    second = svc.run_once()
+    assert second['archived'] == []
+    assert second['skipped_seen'] == len(first['archived'])
+    assert not [u for u in uploads if u.startswith('trigger_')]
+
+
+def test_handler_dedupes_with_env_flag(monkeypatch, tmp_path):
+    moto = pytest.importorskip('moto')
+    boto3 = pytest.importorskip('boto3')
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    monkeypatch.setenv('BUCKET', 'archive')
+    monkeypatch.setenv('METRICS_FORMAT', 'off')
+    monkeypatch.setenv('DEDUPE', '1')
+    monkeypatch.setenv('SEEN_CACHE_DIR', str(tmp_path))
+
+    from pyarchiver import lambda_handler
+    monkeypatch.setattr(lambda_handler, '_seen', None)
+
+    with moto.mock_aws():
+        s3 = boto3.client('s3')
+        s3.create_bucket(Bucket='archive')
+        first = lambda_handler.handler({'triggers': [{'id': 'a'}, {'id': 'b'}]})
+        warm = lambda_handler._seen[1]
+        second = lambda_handler.handler({'triggers': [{'id': 'b'}, {'id': 'c'}]})
+        # a warm invocation keeps the loaded index; each run adds one delta, no id file rewrite
+        assert lambda_handler._seen[1] is warm
+        keys = [o['Key'] for o in s3.list_objects_v2(Bucket='archive')['Contents']]
+        assert len([k for k in keys if k.startswith('_seen/delta/')]) == 2
+        assert '_seen/ids.idx' not in keys
+        warm.close()
+    assert first['count'] == 2 and first['skipped_seen'] == 0
+    assert [a['id'] for a in second['archived']] == ['c']
+    assert second['skipped_seen'] == 1
@@ -0,0 +1,75 @@
+import json
+import os
+
+import pytest
+
+from pyarchiver.archiver_service import ArchiverService
+from pyarchiver.storage.local_uploader import LocalUploader
+from pyarchiver.storage.segment_writer import SegmentWriter, load_index, read_trigger
+
+
+def test_segment_writer_bounds_and_ranged_reads(tmp_path):
+    up = LocalUploader({'local_dir': str(tmp_path)})
+    writer = SegmentWriter(up, {'segment_max_count': 10, 'run_id': 'r1'})
+    triggers = [{'id': f't-{i}', 'payload': {'index': i, 'text': 'é' * i}} for i in range(25)]
+    for t in triggers:
+        writer.add(t)
+    segments = writer.close()
+
+    assert [len(s['ids']) for s in segments] == [10, 10, 5]
+    assert segments[0]['segment'] == 'segments/segment_r1_00001.ndjson'
+    index = load_index(up, segments[1]['segment'])
+    assert read_trigger(up, index, 't-13') == triggers[13]
+    assert read_trigger(up, index, 't-3') is None
+
+
+def test_segment_writer_splits_on_size(tmp_path):
+    up = LocalUploader({'local_dir': str(tmp_path)})
+    writer = SegmentWriter(up, {'segment_max_bytes': 200, 'run_id': 'r2'})
+    for i in range(10):
+        writer.add({'id': i, 'payload': 'x' * 50})
+    segments = writer.close()
+    assert len(segments) > 1
+    for seg in segments:
+        assert os.path.getsize(seg['path']) <= 200
+
+
+def test_archiver_service_segment_layout(tmp_path):
+    cfg = {
+        'api': {'sample_count': 4},
+        'storage': {'type': 'local', 'local_dir': str(tmp_path / 'archives'), 'layout': 'segments'},
+        'output': str(tmp_path / 'out'),
+    }
+    out = ArchiverService(cfg).run_once()
+    assert [a['id'] for a in out['archived']] == ['sample-1', 'sample-2', 'sample-3', 'sample-4']
+    assert len({a['path'] for a in out['archived']}) == 1
+    files = sorted(os.listdir(tmp_path / 'archives' / 'segments'))
+    assert len(files) == 2 and files[1].endswith('.index.json')
+
+
+def test_lambda_handler_segments_on_s3(monkeypatch, capsys):
+    moto = pytest.importorskip('moto')
+    boto3 = pytest.importorskip('boto3')
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    monkeypatch.setenv('BUCKET', 'archive')
+    monkeypatch.setenv('PREFIX', 'trigger')
+    monkeypatch.setenv('ARCHIVE_LAYOUT', 'segments')
+
+    from pyarchiver import lambda_handler
+    from pyarchiver.storage.s3_uploader import S3Uploader
+
+    with moto.mock_aws():
+        boto3.client('s3').create_bucket(Bucket='archive')
+        triggers = [{'id': f'e-{i}', 'payload': {'i': i}} for i in range(5)]
+        out = lambda_handler.handler({'triggers': triggers})
+
+        assert out['count'] == 5
+        emf = [json.loads(l) for l in capsys.readouterr().out.splitlines() if l.startswith('{"Action"')]
+        assert emf and emf[0]['_aws']['CloudWatchMetrics'][0]['Namespace'] == 'pyarchiver'
+        keys = [o['Key'] for o in boto3.client('s3').list_objects_v2(Bucket='archive')['Contents']]
+        assert len(keys) == 2
+        up = S3Uploader({'bucket': 'archive', 'prefix': 'trigger'})
+        segment = [k for k in keys if k.endswith('.ndjson')][0][len('trigger/'):]
+        assert read_trigger(up, load_index(up, segment), 'e-3') == triggers[3]
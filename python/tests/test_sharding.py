@@ -0,0 +1,87 @@
+import pytest
+
+from pyarchiver import lambda_handler
+from pyarchiver.sharding import HashRing, LambdaInvoker, merge_summaries
+
+
+def test_hash_ring_is_stable_and_moves_few_clients():
+    ids = [f'client-{i}' for i in range(2000)]
+    four = HashRing(4)
+    assert [four.shard_for(c) for c in ids] == [HashRing(4).shard_for(c) for c in ids]
+    assert all(len(p) > 300 for p in four.partition(ids))
+
+    five = HashRing(5)
+    moved = sum(1 for c in ids if four.shard_for(c) != five.shard_for(c))
+    # roughly 1/5 of the clients move to the new shard, not a full reshuffle
+    assert moved < len(ids) * 0.35
+
+
+def test_merge_summaries():
+    merged = merge_summaries([
+        {'archived': [{'client_id': 'a'}], 'count': 1, 'failed': [], 'http': {'requests': 2}},
+        {'archived': [{'client_id': 'b'}, {'client_id': 'c'}], 'count': 2, 'failed': [{'client_id': 'd', 'error': 'x'}], 'http': {'requests': 3}},
+    ], shard_ids=[0, 2])
+    assert merged['count'] == 3
+    assert [a['client_id'] for a in merged['archived']] == ['a', 'b', 'c']
+    assert merged['http'] == {'requests': 5}
+    assert [s['shard'] for s in merged['shards']] == [0, 2]
+
+
+def test_fan_out_with_in_process_invoker(tmp_path, monkeypatch, local_http_server):
+    clients = [{'client_id': f'client-{i}', 'scopes': ['dex/trigger:all'], 'sample_count': 1} for i in range(12)]
+    clients.append({'client_id': 'no-scope', 'scopes': ['other'], 'sample_count': 1})
+    monkeypatch.setenv('CLIENTS_API_URL', local_http_server(lambda request: clients) + '/clients')
+    monkeypatch.setenv('BUCKET', str(tmp_path / 'bucket'))
+    monkeypatch.setenv('PREFIX', 'trigger')
+    monkeypatch.setenv('FANOUT_INVOKER', 'inprocess')
+
+    out = lambda_handler.handler({'action': 'fan_out', 'of': 3})
+
+    assert out['count'] == 12
+    assert sorted(a['client_id'] for a in out['archived']) == sorted(c['client_id'] for c in clients[:12])
+    assert sum(s['clients'] for s in out['shards']) == 12
+    assert len(out['shards']) <= 3
+
+
+class _Context:
+    function_name = 'pyarchiver-handler'
+
+    def __init__(self, remaining_ms):
+        self.remaining_ms = remaining_ms
+
+    def get_remaining_time_in_millis(self):
+        return self.remaining_ms
+
+
+def test_workers_stop_before_the_coordinator_and_deferred_clients_follow_up(tmp_path, monkeypatch,
+                                                                           local_http_server):
+    clients = [{'client_id': f'client-{i}', 'scopes': ['dex/trigger:all'], 'sample_count': 1} for i in range(6)]
+    monkeypatch.setenv('CLIENTS_API_URL', local_http_server(lambda request: clients) + '/clients')
+    monkeypatch.setenv('BUCKET', str(tmp_path / 'bucket'))
+    monkeypatch.setenv('PREFIX', 'trigger')
+    monkeypatch.setenv('FANOUT_INVOKER', 'inprocess')
+    seen = []
+    real_handler = lambda_handler.handler
+    monkeypatch.setattr(lambda_handler, 'handler', lambda e, c=None: seen.append(e) or real_handler(e, c))
+
+    # 12s left with a 10s margin: the workers get a deadline they cannot start anything before
+    out = lambda_handler.handler({'action': 'fan_out', 'of': 2}, _Context(12_000))
+    workers = [e for e in seen if e['action'] == 'run_clients']
+    assert {e['deadline_at'] for e in workers[:2]} == {workers[0]['deadline_at']}
+    assert out['count'] == 0 and sorted(out['deferred']) == sorted(c['client_id'] for c in clients)
+
+    # the leftovers went to a follow-up fan-out (no deadline here), which archived them
+    assert out['followup'] == 1
+    follow_up = [e for e in seen if e['action'] == 'fan_out' and e.get('followup')]
+    assert [sorted(e['client_ids']) for e in follow_up] == [sorted(out['deferred'])]
+    assert 'deadline_at' not in workers[-1]
+    archived = sorted(p.parent.name for p in (tmp_path / 'bucket').glob('**/client-*/*_trigger_*'))
+    assert archived == sorted(out['deferred'])
+
+
+def test_lambda_invoker_neither_times_out_nor_retries_a_worker(monkeypatch):
+    pytest.importorskip('boto3')
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    config = LambdaInvoker('pyarchiver-handler').client.meta.config
+    assert config.read_timeout > 900
+    assert config.retries['total_max_attempts'] == 1
@@ -0,0 +1,75 @@
+import io
+import os
+
+import pytest
+
+from pyarchiver.storage.local_uploader import LocalUploader
+from pyarchiver.storage.s3_uploader import S3Uploader
+
+moto = pytest.importorskip('moto')
+boto3 = pytest.importorskip('boto3')
+
+MB = 1024 * 1024
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    with moto.mock_aws():
+        client = boto3.client('s3')
+        client.create_bucket(Bucket='archive')
+        yield client
+
+
+def _chunks(total, size=256 * 1024):
+    for i in range(0, total, size):
+        yield bytes([i // size % 251]) * min(size, total - i)
+
+
+def test_s3_multipart_upload_from_iterator(s3):
+    up = S3Uploader({'bucket': 'archive', 'prefix': 'trigger', 'part_size': 5 * MB, 'max_concurrency': 3})
+    total = 12 * MB + 123
+    path = up.upload_stream('c1/big.json', _chunks(total))
+
+    assert path == 's3://archive/trigger/c1/big.json'
+    obj = s3.get_object(Bucket='archive', Key='trigger/c1/big.json')
+    assert obj['Body'].read() == b''.join(_chunks(total))
+    # three 5 MB parts -> multipart ETag suffix
+    assert obj['ETag'].strip('"').endswith('-3')
+
+
+def test_s3_small_stream_uses_single_put(s3):
+    up = S3Uploader({'bucket': 'archive'})
+    up.upload_stream('small.json', io.BytesIO(b'[]'))
+    assert s3.get_object(Bucket='archive', Key='small.json')['Body'].read() == b'[]'
+
+
+def test_s3_failed_part_aborts_upload(s3):
+    up = S3Uploader({'bucket': 'archive', 'part_size': 5 * MB})
+
+    def broken():
+        yield from _chunks(11 * MB)
+        raise IOError('source went away')
+
+    with pytest.raises(IOError):
+        up.upload_stream('broken.json', broken())
+    assert s3.list_multipart_uploads(Bucket='archive').get('Uploads', []) == []
+    assert s3.list_objects_v2(Bucket='archive').get('KeyCount') == 0
+
+
+def test_local_stream_is_atomic(tmp_path):
+    up = LocalUploader({'local_dir': str(tmp_path)})
+    path = up.upload_stream('c1/out.json', iter([b'[1,', b'2]']))
+    assert open(path, 'rb').read() == b'[1,2]'
+
+    def broken():
+        yield b'[3,'
+        raise IOError('source went away')
+
+    with pytest.raises(IOError):
+        up.upload_stream('c1/out.json', broken())
+    # previous content untouched and no temp files left behind
+    assert open(path, 'rb').read() == b'[1,2]'
+    assert os.listdir(tmp_path / 'c1') == ['out.json']
@@ -0,0 +1,79 @@
+import base64
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+import pytest
+
+from pyarchiver.http_client import HttpClient
+from pyarchiver.token_provider import TokenProvider
+
+
+class _StubOAuth:
+    """Client-credentials token endpoint accepting the secret 'secret'; counts exchanges."""
+
+    def __init__(self):
+        self.calls = 0
+        self.expires_in = 3600
+
+    def __call__(self, request):
+        length = int(request.headers.get('Content-Length', 0))
+        form = parse_qs(request.rfile.read(length).decode('utf-8'))
+        user, _, secret = base64.b64decode(request.headers['Authorization'].split()[1]).decode().partition(':')
+        self.calls += 1
+        # make concurrent callers overlap with the exchange
+        time.sleep(0.05)
+        if secret != 'secret' or form.get('grant_type') != ['client_credentials']:
+            return 401, {'error': 'invalid_client'}
+        return {
+            'access_token': f"tok-{user}-{form.get('scope', [''])[0]}-{self.calls}",
+            'token_type': 'Bearer',
+            'expires_in': self.expires_in,
+        }
+
+
+@pytest.fixture
+def oauth():
+    return _StubOAuth()
+
+
+@pytest.fixture
+def token_url(local_http_server, oauth):
+    return local_http_server(oauth) + '/oauth2/token'
+
+
+def test_concurrent_requests_share_one_exchange(token_url, oauth):
+    tp = TokenProvider({}, http=HttpClient({'max_retries': 0}))
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        tokens = list(pool.map(lambda _: tp.get_token_for_client('c1', 'secret', token_url, scope='dex/trigger:all'), range(8)))
+
+    assert set(tokens) == {'tok-c1-dex/trigger:all-1'}
+    assert oauth.calls == 1
+    # cached until close to expiry
+    assert tp.get_token_for_client('c1', 'secret', token_url, scope='dex/trigger:all') == tokens[0]
+    assert oauth.calls == 1
+
+
+def test_refreshes_early_and_persists_cache(token_url, oauth, tmp_path):
+    cache_file = str(tmp_path / 'tokens.json')
+    oauth.expires_in = 1
+    tp = TokenProvider({'cache_file': cache_file, 'refresh_margin': 60}, http=HttpClient({'max_retries': 0}))
+    short = tp.get_token_for_client('c1', 'secret', token_url)
+    # a token shorter-lived than the margin is still reused for half its lifetime
+    assert tp.get_token_for_client('c1', 'secret', token_url) == short
+    assert oauth.calls == 1
+    time.sleep(0.55)
+    assert tp.get_token_for_client('c1', 'secret', token_url) != short
+    assert oauth.calls == 2
+
+    oauth.expires_in = 3600
+    first = tp.get_token_for_client('c2', 'secret', token_url)
+    warm = TokenProvider({'cache_file': cache_file}, http=HttpClient({'max_retries': 0}))
+    assert warm.get_token_for_client('c2', 'secret', token_url) == first
+    assert warm.exchanges == 0
+
+
+def test_failed_exchange_raises(token_url):
+    tp = TokenProvider({}, http=HttpClient({'max_retries': 0}))
+    with pytest.raises(Exception):
+        tp.get_token_for_client('c1', 'wrong', token_url)